@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# awsInventory.regionInstancesInfo ingestion against a local aws cli stand-in
+# printing synthetic describe-instances output (half of the instances stopped):
+#   old - full describe-instances through bash, json.loads of the whole blob, client side filtering
+#   new - --filters instance-state-name and --query projection done by the cli, records streamed from the pipe
+# "peak" is the python heap peak of this process (tracemalloc), "pipe" the bytes read from the cli
+#
+# usage: python3 bench/awsIngestBench.py [instancesCount ...]
+
+import os
+import sys
+import copy
+import json
+import time
+import logging
+import tempfile
+import tracemalloc
+
+from common import repoDir
+sys.path.insert(0, repoDir)
+import rsh.config
+from rsh.awsInventory import awsInventory
+
+standIn = r'''#!/usr/bin/env python3
+# aws cli stand-in: ec2 describe-instances with --filters instance-state-name and the --query shapes awsInventory sends
+import os, sys, json
+args = sys.argv[1:]
+option = lambda name: args[args.index(name) + 1] if name in args else None
+count = int(os.environ['FAKE_AWS_INSTANCES'])
+running = option('--filters') == 'Name=instance-state-name,Values=running'
+instances = []
+for i in range(count):
+    state = 'running' if i % 2 == 0 else 'stopped'
+    if running and state != 'running':
+        continue
+    ip = f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+    instances.append({
+        'InstanceId': f"i-{i:017x}", 'ImageId': 'ami-0123456789abcdef0', 'InstanceType': 'm5.large',
+        'State': {'Code': 16, 'Name': state}, 'Placement': {'AvailabilityZone': 'eu-central-1' + 'abc'[i % 3], 'Tenancy': 'default'},
+        'PrivateIpAddress': ip, 'PrivateDnsName': f"ip-{ip.replace('.', '-')}.ec2.internal", 'PublicIpAddress': f"3.{i & 255}.{(i >> 8) & 255}.1",
+        'Tags': [{'Key': 'Name', 'Value': f"srv{i}"}, {'Key': 'role', 'Value': ['web', 'db'][i % 2]}],
+        'BlockDeviceMappings': [{'DeviceName': f"/dev/xvd{c}", 'Ebs': {'VolumeId': f"vol-{i:08x}{c}", 'Status': 'attached', 'DeleteOnTermination': True}} for c in 'abcd'],
+        'NetworkInterfaces': [{'NetworkInterfaceId': f"eni-{i:08x}", 'SubnetId': 'subnet-0123', 'VpcId': 'vpc-0123', 'PrivateIpAddress': ip,
+                               'Groups': [{'GroupId': f"sg-{g:08x}", 'GroupName': f"group-{g}"} for g in range(4)]}],
+        'SecurityGroups': [{'GroupId': f"sg-{g:08x}", 'GroupName': f"group-{g}"} for g in range(4)],
+        'Monitoring': {'State': 'disabled'}, 'Architecture': 'x86_64', 'RootDeviceType': 'ebs', 'Hypervisor': 'xen',
+    })
+query = option('--query')
+if query is None:
+    document = {'Reservations': [{'ReservationId': f"r-{n}", 'Instances': instances[n:n + 10]} for n in range(0, len(instances), 10)]}
+elif query == 'Reservations[].Instances[]':
+    document = instances
+else:
+    fields = [item.split(':')[0].strip() for item in query[query.index('{') + 1:-1].split(',')]
+    document = [{field: instance.get(field) for field in fields} for instance in instances]
+json.dump(document, sys.stdout, indent=4)
+sys.stdout.write('\n')
+'''
+
+
+class oldAwsInventory(awsInventory):
+    def regionInstancesInfo(self, region):
+        """regionInstancesInfo before server side filtering and streaming"""
+        instancesInfo = list()
+        seenInstances = set()
+        describeInstances = self.runCmd(f"aws ec2 --region {region} describe-instances", timeout=300)['stdout']
+        for reservation in describeInstances['Reservations']:
+            for instance in reservation['Instances']:
+                if instance['State']['Name'] != 'running':
+                    continue
+                tags = instance.get('Tags', [])
+                info = {'dc': instance['Placement']['AvailabilityZone'], 'tags': tags}
+                for tag in tags:
+                    if tag['Key'] == 'Name':
+                        info['host'] = tag['Value'] + self.cfg['awsInventory']['nameSuffix']
+                info['rshInventoryModule'] = 'awsInventory'
+                info['hosting'] = 'aws'
+                for hostInfoField in self.cfg['awsInventory']['hostInfoFields']:
+                    info[hostInfoField] = instance.get(hostInfoField, 'unknown')
+                info['sshHost'] = info.get(self.cfg['awsInventory']['sshHostField'], 'unknown')
+                infoKey = json.dumps(info, sort_keys=True)
+                if infoKey not in seenInstances:
+                    seenInstances.add(infoKey)
+                    instancesInfo.append(info)
+        return instancesInfo
+
+
+def pipeBytes(inventory, query):
+    """bytes the stand-in prints for the old (no query) or the new command line"""
+    import subprocess
+    command = ['aws', 'ec2', 'describe-instances', '--region', 'eu-central-1']
+    if query:
+        command += ['--filters', 'Name=instance-state-name,Values=running', '--query', inventory.instancesQuery()]
+    return len(subprocess.run(command, stdout=subprocess.PIPE, check=True).stdout)
+
+
+def run(klass, cfg):
+    inventory = klass(cfg)
+    tracemalloc.start()
+    start = time.perf_counter()
+    instancesInfo = inventory.regionInstancesInfo('eu-central-1')
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return instancesInfo, elapsed, peak
+
+
+if __name__ == "__main__":
+    counts = [int(a) for a in sys.argv[1:]] or [2000, 20000]
+    logging.disable(logging.CRITICAL)
+    cfg = copy.deepcopy(rsh.config.defaultCfg)
+
+    with tempfile.TemporaryDirectory() as binDir:
+        with open(os.path.join(binDir, 'aws'), 'w') as f:
+            f.write(standIn)
+        os.chmod(os.path.join(binDir, 'aws'), 0o755)
+        os.environ['PATH'] = binDir + os.pathsep + os.environ['PATH']
+
+        print(f"{'instances':>10} {'mode':>5} {'time, s':>8} {'peak, MB':>9} {'pipe, MB':>9} {'kept':>6}")
+        for count in counts:
+            os.environ['FAKE_AWS_INSTANCES'] = str(count)
+            results = {}
+            for mode, klass in (('old', oldAwsInventory), ('new', awsInventory)):
+                instancesInfo, elapsed, peak = run(klass, cfg)
+                results[mode] = instancesInfo
+                size = pipeBytes(klass(cfg), mode == 'new')
+                print(f"{count:>10} {mode:>5} {elapsed:>8.2f} {peak / 2**20:>9.1f} {size / 2**20:>9.1f} {len(instancesInfo):>6}", flush=True)
+            assert results['old'] == results['new']
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# shared helpers for rsh benchmarks
+
+import os
+import sys
+import time
+import subprocess
+
+repoDir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def syntheticInventory(hostsCount, groupSize=50):
+    """
+    return inventory dict shaped like rshInventory.py output
+    """
+    inventory = {'hosts': dict(), 'groups': dict()}
+    for i in range(hostsCount):
+        host = f"srv{i}-{['web', 'db', 'cache', 'queue'][i % 4]}.aws"
+        inventory['hosts'][host] = {
+            'sshHost': f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            'PrivateIpAddress': f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            'PublicIpAddress': 'unknown',
+        }
+        for groupName in (
+            f"tag_group_g{i // groupSize}",
+            f"tag_role_{['web', 'db', 'cache', 'queue'][i % 4]}",
+            f"dc_aws_eu_central_1{'abc'[i % 3]}",
+        ):
+            inventory['groups'].setdefault(groupName, []).append(host)
+    return inventory
+
+
+def benchEnv(homeDir):
+    """
+    return environment running rsh entry points against isolated home dir
+    """
+    env = dict(os.environ)
+    env['HOME'] = homeDir
+    env.pop('SSH_AUTH_SOCK', None)
+    env['PYTHONPATH'] = repoDir + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+def timeRun(args, env, cwd, repeat=5):
+    """
+    return best wall time (seconds) of running args
+    """
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(args, env=env, cwd=cwd, stdout=subprocess.DEVNULL, check=True)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def entryPoint(name):
+    return [sys.executable, os.path.join(repoDir, name)]
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# compare rshCompgen.py latency without completion index (cold, full yaml parse)
+# and with prebuilt index (warm) for synthetic inventories
+#
+# usage: python3 bench/compgenBench.py [hostsCount ...]
+
+import os
+import sys
+import tempfile
+import yaml
+
+from common import syntheticInventory, benchEnv, timeRun, entryPoint
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000]
+    print(f"{'hosts':>8} {'cold, s':>10} {'warm, s':>10} {'warm+prefix, s':>15}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as homeDir:
+            with open(os.path.join(homeDir, 'inventory.yaml'), 'w') as f:
+                yaml.dump(syntheticInventory(size), f, default_flow_style=False, sort_keys=False)
+            env = benchEnv(homeDir)
+            indexFilePath = os.path.join(homeDir, '.cache', 'rsh', 'compgen.idx')
+            args = entryPoint('rshCompgen.py') + ['hosts']
+
+            # cold: drop index before every run
+            cold = None
+            for _ in range(3):
+                if os.path.exists(indexFilePath):
+                    os.remove(indexFilePath)
+                elapsed = timeRun(args, env, homeDir, repeat=1)
+                cold = elapsed if cold is None else min(cold, elapsed)
+
+            # warm: index built by last cold run
+            warm = timeRun(args, env, homeDir)
+            warmPrefix = timeRun(args + ['srv12'], env, homeDir)
+            print(f"{size:>8} {cold:>10.3f} {warm:>10.3f} {warmPrefix:>15.3f}")
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# sr root password lookup: gpg decrypt of the passwords file plus a regex scan
+# on every login (old getRootPassword) vs one round trip to the credential agent
+#
+# usage: python3 bench/credAgentBench.py [entriesCount] [lookups]
+
+import os
+import re
+import sys
+import time
+import tempfile
+import subprocess
+
+from common import repoDir
+
+sys.path.insert(0, repoDir)
+import gnupg
+from rsh import credAgent
+
+passphrase = 'bench'
+
+
+def decryptAndScan(gpg, gpgFile, host):
+    with open(gpgFile, 'rb') as f:
+        decryptedData = str(gpg.decrypt_file(f, passphrase=passphrase))
+    for line in decryptedData.splitlines():
+        hostRegex, rootPasswd = line.split('\t')[:2]
+        if re.search(r'' + hostRegex, host, re.IGNORECASE):
+            return rootPasswd
+    return None
+
+
+if __name__ == "__main__":
+    entriesCount = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    with tempfile.TemporaryDirectory() as homeDir:
+        gpg = gnupg.GPG(gnupghome=homeDir)
+        data = '\n'.join(f"^srv{i}-(web|db)\\.example\\.com$\tpass{i}" for i in range(entriesCount)) + '\n.*\tdefault\n'
+        gpgFile = os.path.join(homeDir, 'pass.gpg')
+        gpg.encrypt(data, recipients=None, symmetric=True, passphrase=passphrase, output=gpgFile)
+        host = f"srv{entriesCount - 1}-db.example.com"
+
+        started = time.perf_counter()
+        for _ in range(lookups):
+            assert decryptAndScan(gpg, gpgFile, host) == f"pass{entriesCount - 1}"
+        decryptPerLookup = (time.perf_counter() - started) / lookups
+
+        cfg = {'gpgFile': gpgFile, 'sr': {'credAgent': {'enable': True, 'ttl': 60, 'socketPath': os.path.join(homeDir, 'agent.sock')}}}
+        credAgent.start(cfg, credAgent.PasswordTable(data))
+        started = time.perf_counter()
+        for _ in range(lookups * 100):
+            assert credAgent.getPassword(cfg, host) == f"pass{entriesCount - 1}"
+        agentPerLookup = (time.perf_counter() - started) / (lookups * 100)
+        credAgent.lock(cfg)
+        subprocess.run(['gpgconf', '--homedir', homeDir, '--kill', 'gpg-agent'], check=False)
+
+        print(f"{'entries':>8} {'decrypt+scan, ms':>17} {'agent, ms':>10} {'speedup':>8}")
+        print(f"{entriesCount:>8} {decryptPerLookup * 1000:>17.2f} {agentPerLookup * 1000:>10.3f} {decryptPerLookup / agentPerLookup:>7.0f}x")
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# compare pExec execution backends (thread / asyncio) against the local
+# ssh stand-in: wall time and peak RSS of the pExec process per host count
+#
+# usage: python3 bench/execBackendBench.py [hostsCount ...]
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+import yaml
+
+from common import benchEnv, entryPoint
+from sshStandIn import startServerThread, makeClientKey, addKnownHosts
+
+
+def runPExec(homeDir, env, args):
+    start = time.perf_counter()
+    process = subprocess.Popen(entryPoint('pExec') + args, env=env, cwd=homeDir, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, rusage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    stderr = process.stderr.read().decode()
+    return elapsed, rusage.ru_maxrss / 1024, os.waitstatus_to_exitcode(status), stderr
+
+
+if __name__ == "__main__":
+    sizes = [int(x) for x in sys.argv[1:]] or [100, 500]
+    port = startServerThread(commandDelay=0.2)
+
+    print(f"{'hosts':>6} {'backend':>8} {'forks':>6} {'time, s':>8} {'peak RSS, MB':>13} {'exit':>5}")
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as homeDir:
+            inventory = {
+                'hosts': {f"h{i}": {'sshHost': f"127.0.0.1:{port}"} for i in range(size)},
+                'groups': {'bench': [f"h{i}" for i in range(size)]},
+            }
+            with open(os.path.join(homeDir, 'inventory.yaml'), 'w') as f:
+                yaml.dump(inventory, f)
+            makeClientKey(homeDir)
+            addKnownHosts(homeDir, port)
+            env = benchEnv(homeDir)
+            for backend, forks in (('thread', 200), ('asyncio', 200), ('asyncio', 0)):
+                elapsed, rssMb, exitCode, stderr = runPExec(homeDir, env, ['--backend', backend, '--forks', str(forks), 'bench', 'true'])
+                print(f"{size:>6} {backend:>8} {forks:>6} {elapsed:>8.2f} {rssMb:>13.1f} {exitCode:>5}", flush=True)
+                if exitCode:
+                    print(stderr.strip().splitlines()[-1])
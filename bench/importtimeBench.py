@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# import-time regression benchmark for rsh entry points, based on `python -X importtime`
+#
+# usage:
+#   python3 bench/importtimeBench.py                          # print report
+#   python3 bench/importtimeBench.py --save baseline.json     # save report as baseline
+#   python3 bench/importtimeBench.py --baseline baseline.json # fail if startup regressed
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+from common import benchEnv, repoDir
+
+entryPoints = [
+    'sExec',
+    'pExec',
+    'sr',
+    'rshCompgen.py',
+    'rshInventory.py',
+]
+
+# heavy modules that must be imported only by entry points really using them
+heavyModules = [
+    'yaml',
+    'deepmerge',
+    'fabric',
+    'paramiko',
+    'ovh',
+    'requests',
+    'gnupg',
+    'pexpect',
+]
+
+# load entry point without running its __main__ block
+loaderCode = """
+import sys, runpy
+sys.argv = [sys.argv[1], '--help']
+try:
+    runpy.run_path(sys.argv[0])
+except SystemExit:
+    pass
+"""
+
+
+def importTime(entryPoint, env, cwd):
+    """
+    return (total import time in ms, set of imported top-level modules)
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', loaderCode, os.path.join(repoDir, entryPoint)],
+        env=env, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+    )
+    totalUs = 0
+    modules = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        selfUs, _, name = line[len('import time:'):].split('|')
+        totalUs += int(selfUs)
+        modules.add(name.strip().split('.')[0])
+    return totalUs / 1000, modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--save', help='save report as baseline json file')
+    parser.add_argument('--baseline', help='compare with baseline json file')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative slowdown vs baseline')
+    args = parser.parse_args()
+
+    report = dict()
+    with tempfile.TemporaryDirectory() as homeDir:
+        env = benchEnv(homeDir)
+        print(f"{'entry point':<16} {'import, ms':>11}  heavy modules")
+        for entryPoint in entryPoints:
+            samples = list()
+            for _ in range(args.repeat):
+                totalMs, modules = importTime(entryPoint, env, homeDir)
+                samples.append(totalMs)
+            heavy = sorted(m for m in heavyModules if m in modules)
+            report[entryPoint] = {'importMs': round(statistics.median(samples), 2), 'heavyModules': heavy}
+            print(f"{entryPoint:<16} {report[entryPoint]['importMs']:>11.2f}  {','.join(heavy) or '-'}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=4)
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = list()
+        for entryPoint, info in report.items():
+            base = baseline.get(entryPoint)
+            if not base:
+                continue
+            if info['importMs'] > base['importMs'] * (1 + args.tolerance):
+                regressions.append(f"{entryPoint}: {base['importMs']} ms -> {info['importMs']} ms")
+            newHeavy = set(info['heavyModules']) - set(base['heavyModules'])
+            if newHeavy:
+                regressions.append(f"{entryPoint}: new heavy imports {','.join(sorted(newHeavy))}")
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# measure rsh.inventoryBuilder.buildInventory() time and peak RSS
+# for a synthetic provider at different fleet sizes, every size runs
+# in a separate process so peak RSS is not shared between sizes
+#
+# usage: python3 bench/inventoryBuildBench.py [instancesCount ...]
+
+import os
+import sys
+import time
+import copy
+import resource
+import subprocess
+
+from common import repoDir
+sys.path.insert(0, repoDir)
+
+
+def syntheticInstancesInfo(instancesCount, tagGroups=2000):
+    """
+    return instancesInfo() like list of synthetic aws instances
+    """
+    roles = ['web', 'db', 'cache', 'queue', 'worker']
+    instancesInfo = list()
+    for i in range(instancesCount):
+        host = f"srv{i}-{roles[i % len(roles)]}.aws"
+        instancesInfo.append({
+            'dc': f"eu-central-1{'abc'[i % 3]}",
+            'tags': [
+                {'Key': 'Name', 'Value': host},
+                {'Key': 'role', 'Value': roles[i % len(roles)]},
+                {'Key': 'group', 'Value': f"g{i % tagGroups}"},
+                {'Key': 'managed_by', 'Value': 'puppet'},
+            ],
+            'host': host,
+            'rshInventoryModule': 'awsInventory',
+            'hosting': 'aws',
+            'sshHost': f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            'PrivateIpAddress': f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}",
+            'PublicIpAddress': 'unknown',
+        })
+    return instancesInfo
+
+
+def runOne(instancesCount):
+    import rsh.config
+    from rsh.inventoryBuilder import buildInventory
+
+    cfg = copy.deepcopy(rsh.config.defaultCfg)
+    instancesInfo = syntheticInstancesInfo(instancesCount)
+    start = time.perf_counter()
+    inventory, hostsMeta = buildInventory(instancesInfo, cfg)
+    elapsed = time.perf_counter() - start
+    peakRssMb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{instancesCount:>8} {len(inventory['groups']):>8} {elapsed:>10.3f} {peakRssMb:>14.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 2 and sys.argv[1] == '--one':
+        runOne(int(sys.argv[2]))
+        sys.exit(0)
+
+    sizes = [int(x) for x in sys.argv[1:]] or [1000, 10000, 100000, 200000]
+    print(f"{'hosts':>8} {'groups':>8} {'build, s':>10} {'peak RSS, MB':>14}", flush=True)
+    for size in sizes:
+        subprocess.run([sys.executable, os.path.abspath(__file__), '--one', str(size)], check=True)
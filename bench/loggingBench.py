@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# logging overhead of an inventory build (rshInventory.py debug payloads plus
+# one plugin debug line per instance) at info and debug level:
+#   old - eager json.dumps payloads, redaction regex rebuilt per record, handler in the caller thread
+#   new - LazyJson payloads, rsh.config.Redactor compiled once, DeferredQueueHandler + listener thread (formats)
+# "caller" is the time the build spends in its own thread, "total" includes
+# draining the log queue to the file
+#
+# usage: python3 bench/loggingBench.py [instancesCount]
+
+import os
+import re
+import sys
+import json
+import time
+import queue
+import logging
+import logging.handlers
+import tempfile
+
+from common import repoDir
+from inventoryBuildBench import syntheticInstancesInfo
+sys.path.insert(0, repoDir)
+import rsh.config
+from rsh.inventoryBuilder import buildInventory
+
+logFormat = '%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s'
+sensitiveValues = ['ovh-app-key-0123456789', 'ovh-app-secret-abcdef', 'ovh-consumer-key-42']
+
+
+class OldSensitiveFormatter(logging.Formatter):
+    """SensitiveFormatter before the precompiled Redactor"""
+    def format(self, record):
+        original = logging.Formatter.format(self, record)
+        return re.compile('|'.join(sensitiveValues)).sub('[CLASSIFIED]', original)
+
+
+class NewSensitiveFormatter(logging.Formatter):
+    def __init__(self, fmt):
+        super().__init__(fmt)
+        self.redactor = rsh.config.Redactor(sensitiveValues)
+
+    def format(self, record):
+        return self.redactor(logging.Formatter.format(self, record))
+
+
+def inventoryBuild(logger, instancesInfo, cfg, lazy):
+    defName = "main"
+    for instanceInfo in instancesInfo:
+        logger.debug(f"instancesInfo: got instance name='{instanceInfo['host']}' dc='{instanceInfo['dc']}'")
+    if lazy:
+        logger.debug("%s: instancesInfoArray='%s'", defName, rsh.config.LazyJson(instancesInfo))
+    else:
+        logger.debug("%s: instancesInfoArray='%s'" % (defName, json.dumps(instancesInfo, indent=4)))
+    inventory, _ = buildInventory(instancesInfo, cfg)
+    if lazy:
+        logger.debug("%s: inventory='%s'", defName, inventory)
+    else:
+        logger.debug("%s: inventory='%s'" % (defName, inventory))
+    logger.info(f"{defName}: inventory hosts={len(inventory['hosts'])} groups={len(inventory['groups'])}")
+
+
+def run(mode, level, instancesInfo, cfg, logFilePath):
+    fileHandler = logging.FileHandler(logFilePath, mode='w')
+    logger = logging.getLogger(f"bench.{mode}.{level}")
+    logger.propagate = False
+    logger.setLevel(level)
+    listener = None
+    if mode == 'old':
+        fileHandler.setFormatter(OldSensitiveFormatter(logFormat))
+        logger.addHandler(fileHandler)
+    else:
+        fileHandler.setFormatter(NewSensitiveFormatter(logFormat))
+        logQueue = queue.SimpleQueue()
+        logger.addHandler(rsh.config.DeferredQueueHandler(logQueue))
+        listener = logging.handlers.QueueListener(logQueue, fileHandler)
+        listener.start()
+
+    start = time.perf_counter()
+    inventoryBuild(logger, instancesInfo, cfg, lazy=(mode == 'new'))
+    caller = time.perf_counter() - start
+    if listener:
+        listener.stop()
+    fileHandler.close()
+    total = time.perf_counter() - start
+    return caller, total, os.path.getsize(logFilePath)
+
+
+if __name__ == "__main__":
+    instancesCount = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    cfg = rsh.config.defaultCfg
+    instancesInfo = syntheticInstancesInfo(instancesCount)
+
+    with tempfile.TemporaryDirectory() as tmpDir:
+        print(f"{'hosts':>8} {'level':>6} {'mode':>5} {'caller, s':>10} {'total, s':>9} {'log, MB':>8}")
+        for level in (logging.INFO, logging.DEBUG):
+            for mode in ('old', 'new'):
+                caller, total, size = run(mode, level, instancesInfo, cfg, os.path.join(tmpDir, f"{mode}.log"))
+                print(f"{instancesCount:>8} {logging.getLevelName(level):>6} {mode:>5} {caller:>10.3f} {total:>9.3f} {size / 2**20:>8.1f}", flush=True)
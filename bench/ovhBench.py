@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# run ovhInventory against a local stand-in for the ovh api
+# (fixed per-request latency, every Nth request answered with 429)
+# and report refresh time for cold and warm details cache
+#
+# usage: python3 bench/ovhBench.py [serversCount] [latencyMs]
+
+import os
+import sys
+import copy
+import json
+import time
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from common import repoDir
+sys.path.insert(0, repoDir)
+import rsh.config
+import ovh
+from rsh.ovhInventory import ovhInventory
+
+serversCount = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+latency = (int(sys.argv[2]) if len(sys.argv) > 2 else 20) / 1000
+rateLimitEvery = 50
+requestsCount = 0
+requestsLock = threading.Lock()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        global requestsCount
+        path = self.path[len('/1.0'):]
+        with requestsLock:
+            requestsCount += 1
+            throttled = requestsCount % rateLimitEvery == 0
+        time.sleep(latency)
+        if path == '/auth/time':
+            return self.reply(200, int(time.time()))
+        if throttled:
+            return self.reply(429, {'message': 'Too many requests'}, {'Retry-After': '0.05'})
+        parts = path.strip('/').split('/')
+        if parts == ['dedicated', 'server']:
+            return self.reply(200, [f"ns{i}.ip-1-2-3.eu" for i in range(serversCount)])
+        if parts[:2] == ['dedicated', 'server'] and len(parts) == 4 and parts[3] == 'serviceInfos':
+            return self.reply(200, {'serviceId': int(parts[2][2:].split('.')[0])})
+        if parts[:2] == ['dedicated', 'server'] and len(parts) == 3:
+            return self.reply(200, {'name': parts[2], 'ip': '1.2.3.4', 'availabilityZone': 'unknown', 'datacenter': 'gra1'})
+        if parts[0] == 'services' and len(parts) == 2:
+            return self.reply(200, {'resource': {'displayName': f"srv{parts[1]}.ovh"}})
+        return self.reply(404, {'message': 'not found'})
+
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as cacheDir:
+        cfg = copy.deepcopy(rsh.config.cfg)
+        # register the stand-in as an ovh endpoint, bench only
+        standInEndpoint = f"http://127.0.0.1:{server.server_port}/1.0"
+        ovh.client.ENDPOINTS[standInEndpoint] = standInEndpoint
+        cfg['ovhInventory']['api']['endpoint'] = standInEndpoint
+        cfg['ovhInventory']['detailsCacheFile'] = os.path.join(cacheDir, 'ovhInventory.details.json')
+        print(f"servers={serversCount} latency={latency * 1000:.0f}ms maxWorkers={cfg['ovhInventory']['maxWorkers']}")
+        for run in ('cold', 'warm'):
+            requestsCount = 0
+            start = time.perf_counter()
+            instances = ovhInventory(cfg).instancesInfo()
+            elapsed = time.perf_counter() - start
+            print(f"{run:>5}: {elapsed:.2f}s, instances={len(instances)}, api requests={requestsCount}")
+    server.shutdown()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# sExec wall time with and without connecting to the next hosts ahead
+# (--lookahead) against the local ssh stand-in
+#
+# usage: python3 bench/sExecLookaheadBench.py [hostsCount]
+
+import os
+import sys
+import tempfile
+import yaml
+
+from common import benchEnv, entryPoint, timeRun
+from sshStandIn import startServerThread, makeClientKey
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    port = startServerThread(commandDelay=0.1)
+
+    with tempfile.TemporaryDirectory() as homeDir:
+        inventory = {
+            'hosts': {f"h{i}": {'sshHost': f"127.0.0.1:{port}"} for i in range(size)},
+            'groups': {'bench': [f"h{i}" for i in range(size)]},
+        }
+        with open(os.path.join(homeDir, 'inventory.yaml'), 'w') as f:
+            yaml.dump(inventory, f)
+        makeClientKey(homeDir)
+        env = benchEnv(homeDir)
+
+        print(f"{'hosts':>6} {'lookahead':>10} {'time, s':>8} {'per host, ms':>13}")
+        for lookahead in (0, 1, 2):
+            elapsed = timeRun(entryPoint('sExec') + ['--lookahead', str(lookahead), 'bench', 'true'], env, cwd=homeDir)
+            print(f"{size:>6} {lookahead:>10} {elapsed:>8.2f} {elapsed / size * 1000:>13.1f}", flush=True)
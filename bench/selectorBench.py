@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# host selector resolution on a synthetic inventory: a union of many tag
+# groups (the old per-item list scan, no dedup) vs rsh.inventorySelector on
+# group bitmaps, cold (index and bitmaps built) and warm (bitmaps memoized),
+# plus a selector with intersection and exclusions
+#
+# usage: python3 bench/selectorBench.py [instancesCount] [groupsCount]
+
+import sys
+import copy
+import time
+
+from common import repoDir
+from inventoryBuildBench import syntheticInstancesInfo
+sys.path.insert(0, repoDir)
+import rsh.config
+from rsh.inventoryBuilder import buildInventory
+from rsh import inventorySelector
+
+
+def oldResolve(hosts_or_groups, inventory):
+    """resolve_host_names before selectors"""
+    hosts = []
+    for item in hosts_or_groups:
+        group_hosts = inventory.get('groups', {}).get(item)
+        if group_hosts:
+            for host in group_hosts:
+                hosts.append((host, inventory.get('hosts', {}).get(host, {}).get('sshHost', host)))
+        else:
+            hosts.append((item, item))
+    return hosts
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    instancesCount = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    groupsCount = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    inventory, _ = buildInventory(syntheticInstancesInfo(instancesCount), copy.deepcopy(rsh.config.defaultCfg))
+    groups = [f"tag_group_g{i}" for i in range(groupsCount)]
+
+    old, oldMs = timed(oldResolve, groups, inventory)
+    index, indexMs = timed(inventorySelector.HostIndex.fromInventory, inventory)
+    new, coldMs = timed(inventorySelector.resolve, groups, index)
+    _, warmMs = timed(inventorySelector.resolve, groups, index)
+    assert sorted(set(old)) == sorted(new)
+    selector = ['|'.join(groups) + '&tag_role_web', '!tag_group_g1', '/^srv1[0-9]*-/']
+    picked, algebraMs = timed(inventorySelector.resolve, selector, index)
+
+    print(f"{'hosts':>8} {'groups':>7} {'old, ms':>8} {'index, ms':>10} {'cold, ms':>9} {'warm, ms':>9} {'algebra, ms':>12} {'picked':>7}")
+    print(f"{instancesCount:>8} {groupsCount:>7} {oldMs:>8.1f} {indexMs:>10.1f} {coldMs:>9.1f} {warmMs:>9.1f} {algebraMs:>12.1f} {len(picked):>7}")
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# per-host latency of running a command against the local ssh stand-in:
+# paramiko (fabric) connection per run vs shared ssh master connection (sshMux),
+# cold (no master yet) and warm (master alive from the previous run)
+#
+# usage: python3 bench/sshMuxBench.py [hostsCount]
+
+import os
+import sys
+import time
+import tempfile
+import statistics
+import subprocess
+
+from common import repoDir
+from sshStandIn import startServerThread, makeClientKey
+
+if __name__ == "__main__":
+    hostsCount = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    port = startServerThread()
+
+    with tempfile.TemporaryDirectory() as homeDir:
+        makeClientKey(homeDir)
+        os.environ['HOME'] = homeDir
+        os.environ.pop('SSH_AUTH_SOCK', None)
+        with open(os.path.join(homeDir, '.rsh.yaml'), 'w') as f:
+            f.write(
+                "sshMux:\n"
+                "  enable: true\n"
+                "  controlPersist: 60\n"
+                "  sshCommand: 'ssh -o StrictHostKeyChecking=no -o UserKnownHostsFile=/dev/null -o BatchMode=yes -o LogLevel=ERROR"
+                f" -F /dev/null -i {homeDir}/.ssh/id_ed25519'\n"  # ssh takes ~ from passwd, not $HOME
+            )
+        os.chdir(homeDir)
+        sys.path.insert(0, repoDir)
+        import rsh.config
+        from rsh import exec_functions, ssh_mux
+
+        # distinct users -> distinct master connections to the same stand-in
+        hosts = [f"u{i}@127.0.0.1:{port}" for i in range(hostsCount)]
+
+        def perHost(run):
+            samples = list()
+            for host in hosts:
+                start = time.perf_counter()
+                run(host)
+                samples.append(time.perf_counter() - start)
+            return statistics.median(samples) * 1000, max(samples) * 1000
+
+        rsh.config.cfg['sshMux']['enable'] = False
+        paramiko = perHost(lambda host: exec_functions._run_host(host, 'true'))
+        rsh.config.cfg['sshMux']['enable'] = True
+        cold = perHost(lambda host: ssh_mux.run_host(host, 'true'))
+        warm = perHost(lambda host: ssh_mux.run_host(host, 'true'))
+
+        print(f"hosts={hostsCount}")
+        print(f"{'mode':<22} {'p50, ms':>8} {'max, ms':>8}")
+        for name, (p50, worst) in (('paramiko per run', paramiko), ('sshMux cold', cold), ('sshMux warm', warm)):
+            print(f"{name:<22} {p50:>8.1f} {worst:>8.1f}")
+
+        # stop master connections
+        for host in hosts:
+            subprocess.run(ssh_mux.ssh_argv(host, ['-O', 'exit']), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
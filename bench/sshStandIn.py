@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# local ssh server stand-in (asyncssh) for executor benchmarks:
+# accepts any user with any public key, answers every command with
+# a fixed output after an optional delay, sudo prefix included
+#
+# usage: python3 bench/sshStandIn.py [port] [commandDelayMs]
+
+import os
+import sys
+import asyncio
+import tempfile
+import logging
+import threading
+
+import asyncssh
+
+logging.getLogger('asyncssh').setLevel(logging.WARNING)
+
+hostKeys = {}   # port -> server host public key (openssh format) of started stand-ins
+
+
+class StandInServer(asyncssh.SSHServer):
+    def begin_auth(self, username):
+        return True
+
+    def public_key_auth_supported(self):
+        return True
+
+    def validate_public_key(self, username, key):
+        return True  # any client key is accepted
+
+
+def makeProcessHandler(commandDelay, output):
+    async def handleProcess(process):
+        if commandDelay:
+            await asyncio.sleep(commandDelay)
+        process.stdout.write(output)
+        process.exit(0)
+    return handleProcess
+
+
+async def startServer(port=0, commandDelay=0.0, output='ok\n'):
+    keyDir = tempfile.mkdtemp(prefix='rshSshStandIn')
+    keyPath = os.path.join(keyDir, 'host_key')
+    hostKey = asyncssh.generate_private_key('ssh-ed25519')
+    hostKey.write_private_key(keyPath)
+    server = await asyncssh.create_server(
+        StandInServer, '127.0.0.1', port,
+        server_host_keys=[keyPath],
+        process_factory=makeProcessHandler(commandDelay, output),
+        backlog=4096,
+    )
+    port = server.sockets[0].getsockname()[1]
+    hostKeys[port] = hostKey.export_public_key().decode().strip()
+    return server, port
+
+
+def makeClientKey(homeDir):
+    """
+    create ~/.ssh/id_ed25519 in homeDir, picked up by both paramiko and asyncssh
+    """
+    sshDir = os.path.join(homeDir, '.ssh')
+    os.makedirs(sshDir, mode=0o700, exist_ok=True)
+    keyPath = os.path.join(sshDir, 'id_ed25519')
+    asyncssh.generate_private_key('ssh-ed25519').write_private_key(keyPath)
+    os.chmod(keyPath, 0o600)
+
+
+def addKnownHosts(homeDir, *ports):
+    """
+    trust host keys of stand-ins on ports in homeDir/.ssh/known_hosts
+    """
+    sshDir = os.path.join(homeDir, '.ssh')
+    os.makedirs(sshDir, mode=0o700, exist_ok=True)
+    with open(os.path.join(sshDir, 'known_hosts'), 'a') as f:
+        for port in ports:
+            f.write(f"[127.0.0.1]:{port} {hostKeys[port]}\n")
+
+
+def startServerThread(commandDelay=0.0, output='ok\n'):
+    """
+    run stand-in server in a background thread, return its port
+    """
+    ready = threading.Event()
+    state = {}
+
+    def run():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        _, state['port'] = loop.run_until_complete(startServer(0, commandDelay, output))
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return state['port']
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 2222
+    commandDelay = (int(sys.argv[2]) if len(sys.argv) > 2 else 0) / 1000
+    loop = asyncio.new_event_loop()
+    _, port = loop.run_until_complete(startServer(port, commandDelay))
+    print(f"ssh stand-in listening on 127.0.0.1:{port}")
+    loop.run_forever()
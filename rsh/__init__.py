@@ -1,3 +1,17 @@
-from rsh.awsInventory import awsInventory
-from rsh.ovhInventory import ovhInventory
-from rsh.gceInventory import gceInventory
+import importlib
+
+# inventory plugins are imported on first access (rsh.awsInventory),
+# so entry points that never touch them don't pay for provider SDKs
+inventoryPlugins = (
+    'awsInventory',
+    'ovhInventory',
+    'gceInventory',
+)
+
+def __getattr__(name):
+    if name in inventoryPlugins:
+        module = importlib.import_module(f"rsh.{name}")
+        klass = getattr(module, name)
+        globals()[name] = klass
+        return klass
+    raise AttributeError(f"module 'rsh' has no attribute '{name}'")
@@ -5,19 +5,24 @@ import sys
 sys.path.append('/opt/rsh')
 import rsh.config
 import inspect
+import json
 import re
 import os
 import yaml
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from .common import CommonMixin
 
+fieldNameRegex = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
 class awsInventory(
     CommonMixin,
     ):
     def __init__(self, cfg):
         self.logger = logging.getLogger(__name__)
         self.cfg = cfg
+        self.incomplete = False # set when a region failed and instancesInfo() skipped it
 
     def regionInstancesInfo(self,region):
         """
@@ -27,49 +32,68 @@ class awsInventory(
         defName = inspect.stack()[0][3]
 
         instancesInfo = list()
-        describeInstances = self.runCmd("aws ec2 --region %s describe-instances" % region)['stdout']
-        reservations = describeInstances['Reservations']
-        for reservation in reservations:
-            instances = reservation['Instances']
-            for instance in instances:
-                if self.cfg['awsInventory']['skipNotRunningInstance']:
-                    if instance['State']['Name'] != 'running':
-                        continue
-                try:
-                    dc = instance['Placement']['AvailabilityZone']
-                except:
-                    self.logger.error(f"{defName}: failed get Placement.AvailabilityZone from instance={instance}")
-                    exit(1)
-                tags = instance.get('Tags', []) # tags is optional
-                info = {
-                    'dc': dc,
-                    'tags': tags,
-                }
-                for tag in tags:
-                    if tag['Key'] == 'Name':
-                        info['host'] = tag['Value']
-
-                if self.cfg['awsInventory']['nameSuffix']:
-                    # set name suffix if need
-                    info['host'] = info['host'] + self.cfg['awsInventory']['nameSuffix']
-
-                # add default tag
-                # added rsh inventory info {{
-                info['rshInventoryModule'] = self.__class__.__name__
-                info['hosting'] = 'aws'
-                # }}
-
-                # addication data
-                for hostInfoField in self.cfg['awsInventory']['hostInfoFields']:
-                    info[hostInfoField] = instance.get(hostInfoField, 'unknown')
-
-                # ssh host field
-                info['sshHost'] = info.get(self.cfg['awsInventory']['sshHostField'], 'unknown')
-
-                if info not in instancesInfo:
-                    instancesInfo.append(info)
+        seenInstances = set() # serialized infos, O(1) duplicate check
+        # filter and project on the provider side, only kept instances with
+        # needed fields come through the pipe, parsed one by one {{
+        command = ['aws', 'ec2', 'describe-instances', '--region', region, '--output', 'json']
+        if self.cfg['awsInventory']['skipNotRunningInstance']:
+            command += ['--filters', 'Name=instance-state-name,Values=running']
+        command += ['--query', self.instancesQuery()]
+        instances = self.runCmd(command, stream=True, timeout=self.cfg['awsInventory']['regionTimeout'])
+        # }}
+        for instance in instances:
+            if self.cfg['awsInventory']['skipNotRunningInstance']:
+                if (instance.get('State') or {}).get('Name') != 'running':
+                    continue
+            try:
+                dc = instance['Placement']['AvailabilityZone']
+            except:
+                raise ValueError(f"{defName}: failed get Placement.AvailabilityZone from instance={instance}")
+            tags = instance.get('Tags') or [] # tags is optional
+            info = {
+                'dc': dc,
+                'tags': tags,
+            }
+            for tag in tags:
+                if tag['Key'] == 'Name':
+                    info['host'] = tag['Value']
+
+            if self.cfg['awsInventory']['nameSuffix']:
+                # set name suffix if need
+                info['host'] = info['host'] + self.cfg['awsInventory']['nameSuffix']
+
+            # add default tag
+            # added rsh inventory info {{
+            info['rshInventoryModule'] = self.__class__.__name__
+            info['hosting'] = 'aws'
+            # }}
+
+            # addication data
+            for hostInfoField in self.cfg['awsInventory']['hostInfoFields']:
+                # the --query projection gives null for missing fields
+                value = instance.get(hostInfoField)
+                info[hostInfoField] = value if value is not None else 'unknown'
+
+            # ssh host field
+            info['sshHost'] = info.get(self.cfg['awsInventory']['sshHostField'], 'unknown')
+
+            infoKey = json.dumps(info, sort_keys=True)
+            if infoKey not in seenInstances:
+                seenInstances.add(infoKey)
+                instancesInfo.append(info)
         return instancesInfo
 
+    def instancesQuery(self):
+        """
+        --query for describe-instances: flat list of instances with only the
+        fields regionInstancesInfo reads, all fields if a hostInfoFields item
+        isn't a plain field name
+        """
+        fields = ['State', 'Placement', 'Tags'] + self.cfg['awsInventory']['hostInfoFields']
+        if not all(fieldNameRegex.fullmatch(field) for field in fields):
+            return 'Reservations[].Instances[]'
+        return 'Reservations[].Instances[].{' + ', '.join(f"{field}: {field}" for field in dict.fromkeys(fields)) + '}'
+
     def instancesInfo(self):
         """
         return info for all instances
@@ -110,9 +134,18 @@ class awsInventory(
         if self.cfg['awsInventory']['regions']:
             regions = self.cfg['awsInventory']['regions']
         else:
-            regions = self.runCmd("aws ec2 describe-regions --query 'Regions[].RegionName'")['stdout']
-        self.logger.debug("%s: regions='%s'" % (defName,regions))
+            regions = self.runCmd(['aws', 'ec2', 'describe-regions', '--output', 'json', '--query', 'Regions[].RegionName'])['stdout']
+        self.logger.debug("%s: regions='%s'", defName, regions)
+
+        # query regions concurrently, a failed or slow region is logged and skipped {{
         instancesInfoArray = list()
-        for region in regions:
-            instancesInfoArray = instancesInfoArray + self.regionInstancesInfo(region)
+        with ThreadPoolExecutor(max_workers=self.cfg['awsInventory']['maxWorkers']) as executor:
+            futures = [(region, executor.submit(self.regionInstancesInfo, region)) for region in regions]
+            for region, future in futures:
+                try:
+                    instancesInfoArray.extend(future.result())
+                except Exception as e:
+                    self.incomplete = True
+                    self.logger.error(f"{defName}: failed get instances from region='{region}', skipping, error: '{e!r}'")
+        # }}
         return instancesInfoArray
@@ -4,25 +4,95 @@
 import inspect
 import logging
 import subprocess
+import signal
+import shlex
+import os
 import json
+import tempfile
+import threading
 import traceback
 
+
+def iterJsonArray(stream, chunkSize=1 << 16):
+    """
+    yield the elements of the top level json array read from text stream,
+    each as soon as it is complete, without holding the whole document
+    """
+    decoder = json.JSONDecoder()
+    buf = ''
+    pos = 0
+    eof = False
+    started = False
+    while True:
+        while pos < len(buf) and buf[pos] in ' \t\r\n':
+            pos += 1
+        if pos < len(buf) and not started:
+            if buf[pos] != '[':
+                raise ValueError(f"expected json array, got '{buf[pos:pos+20]}'")
+            started = True
+            pos += 1
+            continue
+        if pos < len(buf) and buf[pos] == ']':
+            return
+        if pos < len(buf) and buf[pos] == ',':
+            pos += 1
+            continue
+        if pos < len(buf):
+            try:
+                element, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                end = None
+            # an element is complete only when ',' or ']' follows: a number
+            # split at a chunk boundary ('4' + '.5') decodes early otherwise
+            if end is not None:
+                after = end
+                while after < len(buf) and buf[after] in ' \t\r\n':
+                    after += 1
+                if (after < len(buf) and buf[after] in ',]') or (after == len(buf) and eof):
+                    yield element
+                    pos = end
+                    continue
+        if eof:
+            raise ValueError(f"truncated json array at '{buf[pos:pos+20]}'")
+        chunk = stream.read(chunkSize)
+        eof = not chunk
+        buf, pos = buf[pos:] + chunk, 0
+
+
 # common functions
 class CommonMixin:
-    def runCmd(self,commands,communicate=True,stdoutJson=True):
+    def runCmd(self,commands,communicate=True,stdoutJson=True,timeout=None,stream=False):
         """ run shell command, returned hash:
         {
             "stdout": stdout,
             "stderr": stderr,
             "exitCode": exitCode,
         }
+        commands given as argv list run without the bash intermediary
+        with timeout (seconds) the whole process group is killed and
+        subprocess.TimeoutExpired is raised when the command runs longer
+        with stream=True returns an iterator over the elements of the json
+        array the command prints, each parsed as soon as it is complete
+        (see _runCmdStream), instead of the hash
         """
 
+        if stream:
+            return self._runCmdStream(commands, timeout)
         defName = inspect.stack()[0][3]
-        self.logger.debug("%s: '%s'" % (defName,commands))
+        self.logger.debug("%s: '%s'", defName, commands)
         if communicate:
-            process = subprocess.Popen('/bin/bash', stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True)
-            out, err = process.communicate(commands.encode())
+            if isinstance(commands, str):
+                process = subprocess.Popen('/bin/bash', stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, shell=True, start_new_session=timeout is not None)
+                stdin = commands.encode()
+            else:
+                process = subprocess.Popen(commands, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, start_new_session=timeout is not None)
+                stdin = None
+            try:
+                out, err = process.communicate(stdin, timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+                process.communicate()
+                raise
             returnCode = process.returncode
             try:
                 outFormatted = out.rstrip().decode("utf-8")
@@ -32,7 +102,7 @@ class CommonMixin:
                 try:
                     stdout = json.loads(outFormatted)
                 except Exception:
-                    self.logger.logging.error("%s: failed runCmd, cmd='%s', error='%s'" % (defName,commands,traceback.format_exc()))
+                    self.logger.error("%s: failed runCmd, cmd='%s', error='%s'" % (defName,commands,traceback.format_exc()))
                     return None
             else:
                 stdout = outFormatted
@@ -44,3 +114,55 @@ class CommonMixin:
         else:
             subprocess.call(commands, shell=True)
             return None
+
+    def _runCmdStream(self, command, timeout=None):
+        """
+        run command (argv list or string split like a shell would, no shell)
+        and yield the elements of the json array it prints while it runs, so
+        only the records the caller keeps stay in memory; raise RuntimeError
+        when it exits non-zero and subprocess.TimeoutExpired (process group
+        killed) when it runs longer than timeout seconds
+        """
+
+        defName = "runCmd"
+        if isinstance(command, str):
+            command = shlex.split(command)
+        self.logger.debug("%s: stream '%s'", defName, command)
+        with tempfile.TemporaryFile() as errFile:
+            process = subprocess.Popen(
+                command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=errFile,
+                text=True, encoding='utf-8', start_new_session=True,
+            )
+            timedOut = threading.Event()
+
+            def kill():
+                timedOut.set()
+                os.killpg(process.pid, signal.SIGKILL)
+
+            timer = threading.Timer(timeout, kill) if timeout else None
+            if timer:
+                timer.start()
+            finished = False
+            parseError = None
+            try:
+                try:
+                    yield from iterJsonArray(process.stdout)
+                except ValueError as e:
+                    parseError = e
+                finished = True
+            finally:
+                if timer:
+                    timer.cancel()
+                if not finished and process.poll() is None:
+                    # consumer stopped early
+                    os.killpg(process.pid, signal.SIGKILL)
+                process.stdout.close()
+                returnCode = process.wait()
+            if timedOut.is_set():
+                raise subprocess.TimeoutExpired(command, timeout)
+            if returnCode != 0:
+                errFile.seek(0)
+                stderr = errFile.read().decode('utf-8', 'replace').strip()
+                raise RuntimeError(f"'{' '.join(command)}' exited with code {returnCode}: {stderr[-500:]}")
+            if parseError:
+                raise parseError
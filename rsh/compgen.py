@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# prebuilt completion index for rshCompgen.py
+#
+# file format (plain text, one name per line):
+#   rshCompgen<TAB>1<TAB><inventory mtime_ns><TAB><inventory size>
+#   [hosts]<TAB><count>
+#   <sorted host names>
+#   [groups]<TAB><count>
+#   <sorted group names>
+#
+# names are sorted in plain string order so a prefix query is a bisect
+# over the section instead of a scan over the whole inventory
+
+import os
+import bisect
+
+indexMagic = 'rshCompgen'
+indexVersion = '1'
+indexSections = ('hosts', 'groups')
+
+
+def inventoryKey(inventoryFilePath):
+    """
+    return (mtime_ns, size) of inventory file, used as index validity key
+    """
+    st = os.stat(inventoryFilePath)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def writeIndex(indexFilePath, inventory, key):
+    """
+    write completion index for inventory dict atomically
+    """
+    indexDir = os.path.dirname(indexFilePath)
+    if indexDir:
+        os.makedirs(indexDir, exist_ok=True)
+    lines = ['\t'.join([indexMagic, indexVersion, str(key[0]), str(key[1])])]
+    for section in indexSections:
+        names = sorted(inventory.get(section) or {})
+        lines.append(f"[{section}]\t{len(names)}")
+        lines.extend(names)
+    tmpFilePath = f"{indexFilePath}.{os.getpid()}.tmp"
+    try:
+        with open(tmpFilePath, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(tmpFilePath, indexFilePath)
+    except OSError:
+        try:
+            os.remove(tmpFilePath)
+        except OSError:
+            pass
+        raise
+
+
+def readIndex(indexFilePath, key):
+    """
+    return {section: sorted names} or None if index missing or stale
+    """
+    try:
+        with open(indexFilePath, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return None
+    if not lines:
+        return None
+    header = lines[0].split('\t')
+    if header != [indexMagic, indexVersion, str(key[0]), str(key[1])]:
+        return None
+
+    index = dict()
+    pos = 1
+    try:
+        for section in indexSections:
+            sectionName, count = lines[pos].split('\t')
+            if sectionName != f"[{section}]":
+                return None
+            count = int(count)
+            index[section] = lines[pos+1:pos+1+count]
+            pos += 1 + count
+    except (IndexError, ValueError):
+        return None
+    return index
+
+
+def prefixMatch(names, prefix):
+    """
+    return names starting with prefix, names must be sorted
+    """
+    if not prefix:
+        return names
+    start = bisect.bisect_left(names, prefix)
+    matched = list()
+    for name in names[start:]:
+        if not name.startswith(prefix):
+            break
+        matched.append(name)
+    return matched
@@ -4,11 +4,12 @@
 import os
 from os.path import expanduser
 import sys
-import yaml
 import re
-import logging
-import inspect
-from deepmerge import always_merger
+import logging as stdLogging
+import logging.handlers
+import queue
+import atexit
+import copy
 
 programName = 'rsh'
 homeDir = expanduser("~")
@@ -17,12 +18,19 @@ defaultConfigFiles = [
     homeDir + '/.' + programName + '.yaml',
     './.config.yaml',
 ]
-cfg = {
+defaultCfg = {
     #'logFile': homeDir + '/log/' + programName + '/' + programName + '.log',
     'logFile': 'stdout',
     'logLevel': 'info',
     'gpgFile': homeDir + '/.pass.gpg',
     'inventoryFilePath': homeDir + '/inventory.yaml',
+    'cacheDir': homeDir + '/.cache/' + programName,
+    'compgenIndexFilePath': None,   # prebuilt completion index for rshCompgen.py, default: <cacheDir>/compgen.idx
+    'inventoryDiffFilePath': None,  # json diff of the last inventory change written by rshInventory.py, default: <cacheDir>/inventory.diff.json
+    'inventoryDb': {
+        'enable': False,                    # also write indexed sqlite inventory and use it for host/group lookups
+        'filePath': None,                   # default: <cacheDir>/inventory.sqlite
+    },
     'sensitiveKeys': [
         'application_key',
         'application_secret',
@@ -43,6 +51,9 @@ cfg = {
             'PublicIpAddress',
         ],
         'nameSuffix': '.aws',               # suffix for instance names
+        'maxWorkers': 8,                    # regions queried concurrently
+        'regionTimeout': 300,               # seconds, slower regions are skipped with error
+        'cacheTtl': 0,                      # seconds, reuse cached instances between rshInventory.py runs, 0 - always query
     },
     'ovhInventory': {
         'enable': True,
@@ -59,6 +70,12 @@ cfg = {
             'internalName', # internal name
             'dc',
         ],
+        'maxWorkers': 8,                    # concurrent api requests, up to 10 reuse pooled connections
+        'maxRetries': 5,                    # retries on 429 (too many requests)
+        'retryBackoff': 1.0,                # seconds, doubled on every retry unless api sends Retry-After
+        'detailsCacheTtl': 86400,           # seconds, per-server details cache ttl, 0 - disable cache
+        'detailsCacheFile': None,           # default: <cacheDir>/ovhInventory.details.json
+        'cacheTtl': 0,                      # seconds, reuse cached instances between rshInventory.py runs, 0 - always query
     },
     'gceInventory': {
         'enable': True,
@@ -74,6 +91,45 @@ cfg = {
             'name',
         ],
         'nameSuffix': '.gc',                # suffix for instance names
+        'projects': [],                     # projects to query, empty - gcloud default project
+        'maxWorkers': 8,                    # projects queried concurrently
+        'projectTimeout': 300,              # seconds, slower projects are skipped with error
+        'cacheTtl': 0,                      # seconds, reuse cached instances between rshInventory.py runs, 0 - always query
+    },
+    'sshMux': {
+        'enable': False,                    # reuse ssh connections between sExec/pExec/sr runs (OpenSSH ControlMaster)
+        'controlPersist': 600,              # seconds, idle master connections are closed after this time
+        'controlDir': None,                 # control sockets dir, default: <cacheDir>/cm
+        'sshCommand': 'ssh -o ConnectTimeout=5 -o StrictHostKeyChecking=no -o BatchMode=yes', # ssh client for sExec/pExec
+    },
+    'sExec': {
+        'lookahead': 1,                     # hosts connected ahead of the one running the command (--lookahead), 0 - off
+    },
+    'pExec': {
+        'stream': False,                    # show live summary of unique outputs while hosts complete (--stream)
+        'forks': 0,                         # max hosts in flight (--forks), 0 - all hosts at once
+        'adaptive': False,                  # adapt concurrency to connect errors and handshake latency (--adaptive)
+        'adaptiveInitialForks': 32,         # starting window in adaptive mode
+        'adaptiveMinForks': 1,
+        'adaptiveSlowConnect': 3.0,         # seconds, slower handshakes shrink the window
+        'backend': 'thread',                # execution engine (--backend), variants: thread (fabric), asyncio (asyncssh)
+        'asyncMaxForks': 1000,              # max hosts in flight for asyncio backend when --forks is not set
+        'asyncAcceptUnknownHostKeys': False, # asyncio backend: accept hosts missing from known_hosts, keys conflicting with known_hosts are always rejected
+        'batch': 0,                         # hosts per wave (--batch), count or percent like '10%', 0 - all hosts in one wave
+        'maxFailures': 0,                   # batch mode: skip remaining waves once more hosts failed (--max-failures), count or percent
+        'spillThreshold': 0,                # bytes (--spill-threshold), larger outputs are written to per-host files in spillDir, 0 - off
+        'spillDir': None,                   # default: <cacheDir>/pExec
+        'normalize': [],                    # dedup normalization rules (--normalize): timestamp, pid, hostname or {'regex': ..., 'replace': ...}
+        'connectTimeout': 10,               # seconds per host for tcp connect, banner and auth (--connect-timeout), 0 - no limit
+        'commandTimeout': 0,                # seconds per host for the command (--command-timeout), 0 - no limit
+        'returnAfter': 1.0,                 # report once this fraction of hosts finished (--return-after), the rest are listed as stragglers
+    },
+    'pCopy': {
+        'mode': '0644',                     # file mode of installed copies (--mode)
+        'seeds': 1,                         # direct uploads from this machine per round (--seeds), the rest is relayed
+        'forks': 50,                        # max transfers or checks in flight (--forks)
+        'relay': False,                     # relay copies between hosts (--relay), forwards your ssh agent to holders
+        'relayCommand': 'scp -q -o ConnectTimeout=5 -o StrictHostKeyChecking=no -o BatchMode=yes', # run on holders, with forwarded ssh agent
     },
     'sr': {
         'ssh': {
@@ -84,48 +140,163 @@ cfg = {
         },
         'useInventorySshHost': True, # use sshHost from inventory for connect to host
         'escalatePrivilegesCommand': 'sudo -s -E', # variants: 'su -m', 'sudo -s', 'sudo -s -E'
-        'postLoginCommand': None # command will run after login, used to set up the environment
+        'postLoginCommand': None, # command will run after login, used to set up the environment
+        'credAgent': {
+            'enable': False,                # keep decrypted root passwords in a local agent process between sr runs
+            'ttl': 900,                     # seconds, the agent forgets the passwords and exits after this time
+            'socketPath': None,             # default: <cacheDir>/credAgent.sock
+        },
     },
 }
 
-# get settings
-for configFile in defaultConfigFiles:
-    if os.path.isfile(configFile):
+# config and logging are built on first access to rsh.config.cfg,
+# so importing rsh.config has no side effects {{
+def loadConfig():
+    """
+    return defaultCfg merged with config files
+    """
+    import yaml
+    from deepmerge import always_merger
+
+    cfg = copy.deepcopy(defaultCfg)
+    for configFile in defaultConfigFiles:
+        if os.path.isfile(configFile):
+            try:
+                with open(configFile, 'r') as ymlfile:
+                    try:
+                        cfg = always_merger.merge(cfg,yaml.load(ymlfile,Loader=yaml.Loader))
+                    except Exception as e:
+                        stdLogging.warning("main: skipping load load config file: '%s', error '%s'", configFile, e)
+                        continue
+            except:
+                continue
+
+    # fix compgenIndexFilePath
+    if not cfg['compgenIndexFilePath']:
+        cfg['compgenIndexFilePath'] = cfg['cacheDir'] + '/compgen.idx'
+
+    # fix inventoryDiffFilePath
+    if not cfg['inventoryDiffFilePath']:
+        cfg['inventoryDiffFilePath'] = cfg['cacheDir'] + '/inventory.diff.json'
+
+    # fix inventoryDb.filePath
+    if not cfg['inventoryDb']['filePath']:
+        cfg['inventoryDb']['filePath'] = cfg['cacheDir'] + '/inventory.sqlite'
+
+    # fix ovhInventory.detailsCacheFile
+    if not cfg['ovhInventory']['detailsCacheFile']:
+        cfg['ovhInventory']['detailsCacheFile'] = cfg['cacheDir'] + '/ovhInventory.details.json'
+
+    # fix sshMux.controlDir
+    if not cfg['sshMux']['controlDir']:
+        cfg['sshMux']['controlDir'] = cfg['cacheDir'] + '/cm'
+
+    # fix pExec.spillDir
+    if not cfg['pExec']['spillDir']:
+        cfg['pExec']['spillDir'] = cfg['cacheDir'] + '/pExec'
+
+    # fix sr.credAgent.socketPath
+    if not cfg['sr']['credAgent']['socketPath']:
+        cfg['sr']['credAgent']['socketPath'] = cfg['cacheDir'] + '/credAgent.sock'
+
+    # fix logDir
+    cfg['logDir'] = os.path.dirname(cfg['logFile'])
+    if cfg['logDir'] == '':
+        cfg['logDir'] = '.'
+    return cfg
+
+def setupLogging(cfg):
+    """
+    create log dir and configure root logger: records go through a queue to a
+    background listener thread, which does the formatting and redaction
+    """
+    global logLevel, sensitiveValues, redactor, logListener
+
+    for dirPath in [
+        cfg['logDir'],
+    ]:
         try:
-            with open(configFile, 'r') as ymlfile:
-                try:
-                    cfg = always_merger.merge(cfg,yaml.load(ymlfile,Loader=yaml.Loader))
-                except Exception as e:
-                    logging.warning("main: skipping load load config file: '%s', error '%s'", configFile, e)
-                    continue
-        except:
-            continue
-
-# fix logDir
-cfg['logDir'] = os.path.dirname(cfg['logFile'])
-if cfg['logDir'] == '':
-    cfg['logDir'] = '.'
-# }}
+            os.makedirs(dirPath)
+        except OSError:
+            if not os.path.isdir(dirPath):
+                raise
+
+    # choice logLevel
+    if re.match(r"^(warn|warning)$", cfg['logLevel'], re.IGNORECASE):
+        logLevel = stdLogging.WARNING
+    elif re.match(r"^debug$", cfg['logLevel'], re.IGNORECASE):
+        logLevel = stdLogging.DEBUG
+    else:
+        stdLogging.getLogger("urllib3").setLevel(stdLogging.WARNING)
+        stdLogging.getLogger("requests").setLevel(stdLogging.WARNING)
+        logLevel = stdLogging.INFO
+
+    sensitiveValues = getRecursively(cfg, cfg['sensitiveKeys'])
+    redactor = Redactor(sensitiveValues)
 
-# basic config {{
-for dirPath in [
-    cfg['logDir'],
-]:
-    try:
-        os.makedirs(dirPath)
-    except OSError:
-        if not os.path.isdir(dirPath):
-            raise
-
-# choice logLevel
-if re.match(r"^(warn|warning)$", cfg['logLevel'], re.IGNORECASE):
-    logLevel = logging.WARNING
-elif re.match(r"^debug$", cfg['logLevel'], re.IGNORECASE):
-    logLevel = logging.DEBUG
-else:
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
-    logLevel = logging.INFO
+    # configure log format
+    if cfg['logFile'] == 'stdout':
+        stdLogging.basicConfig(
+            level       = logLevel,
+            format      = '%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s',
+            datefmt     = '%Y-%m-%dT%H:%M:%S',
+        )
+    else:
+        stdLogging.basicConfig(
+            filename    = cfg['logFile'],
+            level       = logLevel,
+            format      = '%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s',
+            datefmt     = '%Y-%m-%dT%H:%M:%S',
+        )
+    handlers = stdLogging.root.handlers[:]
+    for handler in handlers:
+        handler.setFormatter(SensitiveFormatter('%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s'))
+        stdLogging.root.removeHandler(handler)
+
+    # async logging {{
+    logQueue = queue.SimpleQueue()
+    stdLogging.root.addHandler(DeferredQueueHandler(logQueue))
+    logListener = stdLogging.handlers.QueueListener(logQueue, *handlers, respect_handler_level=True)
+    logListener.start()
+    atexit.register(flushLogging)
+    # }}
+
+def flushLogging():
+    """
+    write out queued log records and stop the listener thread, records logged
+    later are handled synchronously; call before os._exit()
+    """
+    global logListener
+    listener = globals().get('logListener')
+    if listener is None:
+        return
+    logListener = None
+    listener.stop()
+    stdLogging.root.handlers = [h for h in stdLogging.root.handlers if not isinstance(h, stdLogging.handlers.QueueHandler)]
+    for handler in listener.handlers:
+        stdLogging.root.addHandler(handler)
+
+def _setup():
+    if 'cfg' not in globals():
+        cfg = globals()['cfg'] = loadConfig()
+        setupLogging(cfg)
+
+def __getattr__(name):
+    if name in ('cfg', 'logLevel', 'sensitiveValues', 'redactor'):
+        _setup()
+        return globals()[name]
+    raise AttributeError(f"module 'rsh.config' has no attribute '{name}'")
+
+class _Logging:
+    """
+    rsh.config.logging: the logging module, config and logging are set up on
+    first use, so records logged before any cfg access are formatted and redacted too
+    """
+    def __getattr__(self, name):
+        _setup()
+        return getattr(stdLogging, name)
+
+logging = _Logging()
 # }}
 
 # sensitive data {{
@@ -153,33 +324,75 @@ def getRecursively(searchDict,fields):
                         for another_result in more_results:
                             fieldsFound.append(another_result)
     return fieldsFound
-sensitiveValues = getRecursively(cfg, cfg['sensitiveKeys'])
-class SensitiveFormatter(logging.Formatter):
+def _scalars(values):
+    for value in values:
+        if isinstance(value, (list, tuple, set)):
+            yield from _scalars(value)
+        elif isinstance(value, (str, int, float)) and not isinstance(value, bool):
+            yield str(value)
+
+class Redactor:
+    """
+    Replaces sensitive values with '[CLASSIFIED]'. The values are matched as
+    escaped literals, longest first, by one regex compiled once; a lookahead on
+    their first characters lets the scan skip all other positions cheaply.
+    A few values are first looked for with plain substring search, so records
+    without secrets (nearly all) skip the regex entirely.
+    """
+    maxPrecheckValues = 8
+
+    def __init__(self, values, replacement='[CLASSIFIED]'):
+        self.replacement = replacement
+        self.literals = sorted(set(v for v in _scalars(values) if v), key=len, reverse=True)
+        self.pattern = None
+        if self.literals:
+            firstChars = ''.join(sorted(set(re.escape(v[0]) for v in self.literals)))
+            self.pattern = re.compile(f"(?=[{firstChars}])(?:{'|'.join(map(re.escape, self.literals))})")
+
+    def __call__(self, s):
+        if self.pattern is None:
+            return s
+        if len(self.literals) <= self.maxPrecheckValues and not any(v in s for v in self.literals):
+            return s
+        return self.pattern.sub(self.replacement, s)
+
+class SensitiveFormatter(stdLogging.Formatter):
     """Formatter that removes sensitive information in urls."""
     @staticmethod
     def _filter(s):
-        pattern = re.compile('|'.join(sensitiveValues))
-        return pattern.sub('[CLASSIFIED]', s)
+        return redactor(s)
 
     def format(self, record):
-        original = logging.Formatter.format(self, record)
+        original = stdLogging.Formatter.format(self, record)
         return self._filter(original)
-# }}
 
-# configure log format {{
-if cfg['logFile'] == 'stdout':
-    logging.basicConfig(
-        level       = logLevel,
-        format      = '%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s',
-        datefmt     = '%Y-%m-%dT%H:%M:%S',
-    )
-else:
-    logging.basicConfig(
-        filename    = cfg['logFile'],
-        level       = logLevel,
-        format      = '%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s',
-        datefmt     = '%Y-%m-%dT%H:%M:%S',
-    )
-for handler in logging.root.handlers:
-   handler.setFormatter(SensitiveFormatter('%(asctime)s\t%(name)s\t%(levelname)s\t%(message)s'))
+class DeferredQueueHandler(stdLogging.handlers.QueueHandler):
+    """
+    QueueHandler that queues records with msg and args as they are: the stock
+    prepare() formats the message in the logging thread, here msg % args (and
+    with it LazyJson dumps) happens in the listener. Only a traceback is turned
+    into text before queueing, exc_info refers to the frames of this thread.
+    """
+    def prepare(self, record):
+        if record.exc_info:
+            record = copy.copy(record)
+            record.exc_text = record.exc_text or stdLogging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+class LazyJson:
+    """
+    json.dumps(obj, indent=4) done only when a log record is actually emitted,
+    for debug payloads: logger.debug("%s: x='%s'", defName, LazyJson(x));
+    the dump runs in the log listener thread, don't change obj after logging it
+    """
+    __slots__ = ('obj', 'indent')
+
+    def __init__(self, obj, indent=4):
+        self.obj = obj
+        self.indent = indent
+
+    def __str__(self):
+        import json
+        return json.dumps(self.obj, indent=self.indent, default=str)
 # }}
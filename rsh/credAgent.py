@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# credAgent.py
+#
+# optional credential agent for sr: after the first gpg decrypt of gpgFile the
+# host regex -> root password table (patterns compiled once) is kept by a small
+# background process behind a unix socket (mode 0600, same uid only), so next
+# sr logins resolve the password with one socket round trip instead of a gpg
+# decrypt. The agent forgets the table and exits after sr.credAgent.ttl seconds,
+# on `sr --lock`, or when gpgFile changes.
+
+import os
+import re
+import json
+import time
+import errno
+import socket
+import struct
+import signal
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_REQUEST = 4096
+
+
+class PasswordTable:
+    """
+    Host regex -> root password table of the decrypted gpgFile,
+    lines '<hostname regex>\\t<root password>', patterns compiled once.
+    """
+
+    def __init__(self, decryptedData):
+        defName = "PasswordTable"
+        self.entries = []
+        for lineNumber, line in enumerate(decryptedData.splitlines(), 1):
+            if not line.strip():
+                continue
+            splitted = line.split('\t')
+            if len(splitted) < 2:
+                logger.warning(f"{defName}: skipping malformed line {lineNumber}, expected '<hostname regex>\\t<root password>'")
+                continue
+            try:
+                self.entries.append((re.compile(splitted[0], re.IGNORECASE), splitted[1]))
+            except re.error as e:
+                logger.warning(f"{defName}: skipping line {lineNumber}, bad hostname regex: '{e}'")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, host):
+        """root password of the first regex matching host (re.search), None if none matches"""
+        for hostRegex, rootPasswd in self.entries:
+            if hostRegex.search(host):
+                return rootPasswd
+        return None
+
+    def clear(self):
+        self.entries = []
+
+
+def socketPath(cfg):
+    return os.path.expanduser(cfg['sr']['credAgent']['socketPath'])
+
+
+def _gpgFileStamp(gpgFilePath):
+    try:
+        st = os.stat(os.path.expanduser(gpgFilePath))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+
+# client {{
+def request(cfg, payload, timeout=1.0):
+    """
+    send one request to the agent, return its reply dict
+    or None when no agent is listening
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(socketPath(cfg))
+        sock.sendall(json.dumps(payload).encode() + b'\n')
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(MAX_REQUEST)
+            if not chunk:
+                break
+            data += chunk
+    except (FileNotFoundError, ConnectionRefusedError, socket.timeout):
+        return None
+    except OSError as e:
+        logger.debug(f"request: credential agent not reachable, error: '{e}'")
+        return None
+    finally:
+        sock.close()
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def getPassword(cfg, host):
+    """
+    root password for host from a running agent,
+    None when there is no agent (or it was locked) and gpgFile has to be decrypted
+    """
+    reply = request(cfg, {'cmd': 'get', 'host': host})
+    if reply is None or 'password' not in reply:
+        if reply is not None:
+            logger.debug(f"getPassword: agent reply: '{reply.get('error')}'")
+        return None
+    return reply['password']
+
+
+def lock(cfg):
+    """make the agent forget the table and exit, return True if an agent was running"""
+    return request(cfg, {'cmd': 'lock'}) is not None
+# }}
+
+
+# agent {{
+def _peerUid(conn):
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return os.getuid()
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+
+def _listen(path):
+    """bind the agent socket, None if another live agent already owns it"""
+    os.makedirs(os.path.dirname(path) or '.', mode=0o700, exist_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    oldUmask = os.umask(0o177)
+    try:
+        try:
+            sock.bind(path)
+        except OSError as e:
+            if e.errno != errno.EADDRINUSE:
+                raise
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(path)
+                sock.close()
+                return None
+            except OSError:
+                # stale socket of an agent that died
+                os.unlink(path)
+                sock.bind(path)
+            finally:
+                probe.close()
+    finally:
+        os.umask(oldUmask)
+    sock.listen(8)
+    return sock
+
+
+def serve(sock, path, table, ttl, gpgFilePath):
+    """answer requests until ttl expires, a lock request or a gpgFile change"""
+    gpgFileStamp = _gpgFileStamp(gpgFilePath)
+    expiresAt = time.monotonic() + ttl
+    try:
+        while True:
+            remaining = expiresAt - time.monotonic()
+            if remaining <= 0:
+                return
+            sock.settimeout(remaining)
+            try:
+                conn, _ = sock.accept()
+            except socket.timeout:
+                return
+            with conn:
+                conn.settimeout(1.0)
+                try:
+                    if _peerUid(conn) != os.getuid():
+                        continue
+                    data = conn.recv(MAX_REQUEST)
+                    req = json.loads(data)
+                except (OSError, ValueError):
+                    continue
+                cmd = req.get('cmd')
+                if cmd == 'lock':
+                    reply, stop = {'locked': True}, True
+                elif _gpgFileStamp(gpgFilePath) != gpgFileStamp:
+                    reply, stop = {'error': 'gpgFile changed'}, True
+                elif cmd == 'get':
+                    rootPasswd = table.lookup(str(req.get('host', '')))
+                    reply = {'password': rootPasswd} if rootPasswd is not None else {'error': 'not found'}
+                    stop = False
+                elif cmd == 'status':
+                    reply, stop = {'entries': len(table), 'expiresIn': round(expiresAt - time.monotonic())}, False
+                else:
+                    reply, stop = {'error': f"unknown cmd '{cmd}'"}, False
+                try:
+                    conn.sendall(json.dumps(reply).encode() + b'\n')
+                except OSError:
+                    pass
+                if stop:
+                    return
+    finally:
+        table.clear()
+        # unlink while still listening, so a starting agent can't lose its fresh socket to us
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+        sock.close()
+
+
+def start(cfg, table):
+    """
+    start a background agent holding table, detached from the terminal;
+    no-op when an agent is already running or ttl is 0
+    """
+    defName = "start"
+    ttl = cfg['sr']['credAgent']['ttl']
+    if not ttl or not len(table):
+        return
+    path = socketPath(cfg)
+    try:
+        sock = _listen(path)
+    except OSError as e:
+        logger.warning(f"{defName}: failed start credential agent on '{path}', error: '{e}'")
+        return
+    if sock is None:
+        return
+
+    # double fork, the agent is reparented to init and never becomes a zombie of sr
+    pid = os.fork()
+    if pid:
+        sock.close()
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGWINCH, signal.SIG_DFL)
+        devNull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devNull, fd)
+        # don't keep sr's fds (ssh pty) open for the agent's lifetime
+        os.closerange(3, sock.fileno())
+        os.closerange(sock.fileno() + 1, os.sysconf('SC_OPEN_MAX'))
+        os.chdir('/')
+        serve(sock, path, table, ttl, cfg['gpgFile'])
+    finally:
+        os._exit(0)
+# }}
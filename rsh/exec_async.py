@@ -0,0 +1,236 @@
+# exec_async.py
+#
+# asyncio execution backend for pExec: every host is a coroutine on one
+# event loop (asyncssh), so thousands of SSH sessions can be in flight
+# without a thread (and its stack) per host.
+# asyncssh is an optional dependency, imported only when the backend is used.
+
+import asyncio
+import functools
+import logging
+import os
+import resource
+import sys
+import time
+import rsh.config
+from rsh.exec_functions import ConnectError, HostResult, HostTimeout, split_host, _is_connect_failure
+
+logging.getLogger("asyncssh").setLevel(logging.WARNING)
+
+SUDO_PROMPT = '[sudo] password: '
+
+
+def raise_nofile_limit():
+    """Raise the soft open files limit to the hard limit, every session holds a socket."""
+    try:
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if hard == resource.RLIM_INFINITY or soft < hard:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ValueError, OSError) as e:
+        rsh.config.logging.debug(f"failed to raise RLIMIT_NOFILE: {e}")
+
+
+async def _wait_process(process, communicate, timeout, phase, timings):
+    """Await an ssh client process, killed and raised as HostTimeout after `timeout` seconds."""
+    try:
+        return await asyncio.wait_for(process.communicate() if communicate else process.wait(), timeout or None)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise HostTimeout(phase, timeout, timings=timings) from None
+
+
+async def run_host_mux(host, command, connect_timeout=None, command_timeout=None):
+    """
+    run_host over the shared ssh master connection (see rsh.ssh_mux),
+    ssh client processes are awaited instead of blocking a thread.
+    """
+    from rsh import ssh_mux
+
+    timings = {}
+    start = time.monotonic()
+    if not os.path.exists(ssh_mux.control_path(host)):
+        process = await asyncio.create_subprocess_exec(
+            *ssh_mux.master_argv(host),
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE,
+        )
+        _, stderr = await _wait_process(process, True, connect_timeout, 'connect', timings)
+        ssh_mux.master_result(host, process.returncode, stderr)
+    timings['connect'] = time.monotonic() - start
+
+    start = time.monotonic()
+    process = await asyncio.create_subprocess_exec(
+        *ssh_mux.command_argv(host, command),
+        stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await _wait_process(process, True, command_timeout, 'command', timings)
+    timings['command'] = time.monotonic() - start
+    return ssh_mux.command_result(process.returncode, stdout, stderr), timings
+
+
+def _known_hosts():
+    """~/.ssh/known_hosts and the system known_hosts, as asyncssh loads them by default"""
+    import asyncssh
+
+    paths = [path for path in (os.path.expanduser('~/.ssh/known_hosts'), '/etc/ssh/ssh_known_hosts') if os.path.exists(path)]
+    return asyncssh.read_known_hosts(paths) if paths else None
+
+
+@functools.lru_cache(maxsize=None)
+def _accept_unknown_hosts_client():
+    """
+    asyncssh client class accepting host keys of hosts that have no known_hosts
+    entry at all; a host listed with other keys (or revoked ones) is rejected.
+    Built once per run, known_hosts is read once.
+    """
+    import asyncssh
+
+    known_hosts = _known_hosts()
+
+    class AcceptUnknownHostsClient(asyncssh.SSHClient):
+        def validate_host_public_key(self, host, addr, port, key):
+            # called only for keys not trusted by known_hosts
+            if known_hosts is None:
+                return True
+            return not any(known_hosts.match(host, addr, port)[:3])
+
+    return AcceptUnknownHostsClient
+
+
+async def _open_socket(hostname, port):
+    """
+    Resolve and connect a non-blocking tcp socket for asyncssh.connect(sock=...).
+    Returns (socket, {'dns': seconds, 'tcp': seconds}).
+    """
+    import socket
+
+    loop = asyncio.get_running_loop()
+    timings = {}
+    start = time.monotonic()
+    addr_infos = await loop.getaddrinfo(hostname, port, type=socket.SOCK_STREAM)
+    timings['dns'] = time.monotonic() - start
+    start = time.monotonic()
+    error = None
+    for family, sock_type, proto, _, address in addr_infos:
+        sock = socket.socket(family, sock_type, proto)
+        sock.setblocking(False)
+        try:
+            await loop.sock_connect(sock, address)
+            timings['tcp'] = time.monotonic() - start
+            return sock, timings
+        except OSError as e:
+            error = e
+            sock.close()
+    raise error or OSError('getaddrinfo returned no addresses')
+
+
+async def run_host(host, command, profile=False, connect_timeout=None, command_timeout=None):
+    """
+    Run `command` with sudo (like fabric's Connection.sudo with pty) on one host.
+    Returns (HostResult, timings), connection failures are raised as ConnectError,
+    exceeded `connect_timeout`/`command_timeout` (seconds) as HostTimeout.
+    With `profile` the connect time is split into 'dns', 'tcp' and 'auth' phases.
+    """
+    if rsh.config.cfg['sshMux']['enable']:
+        return await run_host_mux(host, command, connect_timeout=connect_timeout, command_timeout=command_timeout)
+
+    import asyncssh
+
+    user, hostname, port = split_host(host)
+    # host keys are checked against known_hosts (asyncssh default)
+    connect_kwargs = {}
+    if rsh.config.cfg['pExec']['asyncAcceptUnknownHostKeys']:
+        connect_kwargs['client_factory'] = _accept_unknown_hosts_client()
+    if user:
+        connect_kwargs['username'] = user
+    if port:
+        connect_kwargs['port'] = port
+
+    timings = {}
+
+    async def connect():
+        start = time.monotonic()
+        if profile:
+            sock, socket_timings = await _open_socket(hostname, port or 22)
+            timings.update(socket_timings)
+            start = time.monotonic()
+            connect_kwargs['sock'] = sock
+        conn = await asyncssh.connect(hostname, **connect_kwargs)
+        if profile:
+            timings['auth'] = time.monotonic() - start
+        return conn
+
+    started_at = time.monotonic()
+    try:
+        conn = await asyncio.wait_for(connect(), connect_timeout or None)
+    except asyncio.TimeoutError:
+        raise HostTimeout('connect', connect_timeout, timings=timings) from None
+    except Exception as e:
+        raise ConnectError(e, timings=timings) from e
+    finally:
+        timings['connect'] = time.monotonic() - started_at
+
+    async with conn:
+        start = time.monotonic()
+        try:
+            # stdin is closed right away: a password prompt fails instead of hanging
+            res = await asyncio.wait_for(
+                conn.run(f"sudo -S -p '{SUDO_PROMPT}' {command}", term_type='xterm', input=''),
+                command_timeout or None,
+            )
+        except asyncio.TimeoutError:
+            raise HostTimeout('command', command_timeout, timings=timings) from None
+        finally:
+            timings['command'] = time.monotonic() - start
+
+    return_code = res.exit_status if res.exit_status is not None else -1
+    return HostResult(res.stdout or '', res.stderr or '', return_code), timings
+
+
+async def _dispatch(hosts, command, limiter, on_done, **run_kwargs):
+    peak = 0
+    pending = iter(hosts)
+    pending_left = len(hosts)
+    in_flight = {}   # task -> (name, host)
+    try:
+        while pending_left or in_flight:
+            while pending_left and len(in_flight) < limiter.limit:
+                name, host = next(pending)
+                pending_left -= 1
+                in_flight[asyncio.ensure_future(run_host(host, command, **run_kwargs))] = (name, host)
+            peak = max(peak, len(in_flight))
+
+            finished, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in finished:
+                name, host = in_flight.pop(task)
+                try:
+                    res, timings = task.result()
+                except Exception as e:
+                    limiter.feedback(connect_failed=_is_connect_failure(e))
+                    on_done(host, None, getattr(e, 'timings', None), e, name=name)
+                else:
+                    limiter.feedback(connect_time=timings['connect'])
+                    on_done(host, res, timings, None, name=name)
+    finally:
+        for task in in_flight:
+            task.cancel()
+    return peak
+
+
+def dispatch(hosts, command, limiter, on_done, **run_kwargs):
+    """
+    asyncio counterpart of exec_functions._dispatch_threads: run `command` on `hosts`
+    ((inventory name, sshHost) pairs) through the rolling window of `limiter`, calling
+    on_done(host, res, timings, error, name=name) as hosts finish; `run_kwargs`
+    (profile, connect_timeout, command_timeout) go to run_host.
+    Returns the peak number of hosts in flight.
+    """
+    try:
+        if not rsh.config.cfg['sshMux']['enable']:
+            import asyncssh
+    except ImportError:
+        rsh.config.logging.error("asyncio backend requires the 'asyncssh' module: pip install asyncssh")
+        sys.exit(1)
+
+    raise_nofile_limit()
+    return asyncio.run(_dispatch(hosts, command, limiter, on_done, **run_kwargs))
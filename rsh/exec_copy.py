@@ -0,0 +1,335 @@
+# exec_copy.py
+#
+# tree-based file distribution for pCopy: the operator uploads the file to a
+# few hosts per round only, every host holding a verified copy relays it to
+# one more host per round (preferably within its dc_* group), so the number
+# of copies doubles each round instead of all of them crossing one uplink.
+# Relays run scp on the holder with the operator's forwarded ssh agent, so
+# they are opt-in (pCopy.relay, --relay): anyone with root on a holder can use
+# the agent while the relay runs. A failed relay falls back to a direct upload.
+# Copies are staged in a per-run mktemp -d directory (0700, login user) and
+# installed from there. Hosts already holding an identical file (sha256) are skipped.
+
+import os
+import re
+import sys
+import time
+import shlex
+import posixpath
+import hashlib
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import rsh.config
+import rsh.inventoryDb
+from rsh.exec_functions import split_host, expand_selectors, HostResult, _DedupCollector
+
+sha256Regex = re.compile(r'^([0-9a-f]{64})\b', re.MULTILINE)
+
+
+class RelayError(Exception):
+    """Raised when a holder could not pass the file on, the target is then served directly."""
+
+
+def parse_arguments():
+    """
+    Parse pCopy CLI arguments.
+    Returns a tuple: (hosts_or_groups: list[str], src: str, dest: str, options: argparse.Namespace)
+    """
+    cfg = rsh.config.cfg['pCopy']
+    prog_name = os.path.basename(sys.argv[0])
+    parser = argparse.ArgumentParser(
+        description='Distribute a file to remote servers along a relay tree.',
+        usage=f"[{prog_name}] -g GROUP... SRC DEST  or  [{prog_name}] GROUP SRC DEST",
+    )
+    parser.add_argument(
+        '-g', '--groups', dest='hosts_or_groups', nargs='+',
+        help="Hosts, groups or selectors like 'web&dc_x&!canary' (supports brace expansions)"
+    )
+    parser.add_argument(
+        'paths', nargs='+', metavar='[GROUP] SRC DEST',
+        help='Local source file and remote destination path'
+    )
+    parser.add_argument(
+        '-m', '--mode', default=cfg['mode'],
+        help='File mode of the installed copy (install -m)'
+    )
+    parser.add_argument(
+        '-s', '--seeds', type=int, default=cfg['seeds'],
+        help='Direct uploads from this machine per round, all other copies are relayed between hosts'
+    )
+    parser.add_argument(
+        '-f', '--forks', type=int, default=cfg['forks'],
+        help='Max transfers or checks in flight'
+    )
+    parser.add_argument(
+        '--relay', action='store_true', default=cfg['relay'],
+        help='Relay copies between hosts with your forwarded ssh agent (usable by root on holders meanwhile), '
+             'otherwise every host gets a direct upload'
+    )
+    args = parser.parse_args()
+
+    if args.hosts_or_groups and len(args.paths) == 2:
+        hosts_or_groups_raw, (src, dest) = args.hosts_or_groups, args.paths
+    elif not args.hosts_or_groups and len(args.paths) == 3:
+        hosts_or_groups_raw, src, dest = [args.paths[0]], args.paths[1], args.paths[2]
+    else:
+        parser.print_usage()
+        sys.exit(1)
+
+    hosts_or_groups = expand_selectors(hosts_or_groups_raw)
+    return hosts_or_groups, src, dest, args
+
+
+def dc_groups(host_names, inventory):
+    """Map inventory host name to its dc_* group, hosts outside the inventory are left out."""
+    if isinstance(inventory, rsh.inventoryDb.InventoryDb):
+        members = inventory.groupMembers('dc_')
+    else:
+        members = (
+            (group, host)
+            for group, hosts in (inventory.get('groups') or {}).items() if group.startswith('dc_')
+            for host in hosts
+        )
+    wanted = {name for name, _ in host_names}
+    return {host: group for group, host in members if host in wanted}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _connection(host, **kwargs):
+    from fabric import Connection
+    return Connection(host, **kwargs)
+
+
+def remote_sha256(host, path):
+    """sha256 of path on host (read with sudo), None if it doesn't exist."""
+    with _connection(host) as conn:
+        res = conn.sudo(f"sha256sum {shlex.quote(path)}", warn=True, hide=True, pty=True)
+    match = sha256Regex.search(res.stdout or '')
+    return match.group(1) if res.return_code == 0 and match else None
+
+
+def make_staging_dir(host):
+    """Create a private staging directory (mktemp -d: mode 0700, login user) on host, return its path."""
+    with _connection(host) as conn:
+        res = conn.run("mktemp -d /tmp/.rsh-copy.XXXXXXXXXX", warn=True, hide=True)
+    path = (res.stdout or '').strip()
+    if res.return_code != 0 or not path.startswith('/tmp/.rsh-copy.'):
+        raise RuntimeError(f"failed to create staging directory: {(res.stderr or res.stdout or '').strip() or res.return_code}")
+    return path
+
+
+def upload(host, src, staged):
+    with _connection(host) as conn:
+        conn.put(src, staged)
+
+
+def relay(holder, target, source, staged):
+    """Copy the staged file `source` from holder to `staged` on target with scp running on the holder."""
+    user, hostname, port = split_host(target)
+    if ':' in hostname:
+        hostname = f"[{hostname}]"
+    argv = shlex.split(rsh.config.cfg['pCopy']['relayCommand'])
+    if port:
+        argv += ['-P', str(port)]
+    argv += [source, f"{user}@{hostname}:{staged}" if user else f"{hostname}:{staged}"]
+    with _connection(holder, forward_agent=True) as conn:
+        res = conn.run(' '.join(map(shlex.quote, argv)), warn=True, hide=True)
+    if res.return_code != 0:
+        raise RelayError((res.stderr or res.stdout or '').strip() or f"exit status {res.return_code}")
+
+
+def install(host, staged, dest, sha, mode):
+    """
+    Verify the staged copy on host, install it to dest with sudo and verify dest.
+    `staged` lies in the private staging directory, only the login user can swap it.
+    """
+    script = (
+        f"test \"$(sha256sum < {shlex.quote(staged)} | cut -d' ' -f1)\" = {sha}"
+        f" && install -m {shlex.quote(mode)} {shlex.quote(staged)} {shlex.quote(dest)}"
+        f" && sha256sum {shlex.quote(dest)}"
+    )
+    with _connection(host) as conn:
+        res = conn.sudo(f"sh -c {shlex.quote(script)}", warn=True, hide=True, pty=True)
+    match = sha256Regex.search(res.stdout or '')
+    if res.return_code != 0 or not match or match.group(1) != sha:
+        raise RuntimeError(f"checksum verification failed: {(res.stdout or '').strip() or res.return_code}")
+
+
+def remove_staging_dir(host, path):
+    with _connection(host) as conn:
+        conn.run(f"rm -rf -- {shlex.quote(path)}", warn=True, hide=True)
+
+
+def _parallel(func, items, forks):
+    """Run func over items in at most `forks` threads, returns {item: (result, error)}."""
+    def call(item):
+        try:
+            return item, (func(item), None)
+        except Exception as e:
+            return item, (None, e)
+
+    if not items:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(forks, len(items)))) as executor:
+        return dict(executor.map(call, items))
+
+
+class RelayPlan:
+    """
+    Chooses the transfers of each round: every holder serves one pending host,
+    first of its own dc group, then of a group without holders yet, then any;
+    the operator serves `seeds` hosts, first those a relay failed for.
+    """
+
+    def __init__(self, hosts, dc_of, seeds):
+        self.pending = {}                 # dc group -> deque of hosts
+        for host in hosts:
+            self.pending.setdefault(dc_of.get(host), deque()).append(host)
+        self.direct_only = deque()        # relay failed, upload from operator
+        self.holders = []
+        self.holders_per_dc = {}
+        self.dc_of = dc_of
+        self.seeds = max(1, seeds)
+
+    def __bool__(self):
+        return bool(self.direct_only or any(self.pending.values()))
+
+    def _take(self, dcs):
+        for dc in dcs:
+            queue = self.pending.get(dc)
+            if queue:
+                return queue.popleft()
+        return None
+
+    def _unserved_dcs(self, seeding):
+        """groups with pending hosts, no holder yet and no copy on the way this round"""
+        return [
+            dc for dc, queue in self.pending.items()
+            if queue and not self.holders_per_dc.get(dc) and dc not in seeding
+        ]
+
+    def next_round(self):
+        """Return [(source host or None for the operator, target host)]."""
+        transfers = []
+        seeding = set()
+        for _ in range(self.seeds):
+            if self.direct_only:
+                target = self.direct_only.popleft()
+            else:
+                target = self._take(self._unserved_dcs(seeding)) or self._take(list(self.pending))
+            if target is None:
+                break
+            transfers.append((None, target))
+            seeding.add(self.dc_of.get(target))
+        for holder in self.holders:
+            target = (
+                self._take([self.dc_of.get(holder)])
+                or self._take(self._unserved_dcs(seeding))
+                or self._take(list(self.pending))
+            )
+            if target is None:
+                break
+            transfers.append((holder, target))
+            seeding.add(self.dc_of.get(target))
+        return transfers
+
+    def add_holder(self, host):
+        self.holders.append(host)
+        dc = self.dc_of.get(host)
+        self.holders_per_dc[dc] = self.holders_per_dc.get(dc, 0) + 1
+
+    def retry_direct(self, host):
+        self.direct_only.append(host)
+
+
+def distribute(hosts, src, dest, dc_of=None, mode='0644', seeds=1, forks=50, relay_copies=False):
+    """
+    Copy local file `src` to `dest` on `hosts` along a relay tree (see RelayPlan),
+    `dc_of` maps host to its dc group. Without `relay_copies` every host gets a
+    direct upload. Hosts with an identical dest are skipped, every copy is verified
+    by sha256 before it is installed or relayed further.
+    Prints the deduplicated per-host status report, exits 1 on failures.
+    """
+    started_at = time.monotonic()
+    hosts = list(dict.fromkeys(hosts))
+    sha = file_sha256(src)
+    rsh.config.logging.debug(f"src={src} sha256={sha} dest={dest} relay={relay_copies}")
+
+    collector = _DedupCollector(len(hosts))
+
+    # skip hosts already holding an identical copy {{
+    current = _parallel(lambda host: remote_sha256(host, dest), hosts, forks)
+    pending = []
+    identical = 0
+    for host in hosts:
+        remote, error = current[host]
+        if error is not None:
+            collector(host, None, None, error)
+        elif remote == sha:
+            identical += 1
+            collector(host, HostResult('identical copy, skipped', '', 0), None, None)
+        else:
+            pending.append(host)
+    # }}
+
+    # without relays the operator serves every host in the first round
+    plan = RelayPlan(pending, dc_of or {}, seeds if relay_copies else len(pending))
+    uploaded = relayed = rounds = 0
+    pending_total = len(pending)
+    staging_dirs = {}   # host -> its staging directory, removed at the end
+
+    def staged(host):
+        return posixpath.join(staging_dirs[host], 'file')
+
+    def transfer(item):
+        source, target = item
+        if target not in staging_dirs:
+            staging_dirs[target] = make_staging_dir(target)
+        if source is None:
+            upload(target, src, staged(target))
+        else:
+            relay(source, target, staged(source), staged(target))
+        install(target, staged(target), dest, sha, mode)
+
+    try:
+        while plan:
+            rounds += 1
+            transfers = plan.next_round()
+            results = _parallel(transfer, transfers, forks)
+            for (source, target), (_, error) in results.items():
+                if error is None:
+                    plan.add_holder(target)
+                    if source is None:
+                        uploaded += 1
+                    else:
+                        relayed += 1
+                    rsh.config.logging.debug(f"[{target}] copied from {source or 'operator'} in round {rounds}")
+                    collector(target, HostResult('copied', '', 0), None, None)
+                elif isinstance(error, RelayError):
+                    rsh.config.logging.debug(f"[{target}] relay from {source} failed, uploading directly: {error}")
+                    plan.retry_direct(target)
+                else:
+                    collector(target, None, None, error)
+            print(
+                f"round {rounds}: {len(transfers)} transfers, holders {len(plan.holders)}/{pending_total}",
+                file=sys.stderr,
+            )
+    finally:
+        _parallel(lambda host: remove_staging_dir(host, staging_dirs[host]), list(staging_dirs), forks)
+
+    collector.report()
+    print(
+        f"hosts: {len(hosts)}, identical: {identical}, uploaded: {uploaded}, relayed: {relayed}, "
+        f"failed: {collector.failed}, rounds: {rounds}, elapsed: {time.monotonic() - started_at:.1f}s",
+        file=sys.stderr,
+    )
+    if collector.errors:
+        sys.exit(1)
@@ -2,22 +2,24 @@
 
 import sys
 import os
+import re
+import math
 import yaml
-import json
 import argparse
 import time
 import logging
 from braceexpand import braceexpand
-from fabric import Connection
 import rsh.config
+import rsh.inventoryDb
 
 logging.getLogger("paramiko").setLevel(logging.WARNING)
 
 
-def parse_arguments():
+def parse_arguments(pexec=False):
     """
-    Parse CLI arguments.
-    Returns a tuple: (hosts_or_groups: list[str], command: str, delay: float)
+    Parse CLI arguments, parallel mode options are only registered for pExec (`pexec`),
+    sequential mode options only for sExec.
+    Returns a tuple: (hosts_or_groups: list[str], command: str, delay: float, options: argparse.Namespace)
     """
     prog_name = os.path.basename(sys.argv[0])
     parser = argparse.ArgumentParser(
@@ -31,7 +33,7 @@ def parse_arguments():
 
     parser.add_argument(
         '-g', '--groups', dest='hosts_or_groups', nargs='+',
-        help='Hosts or groups (supports brace expansions)'
+        help="Hosts, groups or selectors like 'web&dc_x&!canary' (supports brace expansions)"
     )
     parser.add_argument(
         '-c', '--command', nargs=argparse.REMAINDER,
@@ -43,10 +45,86 @@ def parse_arguments():
     )
     parser.add_argument(
         '-d', '--delay', type=float, default=0.0,
-        help='Delay (in seconds) between hosts when running sequentially'
+        help='Delay (in seconds) between hosts when running sequentially, or between waves in batch mode'
     )
+    parser.add_argument(
+        '-o', '--output', choices=['text', 'jsonl'], default='text',
+        help='Output format: text, or jsonl - one JSON record per host written as soon as the host finishes'
+    )
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Record per-host phase timings (dns, tcp, auth, command) and print p50/p95/p99 and slowest hosts on stderr'
+    )
+    parser.add_argument(
+        '--profile-file', dest='profile_file', metavar='PATH',
+        help='With --profile: write run metrics to PATH, JSON for *.json, Prometheus text format otherwise'
+    )
+    parser.add_argument(
+        '--connect-timeout', type=float, dest='connect_timeout',
+        default=rsh.config.cfg['pExec']['connectTimeout'],
+        help='Seconds per host for tcp connect, ssh banner and auth, slower hosts are reported as timed out (0 - no limit)'
+    )
+    parser.add_argument(
+        '--command-timeout', type=float, dest='command_timeout',
+        default=rsh.config.cfg['pExec']['commandTimeout'],
+        help='Seconds per host for the command, slower hosts are reported as timed out (0 - no limit)'
+    )
+    if pexec:
+        parser.add_argument(
+            '--stream', action='store_true',
+            default=rsh.config.cfg['pExec']['stream'],
+            help='Parallel mode: show a live summary of unique outputs while hosts complete'
+        )
+        parser.add_argument(
+            '-f', '--forks', type=int,
+            default=rsh.config.cfg['pExec']['forks'],
+            help='Parallel mode: max hosts in flight, a new host starts as soon as a slot frees up (0 - all at once)'
+        )
+        parser.add_argument(
+            '--adaptive', action='store_true',
+            default=rsh.config.cfg['pExec']['adaptive'],
+            help='Parallel mode: shrink concurrency on connect errors or slow handshakes, grow it back when they recover'
+        )
+        parser.add_argument(
+            '-b', '--batch', type=host_count,
+            default=rsh.config.cfg['pExec']['batch'],
+            help='Parallel mode: run hosts in waves of N hosts or N%% of all hosts, --delay seconds apart (0 - one wave)'
+        )
+        parser.add_argument(
+            '--max-failures', type=host_count, dest='max_failures',
+            default=rsh.config.cfg['pExec']['maxFailures'],
+            help='Batch mode: skip remaining waves once more than N (or N%%) hosts failed or exited non-zero'
+        )
+        parser.add_argument(
+            '--normalize', type=lambda value: [rule for rule in value.split(',') if rule],
+            default=None,
+            help='Parallel mode: comma separated dedup normalization rules (timestamp, pid, hostname), default pExec.normalize'
+        )
+        parser.add_argument(
+            '--spill-threshold', type=int, dest='spill_threshold',
+            default=rsh.config.cfg['pExec']['spillThreshold'],
+            help='Parallel mode: write outputs larger than this many bytes to per-host files in pExec.spillDir (0 - off)'
+        )
+        parser.add_argument(
+            '--backend', choices=['thread', 'asyncio'],
+            default=rsh.config.cfg['pExec']['backend'],
+            help='Parallel mode: execution engine, asyncio (asyncssh) keeps thousands of sessions in flight from one thread'
+        )
+        parser.add_argument(
+            '--return-after', type=fraction, dest='return_after', metavar='FRACTION',
+            default=rsh.config.cfg['pExec']['returnAfter'],
+            help='Parallel mode: print the report once this fraction of hosts (e.g. 0.95) finished, listing hosts still running'
+        )
+    else:
+        parser.add_argument(
+            '--lookahead', type=int,
+            default=rsh.config.cfg['sExec']['lookahead'],
+            help='Sequential mode: number of next hosts to connect to while the current host runs (0 - off)'
+        )
 
     args = parser.parse_args()
+    if pexec and batch_requested(args.batch) and args.return_after < 1:
+        parser.error("--return-after can't be combined with --batch, waves always run to completion")
 
     if args.hosts_or_groups and args.command:
         hosts_or_groups_raw, command_parts = args.hosts_or_groups, args.command
@@ -59,17 +137,46 @@ def parse_arguments():
         parser.print_usage()
         sys.exit(1)
 
-    hosts_or_groups = (
-        list(braceexpand(hosts_or_groups_raw))
-        if isinstance(hosts_or_groups_raw, str)
-        else sum([list(braceexpand(x)) for x in hosts_or_groups_raw], [])
+    hosts_or_groups = expand_selectors(
+        [hosts_or_groups_raw] if isinstance(hosts_or_groups_raw, str) else hosts_or_groups_raw
     )
 
-    return hosts_or_groups, ' '.join(command_parts), float(args.delay)
+    return hosts_or_groups, ' '.join(command_parts), float(args.delay), args
 
 
-def load_inventory():
-    """Load inventory file defined in rsh.config.cfg."""
+def expand_selectors(items):
+    """
+    Brace-expand host selector items. Items with a /regex/ are kept verbatim,
+    braceexpand would eat regex escapes and {m,n} quantifiers.
+    """
+    return sum([[x] if '/' in x else list(braceexpand(x)) for x in items], [])
+
+
+def fraction(value):
+    """argparse type for a fraction of hosts in (0, 1]."""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid fraction '{value}', expected a number like 0.95")
+    if not 0 < number <= 1:
+        raise argparse.ArgumentTypeError(f"invalid fraction '{value}', must be in (0, 1]")
+    return number
+
+
+def load_inventory(allow_db=True):
+    """
+    Load inventory defined in rsh.config.cfg.
+    Returns the indexed inventory store (rsh.inventoryDb.InventoryDb) when it is
+    enabled and up to date and `allow_db` is set, otherwise the parsed YAML dict.
+    """
+    if allow_db:
+        try:
+            inventory_db = rsh.inventoryDb.openInventoryDb(rsh.config.cfg)
+        except Exception as e:
+            rsh.config.logging.warning(f"Failed to open inventory db, falling back to yaml: {e}")
+            inventory_db = None
+        if inventory_db is not None:
+            return inventory_db
     try:
         with open(os.path.expanduser(rsh.config.cfg['inventoryFilePath']), 'r') as f:
             return yaml.load(f, Loader=yaml.Loader)
@@ -79,90 +186,852 @@ def load_inventory():
 
 
 def resolve_hosts(hosts_or_groups, inventory):
-    """Resolve group names to actual hostnames."""
-    hosts = []
-    for item in hosts_or_groups:
-        group_hosts = inventory.get('groups', {}).get(item)
-        if group_hosts:
-            for host in group_hosts:
-                hosts.append(inventory.get('hosts', {}).get(host, {}).get('sshHost', host))
-        else:
-            hosts.append(item)
-    return hosts
+    """
+    Resolve host selectors (groups, hosts, set algebra, see rsh.inventorySelector)
+    to actual hostnames. With the indexed inventory store items may also be
+    `tag:KEY=VALUE`, `hosting:HOSTING` or `dc:DC`.
+    """
+    return [ssh_host for _, ssh_host in resolve_host_names(hosts_or_groups, inventory)]
+
+
+def resolve_host_names(hosts_or_groups, inventory):
+    """
+    Like resolve_hosts, but returns (inventory host name, sshHost) pairs,
+    deduplicated and naturally sorted.
+    """
+    from rsh import inventorySelector
 
+    if isinstance(inventory, rsh.inventoryDb.InventoryDb):
+        index = inventorySelector.HostIndex.fromInventoryDb(inventory)
+    else:
+        index = inventorySelector.HostIndex.fromInventory(inventory or {})
+    try:
+        return inventorySelector.resolve(hosts_or_groups, index)
+    except inventorySelector.SelectorError as e:
+        rsh.config.logging.error(f"Invalid host selector: {e}")
+        sys.exit(1)
 
-def run_command_sequential(hosts, command, delay=0.0):
+
+def _open_connection(host, profile=False, connect_timeout=None):
+    """
+    Connect and authenticate to host ahead of running a command on it.
+    Returns (open fabric Connection, timings) like _connect; the connection is
+    None when sshMux is enabled (the shared master connection is started instead).
+    """
+    from rsh import ssh_mux
+
+    if ssh_mux.enabled():
+        return None, {'connect': ssh_mux.ensure_master(host, timeout=connect_timeout)}
+    return _connect(host, profile=profile, connect_timeout=connect_timeout)
+
+
+def _new_profiler(profile, profile_file):
+    """rsh.exec_profile.Profiler when profiling was requested, else None."""
+    if not (profile or profile_file):
+        return None
+    from rsh import exec_profile
+    return exec_profile.Profiler(os.path.basename(sys.argv[0]) or 'rsh')
+
+
+def _finish_profile(profiler, profile_file):
+    """Print the profile summary on stderr and write the metrics file."""
+    if profiler is None:
+        return
+    profiler.report()
+    if profile_file:
+        try:
+            profiler.write(profile_file)
+        except OSError as e:
+            rsh.config.logging.error(f"Failed to write profile metrics '{profile_file}': {e}")
+
+
+def run_command_sequential(hosts, command, delay=0.0, lookahead=0, output='text', host_names=None,
+                           profile=False, profile_file=None, connect_timeout=None, command_timeout=None):
     """
     Run a command sequentially on each host, streaming stdout/stderr immediately.
     Parameter `delay` adds a pause (in seconds) between hosts.
+    Parameter `lookahead` is the number of next hosts connected to in the background
+    while the current host runs, commands still run one host at a time.
+    With `output` 'jsonl' the output is captured and one JSON record per host is written
+    instead (see rsh.exec_output.host_record), `host_names` are the inventory names of
+    `hosts` by position (hosts may share an sshHost).
+    With `profile` (or `profile_file`) per-host phase timings are summarized on stderr
+    and optionally written to `profile_file` (see rsh.exec_profile).
+    Hosts over `connect_timeout` or `command_timeout` seconds fail as timed out.
     """
-    rsh.config.logging.debug(f"hosts={json.dumps(hosts)}")
+    rsh.config.logging.debug("hosts=%s", rsh.config.LazyJson(hosts, indent=None))
     rsh.config.logging.debug(f"command='{command}'")
     rsh.config.logging.debug(f"delay={delay}")
+    rsh.config.logging.debug(f"lookahead={lookahead}")
+
+    from concurrent.futures import ThreadPoolExecutor
+    from invoke.exceptions import CommandTimedOut
+    from rsh import ssh_mux, exec_output
+
+    jsonl = output == 'jsonl'
+    host_names = host_names or hosts
+    buckets = exec_output.OutputBuckets() if jsonl else None
+    profiler = _new_profiler(profile, profile_file)
+
+    connect_timeout = connect_timeout or None
+    command_timeout = command_timeout or None
+    lookahead = max(0, lookahead)
+    executor = ThreadPoolExecutor(max_workers=lookahead) if lookahead else None
+    opening = {}    # host index -> future of _open_connection
 
-    for idx, host in enumerate(hosts, 1):
-        header = f"[{host}] ({idx}/{len(hosts)})"
+    try:
+        for idx, host in enumerate(hosts, 1):
+            # keep the next `lookahead` hosts connecting in the background {{
+            if executor:
+                for ahead in range(idx, min(idx + lookahead, len(hosts)) + 1):
+                    if ahead not in opening:
+                        opening[ahead] = executor.submit(
+                            _open_connection, hosts[ahead - 1], profiler is not None, connect_timeout,
+                        )
+            # }}
+            if not jsonl:
+                header = f"[{host}] ({idx}/{len(hosts)})"
+                print(header)
+                print("-" * len(header))
+            conn = None
+            timings = {}
+            failed = True
+            try:
+                conn, connect_timings = (
+                    opening.pop(idx).result() if executor
+                    else _open_connection(host, profiler is not None, connect_timeout)
+                )
+                timings.update(connect_timings)
+                start = time.monotonic()
+                if jsonl:
+                    if ssh_mux.enabled():
+                        res, _ = ssh_mux.run_host(host, command, command_timeout=command_timeout)
+                    else:
+                        res = conn.sudo(command, pty=True, hide=True, warn=True, timeout=command_timeout)
+                    timings['command'] = time.monotonic() - start
+                    bucket, _ = buckets.add(split_host(host)[1], _output_key(res), "", "", res.return_code)
+                    exec_output.write_record(exec_output.host_record(
+                        host_names[idx - 1], host, res=res, timings=timings, bucket=bucket,
+                    ))
+                elif ssh_mux.enabled():
+                    return_code = ssh_mux.run_host_interactive(host, command, command_timeout=command_timeout)
+                else:
+                    return_code = conn.sudo(command, pty=True, hide=False, warn=True, timeout=command_timeout).return_code
+                timings.setdefault('command', time.monotonic() - start)
+                failed = False
+                if not jsonl:
+                    print(f"\n[{host}] exit status: {return_code}")
+            except Exception as e:
+                if isinstance(e, CommandTimedOut):
+                    timings['command'] = time.monotonic() - start
+                    e = HostTimeout('command', command_timeout)
+                timings.update(getattr(e, 'timings', None) or {})
+                rsh.config.logging.error(f"[{host}] Command execution failed: {e}")
+                if jsonl:
+                    exec_output.write_record(exec_output.host_record(
+                        host_names[idx - 1], host, timings=timings, error=e,
+                    ))
+                else:
+                    print(f"[{host}] ERROR: {e}")
+            finally:
+                if conn is not None:
+                    conn.close()
+                if profiler:
+                    profiler.add(host_names[idx - 1], timings, failed=failed)
+                if len(hosts) > 1 and not jsonl:
+                    print("===\n")
+
+                # Optional delay between hosts
+                if idx < len(hosts) and delay > 0:
+                    if not jsonl:
+                        print(f"Sleeping {delay} seconds before next host...\n")
+                    try:
+                        time.sleep(delay)
+                    except KeyboardInterrupt:
+                        print("Sleep interrupted by user, continuing...\n", file=sys.stderr if jsonl else sys.stdout)
+    finally:
+        # interrupted run: drop connections opened ahead
+        if executor:
+            for future in opening.values():
+                future.cancel()
+            executor.shutdown(wait=True)
+            for future in opening.values():
+                if not future.cancelled() and future.exception() is None and future.result()[0] is not None:
+                    future.result()[0].close()
+    _finish_profile(profiler, profile_file)
+
+
+def _output_key(res):
+    """Dedup bucket key of a fabric Result: stripped stdout, or stderr if stdout is empty."""
+    out = (res.stdout or "").strip()
+    err = (res.stderr or "").strip()
+    return out if out else err
+
+
+def _print_dedup_report(buckets, errors=None, timeouts=None, stragglers=None):
+    """
+    Print each unique output once alongside the list of hosts that produced it.
+    `buckets` are rsh.exec_output.Bucket objects,
+    `errors` maps an error message to the hosts that failed with it,
+    `timeouts` the same for hosts that exceeded a timeout,
+    `stragglers` lists hosts still running when the report was returned early.
+    """
+    def sort_key(item):
+        _, host_list = item
+        return (-len(host_list), ", ".join(sorted(host_list)))
+
+    for bucket in sorted(buckets, key=lambda bucket: sort_key((None, bucket.hosts))):
+        host_line = ", ".join(sorted(bucket.hosts))
+        header = f"[{host_line}]"
         print(header)
         print("-" * len(header))
+
+        print(bucket.display() if bucket.output else "(no output)")
+        print(f"\nexit status (representative): {bucket.exit_code}")
+        print("===\n")
+
+    for error, host_list in sorted((errors or {}).items(), key=sort_key):
+        host_line = ", ".join(sorted(host_list))
+        header = f"[{host_line}]"
+        print(header)
+        print("-" * len(header))
+        print(f"ERROR: {error}")
+        print("===\n")
+
+    for error, host_list in sorted((timeouts or {}).items(), key=sort_key):
+        host_line = ", ".join(sorted(host_list))
+        header = f"[{host_line}]"
+        print(header)
+        print("-" * len(header))
+        print(f"TIMED OUT: {error}")
+        print("===\n")
+
+    if stragglers:
+        header = f"[{', '.join(sorted(stragglers))}]"
+        print(header)
+        print("-" * len(header))
+        print("STILL RUNNING: not waited for")
+        print("===\n")
+
+
+class _LiveSummary:
+    """
+    Progress summary of dedup buckets on stderr: redrawn in place on a terminal,
+    printed as plain lines (at most every `plain_interval` seconds) otherwise.
+    """
+
+    max_buckets = 5
+    max_width = 80
+
+    def __init__(self, total, out=sys.stderr, tty_interval=0.2, plain_interval=5.0):
+        self.total = total
+        self.out = out
+        self.tty = out.isatty()
+        self.interval = tty_interval if self.tty else plain_interval
+        self.last_draw = 0.0
+        self.drawn_lines = 0
+
+    def update(self, buckets, failed, done, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_draw < self.interval:
+            return
+        self.last_draw = now
+
+        lines = [
+            f"done {done}/{self.total}, pending {self.total - done}, "
+            f"failed {failed}, unique outputs {len(buckets)}"
+        ]
+        top = sorted(buckets.values(), key=lambda bucket: -len(bucket.hosts))[:self.max_buckets]
+        for bucket in top:
+            first_line = bucket.first_line() or "(no output)"
+            lines.append(f"  [{len(bucket.hosts)}] {first_line}"[:self.max_width])
+        if len(buckets) > self.max_buckets:
+            lines.append(f"  ... {len(buckets) - self.max_buckets} more")
+
+        if self.tty:
+            self.clear()
+            self.drawn_lines = len(lines)
+        self.out.write("\n".join(lines) + "\n")
+        self.out.flush()
+
+    def clear(self):
+        if self.tty and self.drawn_lines:
+            # move cursor up to the first summary line and erase to the end of screen
+            self.out.write(f"\x1b[{self.drawn_lines}F\x1b[J")
+            self.out.flush()
+            self.drawn_lines = 0
+
+
+def split_host(host):
+    """Split fabric style 'user@host:port' into (user, hostname, port); missing parts are None."""
+    user = None
+    port = None
+    if '@' in host:
+        user, host = host.rsplit('@', 1)
+    if host.startswith('['):
+        # [ipv6]:port
+        hostname, _, rest = host[1:].partition(']')
+        if rest.startswith(':'):
+            port = int(rest[1:])
+        return user, hostname, port
+    if host.count(':') == 1:
+        host, port = host.split(':')
+        port = int(port)
+    return user, host, port
+
+
+class ConnectError(Exception):
+    """
+    Raised when the SSH connection to a host could not be established,
+    `timings` holds the connect phases measured until the failure.
+    """
+
+    def __init__(self, *args, timings=None):
+        super().__init__(*args)
+        self.timings = timings
+
+
+class HostTimeout(Exception):
+    """
+    Raised when a host exceeded the connect or command timeout, reported in its own
+    "timed out" bucket. `phase` is 'connect' or 'command', `timings` as ConnectError.
+    """
+
+    def __init__(self, phase, seconds, timings=None):
+        super().__init__(f"{phase} took longer than {seconds:g}s")
+        self.phase = phase
+        self.timings = timings
+
+
+def _is_connect_failure(error):
+    return isinstance(error, ConnectError) or getattr(error, 'phase', None) == 'connect'
+
+
+class HostResult:
+    """Minimal stand-in for fabric's Result: stdout, stderr, return_code."""
+
+    def __init__(self, stdout, stderr, return_code):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.return_code = return_code
+
+
+def _connect(host, profile=False, connect_timeout=None):
+    """
+    Open a fabric Connection to host. Returns (conn, timings) where timings holds
+    'connect' seconds; with `profile` also 'dns' (lookup), 'tcp' (connect) and
+    'auth' (ssh handshake and authentication), the socket is then opened here
+    and handed to paramiko. Failures are raised as ConnectError, exceeding
+    `connect_timeout` seconds (tcp connect, banner and auth each) as HostTimeout.
+    """
+    import socket
+    from fabric import Connection
+
+    conn = Connection(host, connect_timeout=connect_timeout or None)
+    if connect_timeout:
+        # on top of connect_kwargs from the user's fabric config (key_filename, passphrase, ...)
+        conn.connect_kwargs.update(banner_timeout=connect_timeout, auth_timeout=connect_timeout)
+    timings = {}
+    started_at = start = time.monotonic()
+    try:
+        if profile:
+            addr_infos = socket.getaddrinfo(conn.host, conn.port, type=socket.SOCK_STREAM)
+            timings['dns'] = time.monotonic() - start
+            start = time.monotonic()
+            sock = _tcp_connect(addr_infos, conn.connect_timeout)
+            timings['tcp'] = time.monotonic() - start
+            start = time.monotonic()
+            conn.connect_kwargs['sock'] = sock
+        conn.open()
+        if profile:
+            timings['auth'] = time.monotonic() - start
+    except Exception as e:
+        conn.close()
+        timings['connect'] = time.monotonic() - started_at
+        if connect_timeout and (isinstance(e, TimeoutError) or timings['connect'] >= connect_timeout):
+            raise HostTimeout('connect', connect_timeout, timings=timings) from e
+        raise ConnectError(e, timings=timings) from e
+    timings['connect'] = time.monotonic() - started_at
+    return conn, timings
+
+
+def _tcp_connect(addr_infos, timeout=None):
+    """Connect to the first reachable getaddrinfo() address, like socket.create_connection."""
+    import socket
+
+    error = None
+    for family, sock_type, proto, _, address in addr_infos:
+        sock = socket.socket(family, sock_type, proto)
         try:
-            conn = Connection(host)
-            result = conn.sudo(command, pty=True, hide=False, warn=True)
-            print(f"\n[{host}] exit status: {result.return_code}")
-        except Exception as e:
-            rsh.config.logging.error(f"[{host}] Command execution failed: {e}")
-            print(f"[{host}] ERROR: {e}")
-        finally:
-            if len(hosts) > 1:
-                print("===\n")
-
-            # Optional delay between hosts
-            if idx < len(hosts) and delay > 0:
-                print(f"Sleeping {delay} seconds before next host...\n")
+            sock.settimeout(timeout)
+            sock.connect(address)
+            sock.settimeout(None)
+            return sock
+        except OSError as e:
+            error = e
+            sock.close()
+    raise error or OSError('getaddrinfo returned no addresses')
+
+
+def _run_host(host, command, profile=False, connect_timeout=None, command_timeout=None):
+    """
+    Run `command` with sudo on one host.
+    Returns (fabric Result, timings) where timings holds 'connect' and 'command' seconds
+    (and the connect phases with `profile`, see _connect).
+    Connection failures are raised as ConnectError, exceeded timeouts as HostTimeout.
+    With sshMux enabled the shared ssh master connection is used (see rsh.ssh_mux).
+    """
+    if rsh.config.cfg['sshMux']['enable']:
+        from rsh import ssh_mux
+        return ssh_mux.run_host(host, command, connect_timeout=connect_timeout, command_timeout=command_timeout)
+
+    from invoke.exceptions import CommandTimedOut
+
+    conn, timings = _connect(host, profile=profile, connect_timeout=connect_timeout)
+    with conn:
+        start = time.monotonic()
+        try:
+            res = conn.sudo(command, warn=True, hide=True, pty=True, timeout=command_timeout or None)
+        except CommandTimedOut as e:
+            timings['command'] = time.monotonic() - start
+            raise HostTimeout('command', command_timeout, timings=timings) from e
+        timings['command'] = time.monotonic() - start
+    return res, timings
+
+
+class _ConcurrencyLimiter:
+    """
+    In-flight host limit for the rolling window of run_command_parallel_dedup.
+    In adaptive mode the limit is halved (at most once per `cooldown` seconds)
+    on connect errors or handshakes slower than `slow_connect`, and grows by one
+    after a full window of fast connects, up to `max_limit`.
+    """
+
+    def __init__(self, max_limit, adaptive=False, initial=None, min_limit=1, slow_connect=3.0, cooldown=1.0):
+        self.max_limit = max(max_limit, 1)
+        self.adaptive = adaptive
+        self.limit = min(initial or self.max_limit, self.max_limit) if adaptive else self.max_limit
+        self.min_limit = min(max(min_limit, 1), self.max_limit)
+        self.slow_connect = slow_connect
+        self.cooldown = cooldown
+        self.fast_connects = 0
+        self.last_decrease = 0.0
+
+    def feedback(self, connect_time=None, connect_failed=False):
+        if not self.adaptive:
+            return
+        now = time.monotonic()
+        if connect_failed or (connect_time is not None and connect_time > self.slow_connect):
+            self.fast_connects = 0
+            if now - self.last_decrease >= self.cooldown and self.limit > self.min_limit:
+                self.limit = max(self.min_limit, self.limit // 2)
+                self.last_decrease = now
+                rsh.config.logging.debug(f"adaptive forks decreased to {self.limit}")
+        elif connect_time is not None:
+            self.fast_connects += 1
+            if self.fast_connects >= self.limit and self.limit < self.max_limit:
+                self.limit += 1
+                self.fast_connects = 0
+                rsh.config.logging.debug(f"adaptive forks increased to {self.limit}")
+
+
+def _dispatch_threads(hosts, command, limiter, on_done, **run_kwargs):
+    """
+    Run `command` on `hosts` ((inventory name, sshHost) pairs) in a thread pool through
+    the rolling window of `limiter`, calling on_done(host, res, timings, error, name=name)
+    in the calling thread as hosts finish.
+    `run_kwargs` (profile, connect_timeout, command_timeout) are passed to _run_host.
+    Returns the peak number of hosts in flight. When on_done raises, hosts still
+    running are abandoned instead of waited for.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    peak = 0
+    pending = iter(hosts)
+    pending_left = len(hosts)
+    in_flight = {}   # future -> (name, host)
+    executor = ThreadPoolExecutor(max_workers=max(limiter.max_limit, 1))
+    try:
+        while pending_left or in_flight:
+            while pending_left and len(in_flight) < limiter.limit:
+                name, host = next(pending)
+                pending_left -= 1
+                in_flight[executor.submit(_run_host, host, command, **run_kwargs)] = (name, host)
+            peak = max(peak, len(in_flight))
+
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                name, host = in_flight.pop(future)
+                try:
+                    res, timings = future.result()
+                except Exception as e:
+                    limiter.feedback(connect_failed=_is_connect_failure(e))
+                    on_done(host, None, getattr(e, 'timings', None), e, name=name)
+                else:
+                    limiter.feedback(connect_time=timings['connect'])
+                    on_done(host, res, timings, None, name=name)
+    except BaseException:
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return peak
+
+
+class _ReturnEarly(Exception):
+    """Raised by _DedupCollector once enough hosts finished (pExec --return-after)."""
+
+
+class _DedupCollector:
+    """
+    Collects per-host results into dedup buckets for _print_dedup_report.
+    Results are hashed and dropped as they arrive (see rsh.exec_output.OutputBuckets),
+    `normalize` and `spill_threshold` default to pExec.normalize and pExec.spillThreshold.
+    With `output` 'jsonl' a record per host is written to stdout as it arrives instead
+    of the report, named by the `name` passed with each result (default the sshHost).
+    `profiler` (rsh.exec_profile.Profiler) gets the timings of every host.
+    With `return_after` (fraction of hosts, below 1) _ReturnEarly is raised once that
+    many hosts finished, the rest are reported as stragglers.
+    """
+
+    def __init__(self, total, stream=False, normalize=None, spill_threshold=None, output='text',
+                 profiler=None, return_after=1.0):
+        from rsh import exec_output
+
+        cfg = rsh.config.cfg['pExec']
+        self.exec_output = exec_output
+        self.output = output
+        self.profiler = profiler
+        self.total = total
+        self.buckets = exec_output.OutputBuckets(
+            normalize=cfg['normalize'] if normalize is None else normalize,
+            spill_threshold=cfg['spillThreshold'] if spill_threshold is None else spill_threshold,
+            spill_dir=cfg['spillDir'],
+        )
+        self.errors = {}      # error message -> list of hosts
+        self.timeouts = {}    # timeout message -> list of hosts
+        self.stragglers = []  # (name, sshHost) pairs not waited for
+        self.finished = set() # (name, sshHost) pairs done
+        self.return_after = math.ceil(total * return_after) if 0 < return_after < 1 else None
+        self.done = 0
+        self.failed = 0       # hosts with errors
+        self.nonzero = 0      # hosts with non-zero exit status
+        self.summary = _LiveSummary(total) if stream else None
+
+    def __call__(self, host, res, timings, error, name=None):
+        self.done += 1
+        ssh_host = host
+        name = name or ssh_host
+        host = split_host(host)[1]  # reported like fabric's conn.host
+        bucket = spill_path = None
+        if self.return_after:
+            self.finished.add((name, ssh_host))
+        if isinstance(error, HostTimeout):
+            self.failed += 1
+            rsh.config.logging.warning(f"[{host}] timed out: {error}")
+            self.timeouts.setdefault(str(error), []).append(host)
+        elif error is not None:
+            self.failed += 1
+            rsh.config.logging.error(f"[{host}] Command execution failed: {error}")
+            self.errors.setdefault(str(error), []).append(host)
+        else:
+            bucket, spill_path = self.buckets.add(host, _output_key(res), res.stdout or "", res.stderr or "", res.return_code)
+            if res.return_code != 0:
+                self.nonzero += 1
+        if self.profiler:
+            self.profiler.add(name, timings, failed=error is not None)
+        if self.output == 'jsonl':
+            self.exec_output.write_record(self.exec_output.host_record(
+                name, ssh_host,
+                res=res, timings=timings, bucket=bucket, spill_path=spill_path, error=error,
+            ))
+        if self.summary:
+            self.summary.update(self.buckets, self.failed, self.done, force=(self.done == self.total))
+        if self.return_after and self.return_after <= self.done < self.total:
+            raise _ReturnEarly()
+
+    def return_early(self, hosts):
+        """Record (name, sshHost) pairs not finished when _ReturnEarly was raised as stragglers."""
+        self.stragglers = [host for host in hosts if host not in self.finished]
+        if self.output == 'jsonl':
+            for name, ssh_host in self.stragglers:
+                self.exec_output.write_record(self.exec_output.host_record(name, ssh_host, straggler=True))
+
+    def close(self):
+        if self.summary:
+            self.summary.clear()
+
+    def note(self, message):
+        """Print a progress line on stderr without breaking the live summary."""
+        self.close()
+        print(message, file=sys.stderr, flush=True)
+
+    def report(self):
+        if self.output == 'jsonl':
+            return
+        _print_dedup_report(
+            self.buckets.values(), self.errors, self.timeouts,
+            [split_host(host)[1] for _, host in self.stragglers],
+        )
+
+
+def _dispatch_pool(hosts, command, collector, forks=0, adaptive=False, backend='thread',
+                   connect_timeout=None, command_timeout=None):
+    """
+    Run `command` on `hosts` ((inventory name, sshHost) pairs) through the rolling
+    window of the chosen backend, feeding results to `collector` (connect phases are timed when it profiles).
+    `connect_timeout` and `command_timeout` (seconds, None or 0 - no limit) apply per host.
+    Returns (peak hosts in flight, limiter).
+    """
+    cfg = rsh.config.cfg['pExec']
+    if backend == 'asyncio':
+        from rsh import exec_async
+        dispatch = exec_async.dispatch
+        max_forks = min(forks or cfg['asyncMaxForks'], len(hosts))
+    elif backend == 'thread':
+        dispatch = _dispatch_threads
+        max_forks = min(forks or len(hosts), len(hosts))
+    else:
+        rsh.config.logging.error(f"Unsupported backend '{backend}'. Only 'thread' or 'asyncio' are allowed.")
+        sys.exit(1)
+
+    limiter = _ConcurrencyLimiter(
+        max_forks,
+        adaptive=adaptive,
+        initial=cfg['adaptiveInitialForks'],
+        min_limit=cfg['adaptiveMinForks'],
+        slow_connect=cfg['adaptiveSlowConnect'],
+    )
+    peak = dispatch(
+        hosts, command, limiter, collector,
+        profile=collector.profiler is not None,
+        connect_timeout=connect_timeout or None,
+        command_timeout=command_timeout or None,
+    )
+    return peak, limiter
+
+
+def _host_pairs(hosts, host_names=None):
+    """(inventory name, sshHost) pairs of `hosts`, `host_names` are their names by position."""
+    return list(zip(host_names or hosts, hosts))
+
+
+def _run_command_parallel_pool(hosts, command, forks=0, adaptive=False, stream=False, backend='thread',
+                               normalize=None, spill_threshold=None, output='text', host_names=None,
+                               profile=False, profile_file=None, connect_timeout=None, command_timeout=None,
+                               return_after=1.0):
+    """
+    Rolling window variant of run_command_parallel_dedup: at most `forks` hosts
+    (0 - all hosts, capped by pExec.asyncMaxForks for the asyncio backend) are in
+    flight, a new host starts as soon as a slot frees up. With `adaptive` the window
+    follows connect errors and handshake latency (see _ConcurrencyLimiter). With
+    `stream` a live summary of unique-output buckets is kept while hosts complete.
+    `backend` is 'thread' (fabric, thread per host in flight) or 'asyncio'
+    (asyncssh, see rsh.exec_async). `normalize`, `spill_threshold` and `output` are
+    passed to _DedupCollector, `host_names` are the inventory names of `hosts` by
+    position. `profile` and `profile_file` as in run_command_sequential. Hosts over `connect_timeout` or `command_timeout` are
+    reported as timed out. With `return_after` below 1 the report is returned once
+    that fraction of hosts finished, hosts still running are listed as stragglers.
+    The deduplicated report is printed at the end, followed by peak concurrency
+    and throughput on stderr.
+    """
+    collector = _DedupCollector(
+        len(hosts), stream=stream, normalize=normalize, spill_threshold=spill_threshold,
+        output=output, profiler=_new_profiler(profile, profile_file), return_after=return_after,
+    )
+    pairs = _host_pairs(hosts, host_names)
+    started_at = time.monotonic()
+    peak = limiter = None
+    try:
+        peak, limiter = _dispatch_pool(
+            pairs, command, collector, forks=forks, adaptive=adaptive, backend=backend,
+            connect_timeout=connect_timeout, command_timeout=command_timeout,
+        )
+    except _ReturnEarly:
+        collector.return_early(pairs)
+    finally:
+        collector.close()
+    elapsed = time.monotonic() - started_at
+
+    collector.report()
+    print(
+        f"hosts: {len(hosts)}, backend: {backend}"
+        + (f", peak concurrency: {peak}" if peak is not None else "")
+        + (f", final adaptive forks: {limiter.limit}" if adaptive and limiter else "")
+        + (f", timed out: {sum(map(len, collector.timeouts.values()))}" if collector.timeouts else "")
+        + (f", stragglers: {len(collector.stragglers)}" if collector.stragglers else "")
+        + f", elapsed: {elapsed:.1f}s, throughput: {collector.done / elapsed if elapsed else 0:.1f} hosts/s",
+        file=sys.stderr,
+    )
+    _finish_profile(collector.profiler, profile_file)
+    if collector.stragglers:
+        # threads of hosts still running would block the interpreter exit
+        rsh.config.flushLogging()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(1)
+    if collector.errors or collector.timeouts:
+        sys.exit(1)
+
+
+def host_count(value):
+    """argparse type for a number of hosts given as a count ('50') or a percentage ('10%')."""
+    value = str(value).strip()
+    try:
+        number = float(value[:-1]) if value.endswith('%') else int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid host count '{value}', expected N or N%")
+    if number < 0:
+        raise argparse.ArgumentTypeError(f"invalid host count '{value}', must not be negative")
+    return value
+
+
+def resolve_host_count(value, total):
+    """Hosts for a host_count value out of `total` hosts."""
+    value = str(value).strip()
+    if value.endswith('%'):
+        return int(total * float(value[:-1]) / 100)
+    return int(value)
+
+
+def batch_requested(value):
+    """Whether a host_count value asks for batches at all ('', 0 and 0% run one wave)."""
+    value = str(value).strip().rstrip('%')
+    return bool(value) and float(value) > 0
+
+
+def run_command_batches(hosts, command, batch, delay=0.0, max_failures=0, forks=0, adaptive=False, stream=False,
+                        backend='thread', normalize=None, spill_threshold=None, output='text', host_names=None,
+                        profile=False, profile_file=None, connect_timeout=None, command_timeout=None):
+    """
+    Run a command in waves of `batch` hosts (count or percentage of all hosts), every
+    wave in parallel through the rolling window (see _run_command_parallel_pool), with
+    `delay` seconds between waves. Once more than `max_failures` hosts (count or
+    percentage) failed to connect, timed out or exited non-zero, the remaining waves are
+    skipped. Outputs of all waves are deduplicated into one report, `host_names` are
+    the inventory names of `hosts` by position.
+    """
+    batch_size = max(1, resolve_host_count(batch, len(hosts)))
+    failures_allowed = resolve_host_count(max_failures, len(hosts))
+    pairs = _host_pairs(hosts, host_names)
+    waves = [pairs[i:i + batch_size] for i in range(0, len(pairs), batch_size)]
+    rsh.config.logging.debug(f"batch_size={batch_size} waves={len(waves)} failures_allowed={failures_allowed}")
+
+    collector = _DedupCollector(
+        len(hosts), stream=stream, normalize=normalize, spill_threshold=spill_threshold,
+        output=output, profiler=_new_profiler(profile, profile_file),
+    )
+    skipped = []
+    started_at = time.monotonic()
+    try:
+        for idx, wave in enumerate(waves, 1):
+            wave_started_at = time.monotonic()
+            _dispatch_pool(
+                wave, command, collector, forks=forks, adaptive=adaptive, backend=backend,
+                connect_timeout=connect_timeout, command_timeout=command_timeout,
+            )
+            failures = collector.failed + collector.nonzero
+            collector.note(
+                f"wave {idx}/{len(waves)}: {len(wave)} hosts in {time.monotonic() - wave_started_at:.1f}s, "
+                f"done {collector.done}/{len(hosts)}, failed {failures} (allowed {failures_allowed})"
+            )
+            if failures > failures_allowed:
+                skipped = [host for later in waves[idx:] for host in later]
+                break
+            if idx < len(waves) and delay > 0:
+                collector.note(f"Sleeping {delay} seconds before next wave...")
                 try:
                     time.sleep(delay)
                 except KeyboardInterrupt:
-                    print("Sleep interrupted by user, continuing...\n")
+                    collector.note("Sleep interrupted by user, continuing...")
+    finally:
+        collector.close()
+    elapsed = time.monotonic() - started_at
+
+    collector.report()
+    print(
+        f"hosts: {len(hosts)}, waves: {len(waves)} x {batch_size} hosts, backend: {backend}"
+        + f", elapsed: {elapsed:.1f}s, throughput: {collector.done / elapsed if elapsed else 0:.1f} hosts/s",
+        file=sys.stderr,
+    )
+    if skipped:
+        rsh.config.logging.error(
+            f"Aborted after {collector.failed + collector.nonzero} failed hosts (allowed {failures_allowed}), "
+            f"{len(skipped)} hosts not run: {', '.join(split_host(host)[1] for _, host in skipped)}"
+        )
+    _finish_profile(collector.profiler, profile_file)
+    if collector.errors or collector.timeouts or skipped:
+        sys.exit(1)
 
 
-def run_command_parallel_dedup(GroupClass, hosts, command):
+def run_command_parallel_dedup(GroupClass, hosts, command, stream=False, forks=0, adaptive=False, backend='thread',
+                               normalize=None, spill_threshold=None, output='text', host_names=None,
+                               batch=0, delay=0.0, max_failures=0, profile=False, profile_file=None,
+                               connect_timeout=None, command_timeout=None, return_after=1.0):
     """
     Run a command in parallel across hosts and deduplicate identical outputs.
     Prints each unique output once alongside the list of hosts that produced it.
+    Outputs are bucketed by content hash after the `normalize` rules, outputs larger
+    than `spill_threshold` bytes are written to per-host files (see rsh.exec_output).
+    With `stream`, `forks`, `adaptive`, the 'asyncio' backend or spilling enabled hosts
+    run through a bounded rolling window (see _run_command_parallel_pool) instead of
+    one GroupClass call, which holds every host's output until the whole group is done.
+    With `output` 'jsonl' one JSON record per host is written as soon as it finishes
+    (always through the rolling window), `host_names` are the inventory names of `hosts`
+    by position (hosts may share an sshHost).
+    With `batch` hosts run in waves, see run_command_batches.
+    With `profile` or `profile_file` per-host phase timings are summarized (rolling window only).
+    `connect_timeout`, `command_timeout` (seconds) and `return_after` (fraction of hosts)
+    bound how long slow hosts are waited for; command timeouts and returning early
+    need the rolling window.
     """
-    rsh.config.logging.debug(f"hosts={json.dumps(hosts)}")
+    rsh.config.logging.debug("hosts=%s", rsh.config.LazyJson(hosts, indent=None))
     rsh.config.logging.debug(f"command='{command}'")
 
+    from rsh import exec_output
+
+    if normalize is None:
+        normalize = rsh.config.cfg['pExec']['normalize']
+    if spill_threshold is None:
+        spill_threshold = rsh.config.cfg['pExec']['spillThreshold']
     try:
-        group = GroupClass(*hosts)
-        results = group.sudo(command, warn=True, hide=True, pty=True)
+        exec_output.Normalizer(normalize)
+    except (ValueError, KeyError, re.error) as e:
+        rsh.config.logging.error(f"Invalid pExec normalize rules: {e}")
+        sys.exit(1)
 
-        buckets = {}     # output -> list of hosts
-        exit_codes = {}  # output -> representative exit code
+    # the wave size is clamped to at least one host, 1% of 50 hosts still batches
+    if batch_requested(batch) and len(hosts) > 1:
+        if return_after < 1:
+            rsh.config.logging.warning("return_after is ignored in batch mode, waves always run to completion")
+        return run_command_batches(
+            hosts, command, batch, delay=delay, max_failures=max_failures,
+            forks=forks, adaptive=adaptive, stream=stream, backend=backend,
+            normalize=normalize, spill_threshold=spill_threshold, output=output, host_names=host_names,
+            profile=profile, profile_file=profile_file,
+            connect_timeout=connect_timeout, command_timeout=command_timeout,
+        )
 
+    # ThreadingGroup (paramiko) can't use shared ssh master connections
+    if (stream or forks or adaptive or spill_threshold or output != 'text' or backend != 'thread'
+            or profile or profile_file or command_timeout or return_after < 1
+            or rsh.config.cfg['sshMux']['enable']):
+        return _run_command_parallel_pool(
+            hosts, command, forks=forks, adaptive=adaptive, stream=stream, backend=backend,
+            normalize=normalize, spill_threshold=spill_threshold, output=output, host_names=host_names,
+            profile=profile, profile_file=profile_file,
+            connect_timeout=connect_timeout, command_timeout=command_timeout, return_after=return_after,
+        )
+
+    try:
+        group = GroupClass(*hosts, connect_timeout=connect_timeout or None)
+        results = group.sudo(command, warn=True, hide=True, pty=True)
+
+        collector = _DedupCollector(len(hosts), normalize=normalize, spill_threshold=spill_threshold)
         for conn, res in results.items():
-            out = (res.stdout or "").strip()
-            err = (res.stderr or "").strip()
-            combined = out if out else err
-            key = combined
-
-            if key not in buckets:
-                buckets[key] = []
-                exit_codes[key] = res.return_code
-            buckets[key].append(conn.host)
-
-        def sort_key(item):
-            _, host_list = item
-            return (-len(host_list), ", ".join(sorted(host_list)))
-
-        for output, host_list in sorted(buckets.items(), key=sort_key):
-            host_line = ", ".join(sorted(host_list))
-            header = f"[{host_line}]"
-            print(header)
-            print("-" * len(header))
-
-            print(output if output else "(no output)")
-            print(f"\nexit status (representative): {exit_codes[output]}")
-            print("===\n")
+            collector(conn.host, res, None, None)
+        del results
+
+        collector.report()
 
     except Exception as e:
         try:
@@ -0,0 +1,207 @@
+# exec_output.py
+#
+# memory-bounded dedup of per-host command output for pExec: each output is
+# reduced to a content hash (after optional normalization rules) as soon as
+# its host finishes, only one representative output is kept per bucket, and
+# outputs above pExec.spillThreshold bytes go to per-host files on disk.
+# Also the per-host JSON Lines records of `sExec/pExec --output jsonl`.
+
+import os
+import re
+import sys
+import json
+import time
+import hashlib
+
+MONTHS = 'Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec'
+
+# builtin normalization rules: name -> (compiled regex, replacement)
+NORMALIZE_RULES = {
+    'timestamp': (
+        re.compile(
+            r'\b\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?(?:Z|[+-]\d{2}:?\d{2})?'
+            rf'|\b(?:{MONTHS})\s+\d{{1,2}}\s+\d{{2}}:\d{{2}}:\d{{2}}\b'
+            r'|\b\d{2}:\d{2}:\d{2}(?:\.\d+)?\b'
+        ),
+        '<timestamp>',
+    ),
+    'pid': (
+        re.compile(r'(?<=\w\[)\d+(?=\])|(?i:(?<=\bpid[=: ]))\d+'),
+        '<pid>',
+    ),
+}
+ipAddressRegex = re.compile(r'[\d.]+|.*:.*')
+
+PREVIEW_LINES = 20
+PREVIEW_CHARS = 4096
+
+
+class Normalizer:
+    """
+    Applies normalization rules to an output before hashing. Rules are builtin
+    names ('timestamp', 'pid', 'hostname') or {'regex': ..., 'replace': ...} dicts,
+    all compiled once. 'hostname' masks the host the output came from.
+    """
+
+    def __init__(self, rules=()):
+        self.rules = []
+        self.mask_hostname = False
+        for rule in rules:
+            if isinstance(rule, dict):
+                self.rules.append((re.compile(rule['regex']), rule.get('replace', '')))
+            elif rule == 'hostname':
+                self.mask_hostname = True
+            elif rule in NORMALIZE_RULES:
+                self.rules.append(NORMALIZE_RULES[rule])
+            else:
+                raise ValueError(f"unknown normalize rule '{rule}', allowed: {', '.join(NORMALIZE_RULES)}, hostname or {{regex, replace}}")
+
+    def __bool__(self):
+        return bool(self.rules or self.mask_hostname)
+
+    def __call__(self, text, hostname=None):
+        if self.mask_hostname and hostname:
+            names = [hostname]
+            if not ipAddressRegex.fullmatch(hostname) and '.' in hostname:
+                names.append(hostname.split('.', 1)[0])
+            text = re.sub(r'\b(?:' + '|'.join(map(re.escape, names)) + r')\b', '<hostname>', text)
+        for regex, replace in self.rules:
+            text = regex.sub(replace, text)
+        return text
+
+
+class Bucket:
+    """Hosts with the same (normalized) output and the representative output of the first one."""
+
+    __slots__ = ('id', 'hosts', 'exit_code', 'output', 'size', 'spill_path')
+
+    def __init__(self, bucket_id, exit_code, output, size, spill_path=None):
+        self.id = bucket_id
+        self.hosts = []
+        self.exit_code = exit_code
+        self.output = output          # full output, or its preview when spilled
+        self.size = size
+        self.spill_path = spill_path  # per-host file of the representative when spilled
+
+    def first_line(self):
+        return self.output.splitlines()[0] if self.output else ''
+
+    def display(self):
+        if self.spill_path is None:
+            return self.output
+        return f"{self.output}\n... ({self.size} bytes, full output: {self.spill_path})"
+
+
+def _preview(text):
+    return '\n'.join(text[:PREVIEW_CHARS].splitlines()[:PREVIEW_LINES])
+
+
+class OutputBuckets:
+    """
+    Dedup buckets keyed by content hash of the normalized output.
+    Outputs larger than `spill_threshold` bytes (0 - never) are written to
+    `<spill_dir>/<run id>/<host>.out` (and `.err`), only a preview stays in memory.
+    """
+
+    def __init__(self, normalize=(), spill_threshold=0, spill_dir=None):
+        self.normalizer = Normalizer(normalize)
+        self.spill_threshold = spill_threshold
+        self.spill_dir = spill_dir
+        self.run_dir = None
+        self.spilled = {}   # spill file name -> times used
+        self.buckets = {}   # digest -> Bucket
+
+    def _spill(self, host, stdout, stderr):
+        if self.run_dir is None:
+            self.run_dir = os.path.join(
+                os.path.expanduser(self.spill_dir),
+                f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}",
+            )
+            os.makedirs(self.run_dir, mode=0o700, exist_ok=True)
+        name = host.replace('/', '_')
+        # same host listed several times (different ports or users)
+        self.spilled[name] = self.spilled.get(name, 0) + 1
+        if self.spilled[name] > 1:
+            name = f"{name}.{self.spilled[name]}"
+        path = os.path.join(self.run_dir, name + '.out')
+        with open(path, 'w', errors='replace') as f:
+            f.write(stdout)
+        if stderr:
+            with open(path[:-len('.out')] + '.err', 'w', errors='replace') as f:
+                f.write(stderr)
+        return path
+
+    def add(self, host, output, stdout, stderr, exit_code):
+        """
+        Put the output of host into its bucket. `output` is the dedup text
+        (see exec_functions._output_key).
+        Returns (Bucket, spill file path of this host's stdout or None).
+        """
+        data = output.encode(errors='replace')
+        size = len(data)
+        if self.normalizer:
+            data = self.normalizer(output, host).encode(errors='replace')
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        del data
+
+        spill_path = None
+        if self.spill_threshold and size > self.spill_threshold:
+            spill_path = self._spill(host, stdout, stderr)
+
+        bucket = self.buckets.get(digest)
+        if bucket is None:
+            if spill_path is not None:
+                bucket = Bucket(digest[:12], exit_code, _preview(output), size, spill_path)
+            else:
+                bucket = Bucket(digest[:12], exit_code, output, size)
+            self.buckets[digest] = bucket
+        bucket.hosts.append(host)
+        return bucket, spill_path
+
+    def values(self):
+        return self.buckets.values()
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+def host_record(host, ssh_host, res=None, timings=None, bucket=None, spill_path=None, error=None, straggler=False):
+    """
+    JSON Lines record of one finished host: inventory name, sshHost, exit code,
+    stdout/stderr (or stdoutFile/stderrFile when spilled), timings in seconds and
+    dedup bucket id. Failed hosts get 'error' and a null exit code, hosts over
+    a timeout also 'timedOut' with the phase (connect or command). Hosts not waited
+    for (pExec --return-after) get 'straggler'.
+    """
+    record = {
+        'host': host,
+        'sshHost': ssh_host,
+        'exitCode': None,
+        'bucket': None,
+        'timings': {phase: round(seconds, 3) for phase, seconds in (timings or {}).items()},
+    }
+    if error is not None:
+        record['error'] = str(error)
+        if getattr(error, 'phase', None):
+            record['timedOut'] = error.phase
+        return record
+    if straggler:
+        record['straggler'] = True
+        return record
+    record['exitCode'] = res.return_code
+    record['bucket'] = bucket.id if bucket else None
+    if spill_path is not None:
+        record['stdoutFile'] = spill_path
+        if res.stderr:
+            record['stderrFile'] = spill_path[:-len('.out')] + '.err'
+    else:
+        record['stdout'] = res.stdout or ''
+        record['stderr'] = res.stderr or ''
+    return record
+
+
+def write_record(record, out=None):
+    """Write one JSON Lines record and flush it, so a pipe sees every host as it finishes."""
+    out = out or sys.stdout
+    out.write(json.dumps(record, ensure_ascii=False) + '\n')
+    out.flush()
@@ -0,0 +1,118 @@
+# exec_profile.py
+#
+# run profiling for sExec/pExec --profile: per-host phase timings (dns, tcp,
+# auth, connect, command, total), p50/p95/p99 summary and slowest hosts on
+# stderr, optionally written as a Prometheus text or JSON metrics file to
+# track fleet latency over time.
+
+import os
+import sys
+import json
+import math
+import time
+
+PHASES = ('dns', 'tcp', 'auth', 'connect', 'command', 'total')
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+def percentile(sorted_values, quantile):
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(quantile * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+class Profiler:
+    """Collects per-host phase timings (seconds) of one executor run."""
+
+    def __init__(self, program, slowest=10):
+        self.program = program
+        self.slowest = slowest
+        self.started_at = time.time()
+        self.hosts = []     # (host, {phase: seconds})
+        self.failed = 0
+
+    def add(self, host, timings, failed=False):
+        timings = dict(timings or {})
+        if not failed and ('connect' in timings or 'command' in timings):
+            timings['total'] = timings.get('connect', 0.0) + timings.get('command', 0.0)
+        self.hosts.append((host, timings))
+        if failed:
+            self.failed += 1
+
+    def phases(self):
+        """{phase: {'p50', 'p95', 'p99', 'max', 'sum', 'count'}} for phases seen in this run."""
+        stats = {}
+        for phase in PHASES:
+            values = sorted(timings[phase] for _, timings in self.hosts if phase in timings)
+            if not values:
+                continue
+            stats[phase] = {f"p{round(q * 100)}": percentile(values, q) for q in QUANTILES}
+            stats[phase].update({'max': values[-1], 'sum': sum(values), 'count': len(values)})
+        return stats
+
+    def slowest_hosts(self):
+        ranked = sorted(self.hosts, key=lambda item: -item[1].get('total', 0.0))
+        return ranked[:self.slowest]
+
+    def report(self, out=sys.stderr):
+        stats = self.phases()
+        print(f"profile: {len(self.hosts)} hosts, failed {self.failed}", file=out)
+        print(f"  {'phase':<8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)", file=out)
+        for phase, values in stats.items():
+            print(
+                f"  {phase:<8} "
+                + " ".join(f"{values[key] * 1000:>8.1f}" for key in ('p50', 'p95', 'p99', 'max')),
+                file=out,
+            )
+        print("  slowest hosts:", file=out)
+        for host, timings in self.slowest_hosts():
+            phases = ", ".join(f"{phase} {timings[phase] * 1000:.1f}" for phase in PHASES if phase in timings)
+            print(f"    {host}: {phases or 'no timings'}", file=out)
+        out.flush()
+
+    def to_json(self):
+        return {
+            'program': self.program,
+            'startedAt': self.started_at,
+            'hosts': len(self.hosts),
+            'failed': self.failed,
+            'phases': self.phases(),
+            'slowest': [{'host': host, 'timings': timings} for host, timings in self.slowest_hosts()],
+            'perHost': [{'host': host, 'timings': timings} for host, timings in self.hosts],
+        }
+
+    def to_prometheus(self):
+        lines = [
+            '# HELP rsh_exec_phase_seconds Per-host phase duration of the last run.',
+            '# TYPE rsh_exec_phase_seconds summary',
+        ]
+        for phase, values in self.phases().items():
+            labels = f'program="{self.program}",phase="{phase}"'
+            for quantile in QUANTILES:
+                lines.append(f'rsh_exec_phase_seconds{{{labels},quantile="{quantile}"}} {values[f"p{round(quantile * 100)}"]:.6f}')
+            lines.append(f'rsh_exec_phase_seconds_sum{{{labels}}} {values["sum"]:.6f}')
+            lines.append(f'rsh_exec_phase_seconds_count{{{labels}}} {values["count"]}')
+        lines += [
+            '# HELP rsh_exec_hosts Hosts of the last run by status.',
+            '# TYPE rsh_exec_hosts gauge',
+            f'rsh_exec_hosts{{program="{self.program}",status="ok"}} {len(self.hosts) - self.failed}',
+            f'rsh_exec_hosts{{program="{self.program}",status="failed"}} {self.failed}',
+            '# HELP rsh_exec_last_run_timestamp_seconds Start time of the last run.',
+            '# TYPE rsh_exec_last_run_timestamp_seconds gauge',
+            f'rsh_exec_last_run_timestamp_seconds{{program="{self.program}"}} {self.started_at:.3f}',
+        ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, file_path):
+        """Write metrics atomically, JSON for *.json paths, Prometheus text format otherwise."""
+        file_path = os.path.expanduser(file_path)
+        if file_path.endswith('.json'):
+            data = json.dumps(self.to_json(), indent=2) + "\n"
+        else:
+            data = self.to_prometheus()
+        tmp_file_path = f"{file_path}.{os.getpid()}.tmp"
+        with open(tmp_file_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_file_path, file_path)
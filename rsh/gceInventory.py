@@ -5,17 +5,20 @@ import sys
 sys.path.append('/opt/rsh')
 import inspect
 import logging
-import json
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 from .common import CommonMixin
 
+simpleStringRegex = re.compile(r"[A-Za-z0-9_-]+")
+
 class gceInventory(
     CommonMixin,
     ):
     def __init__(self, cfg):
         self.logger = logging.getLogger(__name__)
         self.cfg = cfg
+        self.incomplete = False # set when a project failed and instancesInfo() skipped it
 
     def instancesInfo(self):
         """
@@ -46,50 +49,100 @@ class gceInventory(
 
         defName = inspect.stack()[0][3]
 
+        projects = self.cfg['gceInventory']['projects'] or [None]
+        self.logger.debug("%s: projects='%s'", defName, projects)
+
+        # query projects concurrently, a failed or slow project is logged and skipped {{
         instancesInfoArray = list()
-        describeInstances = self.runCmd("gcloud compute instances list --format=json")['stdout']
-        for describeInstance in describeInstances:
-            name = describeInstance['name']
-            if self.cfg['gceInventory']['nameSuffix']:
-                # set name suffix if need
-                name = name + self.cfg['gceInventory']['nameSuffix']
-            status = describeInstance['status']
-            if self.cfg['gceInventory']['skipNotRunningInstance']:
-                if status != 'RUNNING':
-                    self.logger.debug(f"{defName}: skipping instance name='{name}', because its status is not 'RUNNING'")
-                    continue
-            zone = describeInstance['zone']
-            dc = zone.split('/')[-1]
-            PrivateIpAddress = describeInstance['networkInterfaces'][0]['networkIP']
-            PublicIpAddress = describeInstance['networkInterfaces'][0]['accessConfigs'][0]['natIP']
-            tags = list()
-            for item in describeInstance['metadata']['items']:
-                if item['key'] == 'startup-script':
-                    self.logger.debug(f"{defName}: skipping item key='{item['key']}', because it's startup-script")
-                    continue
-                elif not re.fullmatch(r"[A-Za-z0-9_-]+", item['key']):
-                    self.logger.debug(f"{defName}: skipping item key='{item['key']}', because 'key' does not match a simple string")
-                    continue
-                elif not re.fullmatch(r"[A-Za-z0-9_-]+", item['value']):
-                    self.logger.debug(f"{defName}: skipping item key='{item['key']}', because 'value' does not match a simple string")
-                    continue
-                else:
-                    tags.append({ "Key": item['key'], "Value": item['value'] })
-
-            info = {
-                "host": name,
-                "dc": dc,
-                "PrivateIpAddress": PrivateIpAddress,
-                "PublicIpAddress": PublicIpAddress,
-                "tags": tags,
-            }
+        with ThreadPoolExecutor(max_workers=self.cfg['gceInventory']['maxWorkers']) as executor:
+            futures = [(project, executor.submit(self.projectInstancesInfo, project)) for project in projects]
+            for project, future in futures:
+                try:
+                    instancesInfoArray.extend(future.result())
+                except Exception as e:
+                    self.incomplete = True
+                    self.logger.error(f"{defName}: failed get instances from project='{project or 'default'}', skipping, error: '{e!r}'")
+        # }}
+        return instancesInfoArray
 
-            # added rsh inventory info
-            info['rshInventoryModule'] = self.__class__.__name__
-            info['hosting'] = 'gce'
+    def projectInstancesInfo(self, project):
+        """
+        return info for instances from one project (None - gcloud default project),
+        instances are parsed one by one while gcloud prints them, malformed ones are skipped
+        """
+
+        defName = inspect.stack()[0][3]
 
-            # added sshHost tag
-            info['sshHost'] = info.get(self.cfg['gceInventory']['sshHostField'], 'unknown')
-            instancesInfoArray.append(info)
+        command = ['gcloud', 'compute', 'instances', 'list', '--format=json']
+        if project:
+            command.append(f"--project={project}")
+        if self.cfg['gceInventory']['skipNotRunningInstance']:
+            command.append('--filter=status=RUNNING')
 
-        return instancesInfoArray
+        instancesInfo = list()
+        for describeInstance in self.runCmd(command, stream=True, timeout=self.cfg['gceInventory']['projectTimeout']):
+            try:
+                info = self.instanceInfo(describeInstance, project)
+            except (KeyError, IndexError, TypeError, AttributeError) as e:
+                name = describeInstance.get('name') if isinstance(describeInstance, dict) else None
+                self.logger.warning(f"{defName}: skipping malformed instance name='{name}' project='{project or 'default'}', error: '{e!r}'")
+                continue
+            if info is not None:
+                instancesInfo.append(info)
+        return instancesInfo
+
+    def instanceInfo(self, describeInstance, project):
+        """
+        return info for one instance of 'gcloud compute instances list' or None if it is skipped
+        """
+
+        defName = inspect.stack()[0][3]
+
+        name = describeInstance['name']
+        if self.cfg['gceInventory']['nameSuffix']:
+            # set name suffix if need
+            name = name + self.cfg['gceInventory']['nameSuffix']
+        status = describeInstance['status']
+        if self.cfg['gceInventory']['skipNotRunningInstance']:
+            if status != 'RUNNING':
+                self.logger.debug(f"{defName}: skipping instance name='{name}', because its status is not 'RUNNING'")
+                return None
+        zone = describeInstance['zone']
+        dc = zone.split('/')[-1]
+        networkInterface = describeInstance['networkInterfaces'][0]
+        PrivateIpAddress = networkInterface['networkIP']
+        # instances without external ip have no accessConfigs
+        accessConfigs = networkInterface.get('accessConfigs') or [{}]
+        PublicIpAddress = accessConfigs[0].get('natIP', 'unknown')
+        tags = list()
+        if project:
+            tags.append({ "Key": "project", "Value": project })
+        for item in (describeInstance.get('metadata') or {}).get('items', []):
+            key, value = item.get('key', ''), item.get('value', '')
+            if key == 'startup-script':
+                self.logger.debug(f"{defName}: skipping item key='{key}', because it's startup-script")
+                continue
+            elif not simpleStringRegex.fullmatch(key):
+                self.logger.debug(f"{defName}: skipping item key='{key}', because 'key' does not match a simple string")
+                continue
+            elif not isinstance(value, str) or not simpleStringRegex.fullmatch(value):
+                self.logger.debug(f"{defName}: skipping item key='{key}', because 'value' does not match a simple string")
+                continue
+            else:
+                tags.append({ "Key": key, "Value": value })
+
+        info = {
+            "host": name,
+            "dc": dc,
+            "PrivateIpAddress": PrivateIpAddress,
+            "PublicIpAddress": PublicIpAddress,
+            "tags": tags,
+        }
+
+        # added rsh inventory info
+        info['rshInventoryModule'] = self.__class__.__name__
+        info['hosting'] = 'gce'
+
+        # added sshHost tag
+        info['sshHost'] = info.get(self.cfg['gceInventory']['sshHostField'], 'unknown')
+        return info
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# build inventory hosts/groups from plugins instancesInfo()
+# in near-linear time: groups are collected as insertion ordered dicts
+# (O(1) membership), natural sort keys are computed once per name
+
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+nonAlnumRegex = re.compile(r'[^A-Za-z0-9]+')
+natsortPartsRegex = re.compile(r'[A-Za-z]+|\d+')
+spacesRegex = re.compile(r'\s+')
+
+# natural sort helper:
+# - split by non-alphanumeric
+# - then split into alpha vs digits
+# - compare strings before numbers; numbers as integers
+def natsortKey(host):
+    left = str(host).split('.', 1)[0]  # strip domain part like ".aws"
+    tokens = []
+    for t in nonAlnumRegex.split(left):
+        if not t:
+            continue
+        for p in natsortPartsRegex.findall(t):
+            if p.isdigit():
+                tokens.append((1, int(p)))
+            else:
+                tokens.append((0, p.lower()))
+    return tokens
+
+def natsorted(names):
+    return sorted(names, key=natsortKey)
+
+def buildInventory(instancesInfoArray, cfg):
+    """
+    return (inventory, hostsMeta)
+    inventory: {'hosts': {host: info}, 'groups': {group: [hosts]}}, natural sorted
+    hostsMeta: {host: {'hosting': str, 'dc': str, 'tags': list}} for indexed inventory store
+    """
+    defName = "buildInventory"
+
+    hosts = dict()
+    groups = dict()    # group name -> dict used as ordered set of hosts
+    hostsMeta = dict() # hosting, dc and tags per host for indexed inventory store
+    groupNames = dict() # (plugin, tag key, tag value) -> group name, avoid rebuilding names per host
+    for instanceInfo in instancesInfoArray:
+        # hosts {{
+        try:
+            host = instanceInfo['host']
+        except:
+            print(instanceInfo)
+            logger.error(f"{defName}: key='host' not found in instanceInfo='{instanceInfo}'")
+            exit(1)
+
+        # get rsh inventory module name {{
+        rshInventoryModule = instanceInfo.get('rshInventoryModule', None)
+        pluginCfg = cfg[rshInventoryModule]
+
+        # generage "hosts" for instance
+        if host not in hosts:
+            hosts[host] = { 'sshHost': instanceInfo['sshHost'] }
+            for hostInfoField in pluginCfg['hostInfoFields']:
+                hosts[host][hostInfoField] = instanceInfo[hostInfoField]
+            hostsMeta[host] = {
+                'hosting': instanceInfo.get('hosting', 'unknown'),
+                'dc': instanceInfo['dc'],
+                'tags': instanceInfo['tags'],
+            }
+        # }}
+        # groups {{
+        for tag in instanceInfo['tags']:
+            groupKey = (rshInventoryModule, tag['Key'], tag['Value'])
+            groupName = groupNames.get(groupKey)
+            if groupName is None:
+                if tag['Key'] in pluginCfg['skipTagsForMakeGroups']:
+                    groupName = groupNames[groupKey] = ''
+                else:
+                    groupName = 'tag_' + tag['Key'].replace('-','_') + '_' + tag['Value'].replace('-','_')
+                    groupName = groupNames[groupKey] = spacesRegex.sub('_', groupName)
+            if not groupName:
+                continue
+            groups.setdefault(groupName, dict())[host] = None
+        # }}
+        # groups by dc {{
+        hosting = instanceInfo.get('hosting', 'unknown')
+        groupName = 'dc_' + hosting +'_'+ instanceInfo['dc']
+        groupName = spacesRegex.sub('_', groupName)
+        groups.setdefault(groupName, dict())[host] = None
+        # }}
+
+    # natural sort hosts and groups {{
+    # hosts: sort hostnames using token-aware natural order, key computed once per host
+    sortedHostnames = natsorted(hosts)
+    hostRank = { hn: rank for rank, hn in enumerate(sortedHostnames) }
+
+    # groups: sort group names; inside each group sort hosts by their rank
+    inventory = dict()
+    inventory['hosts'] = { hn: hosts[hn] for hn in sortedHostnames }
+    inventory['groups'] = { g: sorted(groups[g], key=hostRank.__getitem__) for g in natsorted(groups) }
+    # }}
+    return inventory, hostsMeta
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# on-disk cache of inventory plugins instancesInfo() results,
+# one json file per plugin: <cacheDir>/<plugin>.instances.json
+
+import os
+import json
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def cacheFilePath(cfg, pluginName):
+    return os.path.join(os.path.expanduser(cfg['cacheDir']), f"{pluginName}.instances.json")
+
+
+def loadInstancesInfo(cfg, pluginName):
+    """
+    return (fetchedAt, instancesInfo) from cache or (None, None) if cache missing or broken
+    """
+    defName = "loadInstancesInfo"
+    try:
+        with open(cacheFilePath(cfg, pluginName), 'r') as f:
+            cache = json.load(f)
+        return cache['fetchedAt'], cache['instancesInfo']
+    except FileNotFoundError:
+        return None, None
+    except Exception as e:
+        logger.warning(f"{defName}: ignoring broken cache for plugin='{pluginName}', error: '{e}'")
+        return None, None
+
+
+def saveInstancesInfo(cfg, pluginName, instancesInfo):
+    filePath = cacheFilePath(cfg, pluginName)
+    os.makedirs(os.path.dirname(filePath), exist_ok=True)
+    tmpFilePath = f"{filePath}.{os.getpid()}.tmp"
+    with open(tmpFilePath, 'w') as f:
+        json.dump({'fetchedAt': time.time(), 'instancesInfo': instancesInfo}, f)
+    os.replace(tmpFilePath, filePath)
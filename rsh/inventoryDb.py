@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# indexed single-file inventory store (sqlite), written by rshInventory.py
+# next to the yaml inventory and used for point lookups by host, group,
+# tag key/value, hosting and dc without parsing the whole inventory
+
+import os
+import json
+import sqlite3
+
+schema = """
+CREATE TABLE meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+) WITHOUT ROWID;
+CREATE TABLE hosts (
+    host TEXT PRIMARY KEY,
+    pos INTEGER NOT NULL,
+    sshHost TEXT,
+    hosting TEXT,
+    dc TEXT,
+    info TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX hosts_hosting ON hosts (hosting, pos);
+CREATE INDEX hosts_dc ON hosts (dc, pos);
+CREATE TABLE groups (
+    groupName TEXT NOT NULL,
+    pos INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    PRIMARY KEY (groupName, pos)
+) WITHOUT ROWID;
+CREATE TABLE tags (
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    host TEXT NOT NULL,
+    PRIMARY KEY (key, value, host)
+) WITHOUT ROWID;
+"""
+schemaVersion = '1'
+
+
+def writeInventoryDb(dbFilePath, inventory, hostsMeta):
+    """
+    write inventory into sqlite file atomically
+    inventory: {'hosts': {host: info}, 'groups': {group: [hosts]}} in output order
+    hostsMeta: {host: {'hosting': str, 'dc': str, 'tags': [{'Key': k, 'Value': v}]}}
+    """
+    dbDir = os.path.dirname(dbFilePath)
+    if dbDir:
+        os.makedirs(dbDir, exist_ok=True)
+    tmpFilePath = f"{dbFilePath}.{os.getpid()}.tmp"
+    if os.path.exists(tmpFilePath):
+        os.remove(tmpFilePath)
+
+    db = sqlite3.connect(tmpFilePath)
+    try:
+        db.execute('PRAGMA journal_mode = OFF')
+        db.execute('PRAGMA synchronous = OFF')
+        db.executescript(schema)
+        with db:
+            db.execute('INSERT INTO meta VALUES (?, ?)', ('schemaVersion', schemaVersion))
+            db.executemany(
+                'INSERT INTO hosts VALUES (?, ?, ?, ?, ?, ?)',
+                (
+                    (
+                        host,
+                        pos,
+                        info.get('sshHost'),
+                        hostsMeta.get(host, {}).get('hosting'),
+                        hostsMeta.get(host, {}).get('dc'),
+                        json.dumps(info),
+                    )
+                    for pos, (host, info) in enumerate(inventory['hosts'].items())
+                ),
+            )
+            db.executemany(
+                'INSERT INTO groups VALUES (?, ?, ?)',
+                (
+                    (groupName, pos, host)
+                    for groupName, hosts in inventory['groups'].items()
+                    for pos, host in enumerate(hosts)
+                ),
+            )
+            db.executemany(
+                'INSERT OR IGNORE INTO tags VALUES (?, ?, ?)',
+                (
+                    (tag['Key'], tag['Value'], host)
+                    for host, meta in hostsMeta.items()
+                    for tag in meta.get('tags', [])
+                ),
+            )
+    finally:
+        db.close()
+    os.replace(tmpFilePath, dbFilePath)
+
+
+def openInventoryDb(cfg):
+    """
+    return InventoryDb if the store is enabled and not older than the yaml inventory, else None
+    """
+    if not cfg['inventoryDb']['enable']:
+        return None
+    dbFilePath = os.path.expanduser(cfg['inventoryDb']['filePath'])
+    inventoryFilePath = os.path.expanduser(cfg['inventoryFilePath'])
+    try:
+        dbMtime = os.stat(dbFilePath).st_mtime_ns
+    except OSError:
+        return None
+    try:
+        if os.stat(inventoryFilePath).st_mtime_ns > dbMtime:
+            # yaml was regenerated without the store, don't trust it
+            return None
+    except OSError:
+        pass
+    return InventoryDb(dbFilePath)
+
+
+class InventoryDb():
+    def __init__(self, dbFilePath):
+        self.dbFilePath = dbFilePath
+        self.db = sqlite3.connect(f"file:{dbFilePath}?mode=ro", uri=True)
+
+    def close(self):
+        self.db.close()
+
+    def _column(self, query, params):
+        return [row[0] for row in self.db.execute(query, params)]
+
+    def hostInfo(self, host):
+        """
+        return inventory info for host (same as inventory['hosts'][host]) or None
+        """
+        row = self.db.execute('SELECT info FROM hosts WHERE host = ?', (host,)).fetchone()
+        if row is None:
+            return None
+        return json.loads(row[0])
+
+    def sshHost(self, host):
+        """
+        return sshHost for host or None if host not found
+        """
+        row = self.db.execute('SELECT sshHost FROM hosts WHERE host = ?', (host,)).fetchone()
+        if row is None:
+            return None
+        return row[0]
+
+    def selectHosts(self, hosts):
+        """
+        return (host, pos, sshHost) of those of hosts that are in the inventory
+        """
+        hosts = list(hosts)
+        rows = []
+        for i in range(0, len(hosts), 500):    # stay under the sqlite host parameter limit
+            chunk = hosts[i:i + 500]
+            rows.extend(self.db.execute(
+                f"SELECT host, pos, sshHost FROM hosts WHERE host IN ({', '.join('?' * len(chunk))})",
+                chunk,
+            ))
+        return rows
+
+    def allHosts(self):
+        """
+        return (host, sshHost) of all hosts in inventory order
+        """
+        return self.db.execute('SELECT host, sshHost FROM hosts ORDER BY pos').fetchall()
+
+    def groupHosts(self, groupName):
+        """
+        return hosts of group in inventory order
+        """
+        return self._column('SELECT host FROM groups WHERE groupName = ? ORDER BY pos', (groupName,))
+
+    def tagHosts(self, key, value):
+        """
+        return hosts with tag key=value in inventory order
+        """
+        return self._column(
+            'SELECT t.host FROM tags t JOIN hosts h ON h.host = t.host WHERE t.key = ? AND t.value = ? ORDER BY h.pos',
+            (key, value),
+        )
+
+    def hostingHosts(self, hosting):
+        return self._column('SELECT host FROM hosts WHERE hosting = ? ORDER BY pos', (hosting,))
+
+    def dcHosts(self, dc):
+        return self._column('SELECT host FROM hosts WHERE dc = ? ORDER BY pos', (dc,))
+
+    def groupMembers(self, prefix):
+        """
+        return (groupName, host) pairs of all groups whose name starts with prefix (case sensitive
+        like str.startswith, LIKE isn't), as a range scan over the primary key
+        """
+        if not prefix:
+            return self.db.execute('SELECT groupName, host FROM groups ORDER BY groupName, pos').fetchall()
+        last = ord(prefix[-1])
+        if last in (0xd7ff, 0x10ffff):
+            # no next code point encodable as utf-8, compare the prefix instead
+            return self.db.execute(
+                'SELECT groupName, host FROM groups WHERE substr(groupName, 1, ?) = ? ORDER BY groupName, pos',
+                (len(prefix), prefix),
+            ).fetchall()
+        # text compares as utf-8 bytes, which sort like code points
+        return self.db.execute(
+            'SELECT groupName, host FROM groups WHERE groupName >= ? AND groupName < ? ORDER BY groupName, pos',
+            (prefix, prefix[:-1] + chr(last + 1)),
+        ).fetchall()
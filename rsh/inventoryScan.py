@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# point lookup of one host in the yaml inventory without parsing all of it:
+# rshInventory.py writes block style yaml (two space indent, hosts section
+# first), so the host's block is found with a plain text search and only its
+# few lines go through the yaml parser. scanInventory() reads all host blocks
+# and group members the same way. Files in any other layout raise
+# UnsupportedLayout and the caller falls back to a full parse.
+
+import re
+import yaml
+
+topLevelRegex = re.compile(r'^\S', re.MULTILINE)
+hostLevelRegex = re.compile(r'^ {0,2}\S', re.MULTILINE)
+hostLineRegex = re.compile(r' {2}\S[^\n]*:(?: |\n)')
+
+
+class UnsupportedLayout(ValueError):
+    pass
+
+
+def _hostKey(host):
+    """yaml key line prefix for host as yaml.dump writes it, e.g. 'web1:'"""
+    dumped = yaml.dump({host: None}, default_flow_style=False)
+    if not dumped.endswith(': null\n') or '\n' in dumped[:-1]:
+        raise UnsupportedLayout(f"host '{host}' is not a plain yaml key")
+    return dumped[:-len(' null\n')]
+
+
+def scanHostInfo(inventoryFilePath, host):
+    """
+    return inventory info of host (same as inventory['hosts'][host]) or None if not found,
+    raise UnsupportedLayout if the file doesn't look like rshInventory.py output
+    """
+    with open(inventoryFilePath, 'r') as f:
+        text = f.read()
+
+    # hosts section {{
+    if text.startswith('hosts:\n'):
+        start = len('hosts:\n')
+    else:
+        pos = text.find('\nhosts:\n')
+        if pos < 0:
+            raise UnsupportedLayout("no block style 'hosts:' section")
+        start = pos + len('\nhosts:\n')
+    match = topLevelRegex.search(text, start)
+    end = match.start() if match else len(text)
+    if start < end and not hostLineRegex.match(text, start):
+        raise UnsupportedLayout("hosts are not indented by two spaces")
+    # }}
+
+    keyLine = '\n  ' + _hostKey(host)
+    pos = start - 1
+    while True:
+        pos = text.find(keyLine, pos, end)
+        if pos < 0:
+            return None
+        blockStart = pos + len(keyLine)
+        if blockStart < len(text) and text[blockStart] in ' \n':
+            break
+        pos = blockStart
+
+    match = hostLevelRegex.search(text, blockStart + 1)
+    blockEnd = min(match.start(), end) if match else end
+    hostBlock = yaml.load(text[pos + 1:blockEnd], Loader=yaml.Loader)
+    return hostBlock[host] if isinstance(hostBlock, dict) else None
+
+
+def _scalar(text):
+    """yaml scalar as yaml.dump writes host and group names, plain or quoted"""
+    if text[:1] in ('"', "'"):
+        return yaml.load(text, Loader=yaml.SafeLoader)
+    return text
+
+
+def _keyLine(line):
+    """name of a '  key:' or '  key: value' line"""
+    if line.endswith(':'):
+        return _scalar(line[2:-1])
+    pos = line.find(': ', 2)
+    if pos < 0:
+        raise UnsupportedLayout(f"unexpected line '{line}'")
+    return _scalar(line[2:pos])
+
+
+def scanInventory(text):
+    """
+    return (hosts, groups) of the whole inventory text without the yaml parser:
+    hosts: {host: its yaml block text}, for comparing host info between files
+    groups: {group: [hosts]}
+    raise UnsupportedLayout if the text doesn't look like rshInventory.py output
+    """
+    hosts = dict()
+    groups = dict()
+    section = None
+    block = None    # lines of the current host block
+    members = None  # hosts of the current group
+    for line in text.splitlines():
+        if not line:
+            continue
+        if line[0] != ' ':
+            if line not in ('hosts:', 'groups:', 'hosts: {}', 'groups: {}'):
+                raise UnsupportedLayout(f"unexpected top level line '{line}'")
+            section = line.split(':', 1)[0]
+            block = members = None
+        elif line.startswith('    ') and section == 'hosts' and block is not None:
+            block.append(line)
+        elif line.startswith('  - ') and section == 'groups' and members is not None:
+            members.append(_scalar(line[4:]))
+        elif line[2] != ' ' and section == 'hosts':
+            block = [line]
+            hosts[_keyLine(line)] = block
+        elif line[2] != ' ' and section == 'groups':
+            members = []
+            groups[_keyLine(line)] = members
+        else:
+            raise UnsupportedLayout(f"unexpected line '{line}'")
+    return {host: '\n'.join(block) for host, block in hosts.items()}, groups
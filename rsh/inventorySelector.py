@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# host selectors for sExec/pExec/pCopy: set algebra over inventory groups and
+# hosts, evaluated on bitmaps (python ints, bit i = i-th inventory host; the
+# inventory is natural sorted by rshInventory.py, so bit order is host order;
+# over the indexed store hosts are numbered as lookups return them instead)
+#
+#   prod&dc_aws_eu-central-1a&!canary   intersection and exclusion
+#   web|db                              union, same as separate arguments
+#   (web|db)&!srv7                      grouping
+#   srv1*  /^srv\d+-db/                 host name glob, host name regex (re.search)
+#   !canary                             as a separate argument: excluded from all the others
+#
+# '&' binds tighter than '|', '!' excludes inside an intersection. Names that
+# are neither a group nor an inventory host are passed through as ssh hosts.
+# The result is deduplicated and naturally sorted.
+
+import re
+import fnmatch
+from rsh.inventoryBuilder import natsorted
+
+tokenRegex = re.compile(r'\s*(?:(/(?:[^/\\]|\\.)*/)|([|&!()])|([^\s|&!()]+))')
+
+
+class SelectorError(ValueError):
+    pass
+
+
+class HostIndex:
+    """
+    Inventory hosts numbered in inventory order, per-group host bitmaps built on
+    first use and kept, so selectors over many groups cost a few big-int
+    operations instead of list scans.
+    """
+
+    def __init__(self, hosts, sshHosts, groupHosts, extraKinds=None):
+        self.hosts = hosts                  # host names, position = host id
+        self.ids = {host: i for i, host in enumerate(hosts)}
+        self.sshHosts = sshHosts            # host -> sshHost
+        self.groupHosts = groupHosts        # group name -> host names or None
+        self.extraKinds = extraKinds or {}  # selector prefix ('tag', ...) -> callable(value) -> host names
+        self.bitmaps = {}
+
+    @classmethod
+    def fromInventory(cls, inventory):
+        """index of an inventory dict as loaded from the yaml file"""
+        inventoryHosts = inventory.get('hosts') or {}
+        groups = inventory.get('groups') or {}
+        return cls(
+            list(inventoryHosts),
+            {host: (info or {}).get('sshHost', host) for host, info in inventoryHosts.items()},
+            groups.get,
+        )
+
+    @classmethod
+    def fromInventoryDb(cls, inventoryDb):
+        """index of the indexed inventory store"""
+        return StoreHostIndex(inventoryDb)
+
+    def hostId(self, host):
+        return self.ids.get(host)
+
+    def isHost(self, name):
+        return name in self.ids
+
+    def allHosts(self):
+        """all inventory host names, for regex and glob selectors"""
+        return self.hosts
+
+    def hostPairs(self, names):
+        """(name, sshHost) of inventory hosts in inventory order, names are in host id order"""
+        return [(name, self.sshHosts.get(name, name)) for name in names]
+
+    def bitmap(self, hosts):
+        ids = [i for i in map(self.hostId, hosts) if i is not None]
+        data = bytearray((len(self.hosts) + 7) // 8)
+        for i in ids:
+            data[i >> 3] |= 1 << (i & 7)
+        return int.from_bytes(data, 'little')
+
+    def matchBitmap(self, predicate):
+        return self.bitmap(host for host in self.allHosts() if predicate(host))
+
+    def names(self, bits):
+        """host names of bitmap in host id (inventory) order"""
+        digits = bin(bits)[:1:-1]   # digits[i] is bit i
+        names = []
+        i = digits.find('1')
+        while i >= 0:
+            names.append(self.hosts[i])
+            i = digits.find('1', i + 1)
+        return names
+
+    def atom(self, name):
+        """(bitmap, passed through names) for one selector name"""
+        if name.startswith('/'):
+            try:
+                regex = re.compile(name[1:-1])
+            except re.error as e:
+                raise SelectorError(f"bad host regex '{name}': {e}")
+            return self.matchBitmap(regex.search), {}
+        if '*' in name or '?' in name:
+            return self.matchBitmap(lambda host: fnmatch.fnmatchcase(host, name)), {}
+
+        bits = self.bitmaps.get(name)
+        if bits is None:
+            kind, _, value = name.partition(':')
+            hosts = self.extraKinds[kind](value) if kind in self.extraKinds else None
+            if hosts is None:
+                hosts = self.groupHosts(name)
+            if hosts is None and self.isHost(name):
+                hosts = [name]
+            if hosts is None:
+                return 0, {name: None}
+            bits = self.bitmaps[name] = self.bitmap(hosts)
+        return bits, {}
+
+
+class StoreHostIndex(HostIndex):
+    """
+    HostIndex over the indexed inventory store: groups, tags and host names are
+    point lookups and only the hosts they return get ids, the whole host list is
+    read once the first regex or glob selector needs it.
+    """
+
+    def __init__(self, inventoryDb):
+        super().__init__(
+            [],
+            {},
+            lambda groupName: inventoryDb.groupHosts(groupName) or None,
+            {
+                'tag': lambda value: inventoryDb.tagHosts(*value.split('=', 1)) if '=' in value else None,
+                'hosting': lambda value: inventoryDb.hostingHosts(value) if value else None,
+                'dc': lambda value: inventoryDb.dcHosts(value) if value else None,
+            },
+        )
+        self.inventoryDb = inventoryDb
+        self.universe = None
+
+    def hostId(self, host):
+        # only called with hosts the store returned or isHost() confirmed
+        i = self.ids.get(host)
+        if i is None:
+            i = self.ids[host] = len(self.hosts)
+            self.hosts.append(host)
+        return i
+
+    def isHost(self, name):
+        return name in self.ids or bool(self.inventoryDb.selectHosts([name]))
+
+    def allHosts(self):
+        if self.universe is None:
+            rows = self.inventoryDb.allHosts()
+            self.universe = [host for host, _ in rows]
+            self.sshHosts = {host: sshHost or host for host, sshHost in rows}
+        return self.universe
+
+    def hostPairs(self, names):
+        if self.universe is not None:
+            # already read in inventory order, no need to ask the store again
+            positions = {host: pos for pos, host in enumerate(self.universe)}
+            return [(name, self.sshHosts[name]) for name in sorted(names, key=positions.__getitem__)]
+        rows = sorted(self.inventoryDb.selectHosts(names), key=lambda row: row[1])
+        return [(host, sshHost or host) for host, _, sshHost in rows]
+
+
+# parser {{
+def tokenize(selector):
+    tokens = []
+    pos = 0
+    selector = selector.strip()
+    while pos < len(selector):
+        match = tokenRegex.match(selector, pos)
+        if not match or match.end() == pos:
+            raise SelectorError(f"can't parse selector '{selector}' at position {pos}")
+        tokens.append(match.group(1) or match.group(2) or match.group(3))
+        pos = match.end()
+    return tokens
+
+
+def parse(selector):
+    """
+    parse selector into a tree:
+    ('|', [intersection, ...]), intersection: ('&', [(negated, node), ...]), node: name or tree
+    """
+    tokens = tokenize(selector)
+    pos = 0
+
+    def peek():
+        return tokens[pos] if pos < len(tokens) else None
+
+    def union():
+        nonlocal pos
+        items = [intersection()]
+        while peek() == '|':
+            pos += 1
+            items.append(intersection())
+        return ('|', items)
+
+    def intersection():
+        nonlocal pos
+        terms = [unary()]
+        while peek() == '&':
+            pos += 1
+            terms.append(unary())
+        return ('&', terms)
+
+    def unary():
+        nonlocal pos
+        negated = False
+        while peek() == '!':
+            pos += 1
+            negated = not negated
+        token = peek()
+        if token is None or token in '|&)':
+            raise SelectorError(f"missing host, group or pattern in selector '{selector}'")
+        pos += 1
+        if token == '(':
+            node = union()
+            if peek() != ')':
+                raise SelectorError(f"missing ')' in selector '{selector}'")
+            pos += 1
+            return negated, node
+        return negated, token
+
+    if not tokens:
+        raise SelectorError("empty selector")
+    tree = union()
+    if pos != len(tokens):
+        raise SelectorError(f"unexpected '{tokens[pos]}' in selector '{selector}'")
+    return tree
+# }}
+
+
+# evaluation, values are (bitmap, passed through names as ordered set) {{
+def _evaluate(index, node):
+    if isinstance(node, str):
+        return index.atom(node)
+    op, items = node
+    if op == '|':
+        bits, extras = 0, {}
+        for item in items:
+            itemBits, itemExtras = _evaluate(index, item)
+            bits |= itemBits
+            extras.update(itemExtras)
+        return bits, extras
+
+    included = [item for negated, item in items if not negated]
+    if not included:
+        raise SelectorError("a selector can't consist of exclusions only")
+    bits, extras = _evaluate(index, included[0])
+    for item in included[1:]:
+        itemBits, itemExtras = _evaluate(index, item)
+        bits &= itemBits
+        extras = {name: None for name in extras if name in itemExtras}
+    for item in (item for negated, item in items if negated):
+        itemBits, itemExtras = _evaluate(index, item)
+        bits &= ~itemBits
+        extras = {name: None for name in extras if name not in itemExtras}
+    return bits, extras
+
+
+def resolve(selectors, index):
+    """
+    return deduplicated (inventory host name, sshHost) pairs for selectors
+    (the items of the command line, a union), arguments starting with '!'
+    are excluded from the union of the others
+    """
+    included = []   # intersections of all arguments, united
+    excluded = []   # (True, node) of '!x' arguments
+    for selector in selectors:
+        tree = parse(selector)
+        intersections = tree[1]
+        if len(intersections) == 1 and all(negated for negated, _ in intersections[0][1]):
+            excluded.extend(intersections[0][1])
+        else:
+            included.extend(intersections)
+    if not included:
+        raise SelectorError("selectors only exclude hosts, nothing to run on")
+    bits, extras = _evaluate(index, ('&', [(False, ('|', included))] + excluded))
+    return index.hostPairs(index.names(bits)) + [(name, name) for name in natsorted(extras)]
+# }}
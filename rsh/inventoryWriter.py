@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# inventoryWriter.py
+#
+# yaml inventory writes that readers (sExec, pExec, sr, completion) never see
+# half done: the text goes to a temp file next to inventoryFilePath, is
+# fsynced and renamed over it. A refresh that produced the same text (sha256)
+# leaves the file alone, so its mtime based caches stay valid; otherwise the
+# change is summarized as added/removed/changed hosts and group membership.
+
+import os
+import json
+import time
+import hashlib
+import logging
+import yaml
+from rsh import inventoryScan
+
+logger = logging.getLogger(__name__)
+
+# libyaml writes the same text several times faster than the python dumper
+Dumper = getattr(yaml, 'CDumper', yaml.Dumper)
+Loader = getattr(yaml, 'CLoader', yaml.Loader)
+
+
+def dumpInventory(inventory):
+    return yaml.dump(inventory, Dumper=Dumper, default_flow_style=False, sort_keys=False)
+
+
+def contentHash(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def writeAtomic(filePath, text):
+    """
+    replace filePath with text: write a temp file in the same dir, fsync,
+    rename over filePath and fsync the dir; the file mode is kept
+    """
+    dirPath = os.path.dirname(filePath) or '.'
+    os.makedirs(dirPath, exist_ok=True)
+    tmpFilePath = f"{filePath}.{os.getpid()}.tmp"
+    try:
+        with open(tmpFilePath, 'w') as f:
+            try:
+                os.fchmod(f.fileno(), os.stat(filePath).st_mode & 0o7777)
+            except FileNotFoundError:
+                pass
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmpFilePath, filePath)
+    except BaseException:
+        try:
+            os.remove(tmpFilePath)
+        except OSError:
+            pass
+        raise
+    dirFd = os.open(dirPath, os.O_RDONLY)
+    try:
+        os.fsync(dirFd)
+    finally:
+        os.close(dirFd)
+
+
+def inventoryDiff(oldText, newText, newInventory):
+    """
+    {'addedHosts', 'removedHosts', 'changedHosts' (host info differs),
+     'addedGroups', 'removedGroups', 'groups': {group: {'added', 'removed'}}}
+    between the previous inventory text (None - no file) and the new one,
+    groups lists only groups present in both files with changed membership
+    """
+    defName = "inventoryDiff"
+    try:
+        oldHosts, oldGroups = inventoryScan.scanInventory(oldText or '')
+        newHosts, newGroups = inventoryScan.scanInventory(newText)
+    except inventoryScan.UnsupportedLayout as e:
+        logger.debug(f"{defName}: previous inventory is not in rshInventory.py layout ({e}), parsing it")
+        old = yaml.load(oldText, Loader=Loader) or {}
+        oldHosts, oldGroups = old.get('hosts') or {}, old.get('groups') or {}
+        newHosts, newGroups = newInventory['hosts'], newInventory['groups']
+
+    groups = dict()
+    for group, hosts in newGroups.items():
+        if group not in oldGroups:
+            continue
+        oldMembers, newMembers = set(oldGroups[group] or []), set(hosts or [])
+        if oldMembers != newMembers:
+            groups[group] = {
+                'added': [host for host in hosts if host not in oldMembers],
+                'removed': [host for host in oldGroups[group] if host not in newMembers],
+            }
+    return {
+        'addedHosts': [host for host in newHosts if host not in oldHosts],
+        'removedHosts': [host for host in oldHosts if host not in newHosts],
+        'changedHosts': [host for host in newHosts if host in oldHosts and newHosts[host] != oldHosts[host]],
+        'addedGroups': [group for group in newGroups if group not in oldGroups],
+        'removedGroups': [group for group in oldGroups if group not in newGroups],
+        'groups': groups,
+    }
+
+
+def diffSummary(diff):
+    return (
+        f"hosts +{len(diff['addedHosts'])} -{len(diff['removedHosts'])} ~{len(diff['changedHosts'])}, "
+        f"groups +{len(diff['addedGroups'])} -{len(diff['removedGroups'])} ~{len(diff['groups'])}"
+    )
+
+
+def writeInventory(inventoryFilePath, inventory):
+    """
+    write inventory yaml atomically unless the content is unchanged,
+    return (sha256 of the content, diff against the previous file or None if unchanged)
+    """
+    newText = dumpInventory(inventory)
+    newHash = contentHash(newText)
+    try:
+        with open(inventoryFilePath, 'r') as f:
+            oldText = f.read()
+    except FileNotFoundError:
+        oldText = None
+    oldHash = contentHash(oldText) if oldText is not None else None
+    if newHash == oldHash:
+        return newHash, None
+
+    writeAtomic(inventoryFilePath, newText)
+    diff = {'time': time.time(), 'oldHash': oldHash, 'newHash': newHash}
+    diff.update(inventoryDiff(oldText, newText, inventory))
+    return newHash, diff
+
+
+def writeDiff(diffFilePath, diff):
+    writeAtomic(diffFilePath, json.dumps(diff) + '\n')
@@ -9,8 +9,10 @@ import inspect
 import re
 import os
 import yaml
+import time
 import ovh
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 class ovhInventory():
     def __init__(self, cfg):
@@ -38,37 +40,35 @@ class ovhInventory():
 
         defName = inspect.stack()[0][3]
 
-        client = ovh.Client(
-            endpoint=self.cfg['ovhInventory']['api']['endpoint'],
-            application_key=self.cfg['ovhInventory']['api']['application_key'],
-            application_secret=self.cfg['ovhInventory']['api']['application_secret'],
-            consumer_key=self.cfg['ovhInventory']['api']['consumer_key'],
-        )
+        client = self.apiClient()
+        dedicatedServers = self.apiGet(client, '/dedicated/server')
 
-        dedicatedServers = client.get('/dedicated/server')
+        # per-server details, cached between runs {{
+        detailsCache = self.loadDetailsCache()
+        now = time.time()
+        ttl = self.cfg['ovhInventory']['detailsCacheTtl']
+        staleServers = [
+            dedicatedServer for dedicatedServer in dedicatedServers
+            if now - detailsCache.get(dedicatedServer, {}).get('fetchedAt', 0) >= ttl
+        ]
+        self.logger.debug(f"{defName}: servers={len(dedicatedServers)}, fetching details for {len(staleServers)}")
+        with ThreadPoolExecutor(max_workers=self.cfg['ovhInventory']['maxWorkers']) as executor:
+            for dedicatedServer, infoMap in zip(staleServers, executor.map(lambda x: self.serverInfoMap(client, x), staleServers)):
+                detailsCache[dedicatedServer] = {
+                    'fetchedAt': now,
+                    'infoMap': infoMap,
+                }
+        detailsCache = { dedicatedServer: detailsCache[dedicatedServer] for dedicatedServer in dedicatedServers }
+        self.saveDetailsCache(detailsCache)
+        # }}
 
         instancesInfo = list()
         for dedicatedServer in dedicatedServers:
             info = dict()
-            dedicatedServerServiceInfos = client.get(f'/dedicated/server/{dedicatedServer}/serviceInfos')
-            servicesInfo = client.get('/services/%s' % dedicatedServerServiceInfos['serviceId'])
-            self.logger.debug("%s: servicesInfo='%s'" % (defName, json.dumps(servicesInfo,indent=4)))
-            dedicatedServerInfo = client.get(f'/dedicated/server/{dedicatedServer}')
-            self.logger.debug("%s: dedicatedServerInfo='%s'" % (defName, json.dumps(dedicatedServerInfo,indent=4)))
-            if dedicatedServerInfo['availabilityZone'] == 'unknown':
-                dc = dedicatedServerInfo['datacenter']
-            else:
-                dc = dedicatedServerInfo['availabilityZone']
-            infoMap = {
-                'customName': servicesInfo['resource']['displayName'],
-                'publicIp': dedicatedServerInfo['ip'],
-                'internalName': dedicatedServerInfo['name'],
-                'dc': dc,
-            }
+            infoMap = detailsCache[dedicatedServer]['infoMap']
             for hostInfoField in self.cfg['ovhInventory']['hostInfoFields']:
                 info[hostInfoField] = infoMap.get(hostInfoField, 'unknown')
-            if info not in instancesInfo:
-                instancesInfo.append(info)
+            instancesInfo.append(info)
 
             # ovh don't have tags
             info['tags'] = []
@@ -83,3 +83,84 @@ class ovhInventory():
             info['sshHost'] = info.get(self.cfg['ovhInventory']['sshHostField'], 'unknown')
 
         return instancesInfo
+
+    def apiClient(self):
+        """
+        return ovh.Client shared between worker threads, its requests session
+        keeps up to 10 pooled connections (requests default)
+        """
+        client = ovh.Client(
+            endpoint=self.cfg['ovhInventory']['api']['endpoint'],
+            application_key=self.cfg['ovhInventory']['api']['application_key'],
+            application_secret=self.cfg['ovhInventory']['api']['application_secret'],
+            consumer_key=self.cfg['ovhInventory']['api']['consumer_key'],
+        )
+        # resolve lazy signature time delta once, before worker threads start
+        client.time_delta
+        return client
+
+    def apiGet(self, client, path):
+        """
+        client.get with backoff on 429 (too many requests) responses
+        """
+        defName = inspect.stack()[0][3]
+
+        maxRetries = self.cfg['ovhInventory']['maxRetries']
+        for attempt in range(maxRetries + 1):
+            try:
+                return client.get(path)
+            except ovh.exceptions.APIError as e:
+                if e.response is None or e.response.status_code != 429 or attempt == maxRetries:
+                    raise
+                try:
+                    delay = float(e.response.headers.get('Retry-After'))
+                except (TypeError, ValueError):
+                    delay = self.cfg['ovhInventory']['retryBackoff'] * 2 ** attempt
+                self.logger.warning(f"{defName}: rate limited on path='{path}', retry in {delay}s")
+                time.sleep(delay)
+
+    def serverInfoMap(self, client, dedicatedServer):
+        """
+        return displayName, ip, name and dc of one dedicated server
+        """
+        defName = inspect.stack()[0][3]
+
+        dedicatedServerServiceInfos = self.apiGet(client, f'/dedicated/server/{dedicatedServer}/serviceInfos')
+        servicesInfo = self.apiGet(client, '/services/%s' % dedicatedServerServiceInfos['serviceId'])
+        self.logger.debug("%s: servicesInfo='%s'", defName, rsh.config.LazyJson(servicesInfo))
+        dedicatedServerInfo = self.apiGet(client, f'/dedicated/server/{dedicatedServer}')
+        self.logger.debug("%s: dedicatedServerInfo='%s'", defName, rsh.config.LazyJson(dedicatedServerInfo))
+        if dedicatedServerInfo['availabilityZone'] == 'unknown':
+            dc = dedicatedServerInfo['datacenter']
+        else:
+            dc = dedicatedServerInfo['availabilityZone']
+        return {
+            'customName': servicesInfo['resource']['displayName'],
+            'publicIp': dedicatedServerInfo['ip'],
+            'internalName': dedicatedServerInfo['name'],
+            'dc': dc,
+        }
+
+    def loadDetailsCache(self):
+        defName = inspect.stack()[0][3]
+
+        if self.cfg['ovhInventory']['detailsCacheTtl'] <= 0:
+            return dict()
+        try:
+            with open(os.path.expanduser(self.cfg['ovhInventory']['detailsCacheFile']), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return dict()
+        except Exception as e:
+            self.logger.warning(f"{defName}: ignoring broken details cache, error: '{e}'")
+            return dict()
+
+    def saveDetailsCache(self, detailsCache):
+        if self.cfg['ovhInventory']['detailsCacheTtl'] <= 0:
+            return
+        cacheFilePath = os.path.expanduser(self.cfg['ovhInventory']['detailsCacheFile'])
+        os.makedirs(os.path.dirname(cacheFilePath), exist_ok=True)
+        tmpFilePath = f"{cacheFilePath}.{os.getpid()}.tmp"
+        with open(tmpFilePath, 'w') as f:
+            json.dump(detailsCache, f)
+        os.replace(tmpFilePath, cacheFilePath)
@@ -0,0 +1,138 @@
+# ssh_mux.py
+#
+# persistent ssh connections shared by sExec, pExec and sr: OpenSSH ControlMaster
+# sockets in sshMux.controlDir, kept alive for sshMux.controlPersist seconds of
+# idle time, so back-to-back invocations against warm hosts skip tcp connect,
+# key exchange and auth entirely.
+# With sshMux enabled sExec/pExec run commands through the ssh client instead of
+# paramiko (paramiko can't attach to a ControlMaster socket).
+
+import os
+import time
+import shlex
+import hashlib
+import subprocess
+import rsh.config
+from rsh.exec_functions import ConnectError, HostResult, HostTimeout, split_host
+
+SUDO_PROMPT = '[sudo] password: '
+
+
+def enabled():
+    return bool(rsh.config.cfg['sshMux']['enable'])
+
+
+def control_path(host):
+    """Control socket path for host, hashed to stay below the unix socket path limit."""
+    control_dir = os.path.expanduser(rsh.config.cfg['sshMux']['controlDir'])
+    os.makedirs(control_dir, mode=0o700, exist_ok=True)
+    return os.path.join(control_dir, hashlib.sha1(host.encode()).hexdigest()[:20])
+
+
+def mux_options(host):
+    """ssh options attaching to (or creating) the shared master connection of host."""
+    return [
+        '-o', 'ControlMaster=auto',
+        '-o', f"ControlPath={control_path(host)}",
+        '-o', f"ControlPersist={rsh.config.cfg['sshMux']['controlPersist']}",
+    ]
+
+
+def ssh_argv(host, options=(), command=None):
+    """ssh client argv for host ('user@host:port' like fabric) with mux options."""
+    user, hostname, port = split_host(host)
+    argv = shlex.split(rsh.config.cfg['sshMux']['sshCommand']) + mux_options(host)
+    if port:
+        argv += ['-p', str(port)]
+    argv += list(options)
+    argv.append(f"{user}@{hostname}" if user else hostname)
+    if command is not None:
+        argv.append(command)
+    return argv
+
+
+def master_argv(host):
+    """ssh argv starting the background master connection of host."""
+    return ssh_argv(host, ['-o', 'ControlMaster=yes', '-N', '-f'])
+
+
+def master_result(host, returncode, stderr):
+    """Log a failed master start, the command falls back to ControlMaster=auto."""
+    if returncode != 0:
+        rsh.config.logging.debug(f"[{host}] failed to start ssh master: {stderr.decode(errors='replace').strip()}")
+
+
+def ensure_master(host, timeout=None):
+    """
+    Start the background master connection for host unless its socket exists.
+    Returns seconds spent connecting (0.0 for a warm host). A failure here is not
+    fatal: the command itself falls back to ControlMaster=auto and reports it.
+    Taking longer than `timeout` seconds is raised as HostTimeout.
+    """
+    if os.path.exists(control_path(host)):
+        return 0.0
+    start = time.monotonic()
+    try:
+        process = subprocess.run(
+            master_argv(host), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, timeout=timeout or None,
+        )
+    except subprocess.TimeoutExpired:
+        raise HostTimeout('connect', timeout, timings={'connect': time.monotonic() - start}) from None
+    master_result(host, process.returncode, process.stderr)
+    return time.monotonic() - start
+
+
+def sudo_command(command):
+    return f"sudo -S -p '{SUDO_PROMPT}' {command}"
+
+
+def command_argv(host, command):
+    """ssh argv running `command` with sudo on host over its shared connection."""
+    return ssh_argv(host, ['-tt'], sudo_command(command))
+
+
+def command_result(returncode, stdout, stderr):
+    """HostResult of a finished ssh client; exit status 255 is raised as ConnectError."""
+    stdout = stdout.decode(errors='replace')
+    stderr = stderr.decode(errors='replace')
+    if returncode == 255:
+        raise ConnectError(stderr.strip() or 'ssh connection failed')
+    return HostResult(stdout, stderr, returncode)
+
+
+def run_host(host, command, connect_timeout=None, command_timeout=None):
+    """
+    Run `command` with sudo on one host over its shared connection, output captured.
+    Returns (HostResult, timings) like exec_functions._run_host; connection failures
+    (ssh exit status 255) are raised as ConnectError, exceeded timeouts as HostTimeout.
+    """
+    timings = {'connect': ensure_master(host, timeout=connect_timeout)}
+    start = time.monotonic()
+    try:
+        process = subprocess.run(
+            command_argv(host, command),
+            stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, timeout=command_timeout or None,
+        )
+    except subprocess.TimeoutExpired:
+        timings['command'] = time.monotonic() - start
+        raise HostTimeout('command', command_timeout, timings=timings) from None
+    timings['command'] = time.monotonic() - start
+    return command_result(process.returncode, process.stdout, process.stderr), timings
+
+
+def run_host_interactive(host, command, connect_timeout=None, command_timeout=None):
+    """
+    Run `command` with sudo on one host over its shared connection, output streamed
+    to the terminal (sExec). Returns the exit status; 255 is raised as ConnectError,
+    exceeded timeouts as HostTimeout.
+    """
+    ensure_master(host, timeout=connect_timeout)
+    try:
+        return_code = subprocess.run(
+            command_argv(host, command), timeout=command_timeout or None,
+        ).returncode
+    except subprocess.TimeoutExpired as e:
+        raise HostTimeout('command', command_timeout) from e
+    if return_code == 255:
+        raise ConnectError('ssh connection failed')
+    return return_code
@@ -4,26 +4,41 @@
 import sys
 sys.path.append('/opt/rsh')
 import rsh.config
-import yaml
-import json
 import os
 
-from rsh import exec_functions
+from rsh import compgen
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         rsh.config.logging.error("An argument is required ('hosts' or 'groups').")
         sys.exit(1)
 
-    inventory = exec_functions.load_inventory()
-
     arg = sys.argv[1]
-    if arg == "hosts":
-        hosts = list(inventory['hosts'].keys())
-        print(' '.join(hosts))
-    elif arg == "groups":
-        groups = list(inventory['groups'].keys())
-        print(' '.join(groups))
-    else:
+    prefix = sys.argv[2] if len(sys.argv) > 2 else ''
+    if arg not in compgen.indexSections:
         rsh.config.logging.error(f"Unsupported argument '{arg}'. Only 'hosts' or 'groups' are allowed.")
         sys.exit(1)
+
+    inventoryFilePath = os.path.expanduser(rsh.config.cfg['inventoryFilePath'])
+    indexFilePath = os.path.expanduser(rsh.config.cfg['compgenIndexFilePath'])
+    try:
+        key = compgen.inventoryKey(inventoryFilePath)
+    except OSError as e:
+        rsh.config.logging.error(f"Failed to load inventory: {e}")
+        sys.exit(1)
+
+    # fast path: prebuilt index matching current inventory {{
+    index = compgen.readIndex(indexFilePath, key)
+    # }}
+    # slow path: parse inventory and rebuild index for next call {{
+    if index is None:
+        from rsh import exec_functions
+        inventory = exec_functions.load_inventory(allow_db=False)
+        index = {section: sorted(inventory.get(section) or {}) for section in compgen.indexSections}
+        try:
+            compgen.writeIndex(indexFilePath, inventory, key)
+        except OSError as e:
+            rsh.config.logging.warning(f"Failed to write completion index '{indexFilePath}': {e}")
+    # }}
+
+    print(' '.join(compgen.prefixMatch(index[arg], prefix)))
@@ -1,9 +1,17 @@
 _rsh_completion_hosts(){
-    COMPREPLY=( $(compgen -W "$(rshCompgen.py hosts)" -- "$2") )
+    COMPREPLY=( $(compgen -W "$(rshCompgen.py hosts "$2")" -- "$2") )
 }
 _rsh_completion_groups(){
-    COMPREPLY=( $(compgen -W "$(rshCompgen.py groups)" -- "$2") )
+    COMPREPLY=( $(compgen -W "$(rshCompgen.py groups "$2")" -- "$2") )
+}
+_rsh_completion_copy(){
+    if [ "$COMP_CWORD" -eq 1 ]; then
+        COMPREPLY=( $(compgen -W "$(rshCompgen.py groups "$2")" -- "$2") )
+    else
+        COMPREPLY=( $(compgen -f -- "$2") )
+    fi
 }
 complete -F _rsh_completion_hosts sr
 complete -F _rsh_completion_groups sExec
 complete -F _rsh_completion_groups pExec
+complete -o filenames -F _rsh_completion_copy pCopy
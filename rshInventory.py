@@ -5,38 +5,51 @@ import sys
 sys.path.append('/opt/rsh')
 import rsh
 import rsh.config
-import logging
+import rsh.compgen
+import rsh.inventoryDb
+import rsh.inventoryCache
+import rsh.inventoryBuilder
+import rsh.inventoryWriter
+import argparse
 import json
+import time
+import logging
 import inspect
 import re
 import os
-import yaml
-import ovh
 
 logger = logging.getLogger(__name__)
 
-# natural sort helper:
-# - split by non-alphanumeric
-# - then split into alpha vs digits
-# - compare strings before numbers; numbers as integers
-def _natsort_tokens_key(host):
-    left = str(host).split('.', 1)[0]  # strip domain part like ".aws"
-    rough_tokens = re.split(r'[^A-Za-z0-9]+', left)
-    tokens = []
-    for t in rough_tokens:
-        if not t:
-            continue
-        parts = re.findall(r'[A-Za-z]+|\d+', t)
-        for p in parts:
-            if p.isdigit():
-                tokens.append((1, int(p)))
-            else:
-                tokens.append((0, p.lower()))
-    return tokens
-
 if __name__ == "__main__":
     defName = "main"
-    logger.debug("%s: cfg='%s'" % (defName,json.dumps(rsh.config.cfg,indent=4)))
+
+    # parse args {{
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--refresh',
+        default = '',
+        help = "comma separated providers to re-query regardless of cache ttl, e.g. 'aws,gce' or 'all'",
+    )
+    parser.add_argument(
+        '--diff',
+        action = 'store_true',
+        help = "print the json diff (added/removed hosts, changed group membership) when the inventory changed",
+    )
+    args = parser.parse_args()
+    refreshProviders = set(p.strip() for p in args.refresh.split(',') if p.strip())
+    # }}
+
+    # warn about --refresh names that match no enabled plugin {{
+    enabledPlugins = [
+        key for key, value in rsh.config.cfg.items()
+        if re.match(r"^.+Inventory$", key) and isinstance(value, dict) and value.get('enable', None)
+    ]
+    knownNames = {'all'} | set(enabledPlugins) | {re.sub(r"Inventory$", "", key) for key in enabledPlugins}
+    for name in sorted(refreshProviders - knownNames):
+        logger.warning(f"{defName}: --refresh '{name}' is not an enabled inventory plugin, enabled: {', '.join(enabledPlugins) or 'none'}")
+    # }}
+
+    logger.debug("%s: cfg='%s'", defName, rsh.config.LazyJson(rsh.config.cfg))
 
     instancesInfoArray = list()
     # inventory plugins
@@ -45,72 +58,64 @@ if __name__ == "__main__":
             inventoryConfig = rsh.config.cfg.get(key, None)
             enable = inventoryConfig.get('enable', None)
             if enable:
+                # use cached instancesInfo if fresh and refresh not requested {{
+                provider = re.sub(r"Inventory$", "", key)
+                cacheTtl = inventoryConfig.get('cacheTtl', 0)
+                forceRefresh = refreshProviders & {'all', provider, key}
+                if cacheTtl > 0 and not forceRefresh:
+                    fetchedAt, instancesInfo = rsh.inventoryCache.loadInstancesInfo(rsh.config.cfg, key)
+                    if fetchedAt is not None and time.time() - fetchedAt < cacheTtl:
+                        logger.info(f"{defName}: using cached instances for plugin='{key}', age={int(time.time() - fetchedAt)}s")
+                        instancesInfoArray.extend(instancesInfo)
+                        continue
+                # }}
                 # make class obj from variable {{
                 klass = getattr(rsh, key)
                 inventoryClass = klass(rsh.config.cfg)
                 # }}
                 # generate inventory dict
-                instancesInfoArray.extend(inventoryClass.instancesInfo())
-
-    logger.debug("%s: instancesInfoArray='%s'" % (defName,json.dumps(instancesInfoArray,indent=4)))
-
-    inventory = dict()
-    inventory['hosts'] = dict()
-    inventory['groups'] = dict()
-    for instanceInfo in instancesInfoArray:
-        # hosts {{
-        try:
-            host = instanceInfo['host']
-        except:
-            print(instanceInfo)
-            logger.error(f"{defName}: key='host' not found in instanceInfo='{instanceInfo}'")
-            exit(1)
+                instancesInfo = inventoryClass.instancesInfo()
+                if getattr(inventoryClass, 'incomplete', False):
+                    # don't keep missing hosts missing for the whole cacheTtl
+                    logger.warning(f"{defName}: plugin='{key}' returned partial results, not caching them")
+                else:
+                    rsh.inventoryCache.saveInstancesInfo(rsh.config.cfg, key, instancesInfo)
+                instancesInfoArray.extend(instancesInfo)
 
-        # get rsh inventory module name {{
-        rshInventoryModule = instanceInfo.get('rshInventoryModule', None)
+    logger.debug("%s: instancesInfoArray='%s'", defName, rsh.config.LazyJson(instancesInfoArray))
 
-        # generage "hosts" for instance
-        if host not in inventory['hosts']:
-            inventory['hosts'][host] = { 'sshHost': instanceInfo['sshHost'] }
-            for hostInfoField in rsh.config.cfg[rshInventoryModule]['hostInfoFields']:
-                inventory['hosts'][host][hostInfoField] = instanceInfo[hostInfoField]
-        # }}
-        # groups {{
-        for tag in instanceInfo['tags']:
-            if tag['Key'] in rsh.config.cfg[rshInventoryModule]['skipTagsForMakeGroups']:
-                continue
-            groupName = 'tag_' + tag['Key'].replace('-','_') + '_' + tag['Value'].replace('-','_')
-            groupName = re.sub(r'\s+', '_', groupName)
-            if groupName not in inventory['groups']:
-                inventory['groups'][groupName] = list()
-            if host not in inventory['groups'][groupName]:
-                inventory['groups'][groupName].append(host)
-        # }}
-        # groups by dc {{
-        hosting = instanceInfo.get('hosting', 'unknown')
-        groupName = 'dc_' + hosting +'_'+ instanceInfo['dc']
-        groupName = re.sub(r'\s+', '_', groupName)
-        if groupName not in inventory['groups']:
-            inventory['groups'][groupName] = list()
-        if host not in inventory['groups'][groupName]:
-            inventory['groups'][groupName].append(host)
-        # }}
+    inventory, hostsMeta = rsh.inventoryBuilder.buildInventory(instancesInfoArray, rsh.config.cfg)
 
-    # natural sort hosts and groups {{
-    # hosts: sort hostnames using token-aware natural order
-    sorted_hostnames = sorted(inventory['hosts'].keys(), key=_natsort_tokens_key)
-    inventory['hosts'] = { hn: inventory['hosts'][hn] for hn in sorted_hostnames }
+    # generating inventory file {{
+    logger.debug("%s: inventory='%s'", defName, inventory)
+    inventoryFilePath = os.path.expanduser(rsh.config.cfg['inventoryFilePath'])
+    inventoryHash, diff = rsh.inventoryWriter.writeInventory(inventoryFilePath, inventory)
+    if diff is None:
+        logger.info(f"{defName}: inventory unchanged, sha256={inventoryHash}")
+    else:
+        logger.info(f"{defName}: inventory updated, {rsh.inventoryWriter.diffSummary(diff)}, sha256={inventoryHash}")
+        rsh.inventoryWriter.writeDiff(os.path.expanduser(rsh.config.cfg['inventoryDiffFilePath']), diff)
+        if args.diff:
+            print(json.dumps(diff))
+    # }}
 
-    # groups: sort group names; inside each group sort hosts using the same key
-    sorted_group_names = sorted(inventory['groups'].keys(), key=_natsort_tokens_key)
-    sorted_groups = dict()
-    for g in sorted_group_names:
-        sorted_groups[g] = sorted(inventory['groups'][g], key=_natsort_tokens_key)
-    inventory['groups'] = sorted_groups
+    # generating indexed inventory store {{
+    # written even when the yaml is unchanged, tags skipped for groups are stored only here
+    if rsh.config.cfg['inventoryDb']['enable']:
+        rsh.inventoryDb.writeInventoryDb(
+            os.path.expanduser(rsh.config.cfg['inventoryDb']['filePath']),
+            inventory,
+            hostsMeta,
+        )
     # }}
 
-    # generating inventory file {{
-    logger.debug("%s: inventory='%s'" % (defName,inventory))
-    with open(os.path.expanduser(rsh.config.cfg['inventoryFilePath']), 'w') as f:
-        yaml.dump(inventory, f, default_flow_style=False, sort_keys=False)
+    # generating completion index for rshCompgen.py {{
+    # only an optimisation, rshCompgen.py falls back to the inventory without it
+    compgenIndexFilePath = os.path.expanduser(rsh.config.cfg['compgenIndexFilePath'])
+    try:
+        inventoryKey = rsh.compgen.inventoryKey(inventoryFilePath)
+        if diff is not None or rsh.compgen.readIndex(compgenIndexFilePath, inventoryKey) is None:
+            rsh.compgen.writeIndex(compgenIndexFilePath, inventory, inventoryKey)
+    except OSError as e:
+        logger.warning(f"{defName}: failed write completion index '{compgenIndexFilePath}', error: '{e}'")
     # }}
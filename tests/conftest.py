@@ -0,0 +1,9 @@
+# tests run against this checkout with an empty home dir, so no ~/.rsh.yaml,
+# inventory or caches of the user running them are read or written
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ['HOME'] = tempfile.mkdtemp(prefix='rsh-tests-')
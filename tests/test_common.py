@@ -0,0 +1,36 @@
+import io
+import json
+
+import pytest
+
+from rsh.common import iterJsonArray
+
+document = [1, 4.5, -2e10, 1.25e-3, 'a,]b', {'x': [True, None, 0.5]}, [], 12345678901234567890]
+
+
+@pytest.mark.parametrize('chunkSize', range(1, 12))
+def test_iterJsonArray_chunk_boundaries(chunkSize):
+    text = json.dumps(document)
+    assert list(iterJsonArray(io.StringIO(text), chunkSize)) == document
+
+
+def test_iterJsonArray_number_split_before_fraction():
+    assert list(iterJsonArray(io.StringIO('[1, 4.5]'), 1)) == [1, 4.5]
+    assert list(iterJsonArray(io.StringIO('[3e2, 7]'), 2)) == [300.0, 7]
+
+
+def test_iterJsonArray_whitespace():
+    text = ' \n[ 1 ,\n  {"a": 2}\t,"x" ]\n'
+    assert list(iterJsonArray(io.StringIO(text), 3)) == [1, {'a': 2}, 'x']
+    assert list(iterJsonArray(io.StringIO(' [ ] '), 1)) == []
+
+
+@pytest.mark.parametrize('text', ['[1, 4.', '[1', '[1 2]', '[{"a": 1}'])
+def test_iterJsonArray_truncated(text):
+    with pytest.raises(ValueError, match='truncated'):
+        list(iterJsonArray(io.StringIO(text), 1))
+
+
+def test_iterJsonArray_not_an_array():
+    with pytest.raises(ValueError, match='expected json array'):
+        list(iterJsonArray(io.StringIO('{"a": 1}')))
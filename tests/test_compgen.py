@@ -0,0 +1,65 @@
+import os
+
+import pytest
+
+from rsh import compgen
+
+inventory = {
+    'hosts': {'web2': {}, 'web10': {}, 'db1': {}, 'web1': {}},
+    'groups': {'tag_role_web': ['web1'], 'dc_eu': ['db1']},
+}
+
+
+def test_index_roundtrip(tmp_path):
+    indexFilePath = str(tmp_path / 'compgen.idx')
+    compgen.writeIndex(indexFilePath, inventory, (123, 45))
+    assert compgen.readIndex(indexFilePath, (123, 45)) == {
+        'hosts': ['db1', 'web1', 'web10', 'web2'],
+        'groups': ['dc_eu', 'tag_role_web'],
+    }
+    assert os.listdir(tmp_path) == ['compgen.idx']
+
+
+def test_index_empty_sections(tmp_path):
+    indexFilePath = str(tmp_path / 'compgen.idx')
+    compgen.writeIndex(indexFilePath, {'hosts': None}, (1, 1))
+    assert compgen.readIndex(indexFilePath, (1, 1)) == {'hosts': [], 'groups': []}
+
+
+def test_stale_or_broken_index(tmp_path):
+    indexFilePath = str(tmp_path / 'compgen.idx')
+    assert compgen.readIndex(indexFilePath, (1, 1)) is None
+    compgen.writeIndex(indexFilePath, inventory, (1, 1))
+    assert compgen.readIndex(indexFilePath, (2, 1)) is None
+    with open(indexFilePath) as f:
+        lines = f.read().splitlines()
+    with open(indexFilePath, 'w') as f:
+        f.write('\n'.join(lines[:3]) + '\n')
+    assert compgen.readIndex(indexFilePath, (1, 1)) is None
+
+
+def test_write_failure_leaves_no_tmp_file(tmp_path):
+    indexFilePath = tmp_path / 'compgen.idx'
+    indexFilePath.mkdir()  # os.replace() of a file over a directory fails
+    with pytest.raises(OSError):
+        compgen.writeIndex(str(indexFilePath), inventory, (1, 1))
+    assert os.listdir(tmp_path) == ['compgen.idx']
+
+
+def test_inventoryKey_follows_content(tmp_path):
+    inventoryFilePath = tmp_path / 'inventory.yaml'
+    inventoryFilePath.write_text('hosts: {}\n')
+    key = compgen.inventoryKey(str(inventoryFilePath))
+    inventoryFilePath.write_text('hosts: {}\ngroups: {}\n')
+    assert compgen.inventoryKey(str(inventoryFilePath)) != key
+
+
+@pytest.mark.parametrize('prefix, expected', [
+    ('', ['db1', 'web1', 'web10', 'web2']),
+    ('web1', ['web1', 'web10']),
+    ('w', ['web1', 'web10', 'web2']),
+    ('x', []),
+    ('db10', []),
+])
+def test_prefixMatch(prefix, expected):
+    assert compgen.prefixMatch(['db1', 'web1', 'web10', 'web2'], prefix) == expected
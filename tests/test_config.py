@@ -0,0 +1,96 @@
+import io
+import logging
+import logging.handlers
+import queue
+import threading
+
+import pytest
+
+from rsh import config
+
+
+def test_redactor_replaces_values():
+    redactor = config.Redactor(['s3cret', 'api-key-123'])
+    assert redactor("token=s3cret key=api-key-123 s3cret") == "token=[CLASSIFIED] key=[CLASSIFIED] [CLASSIFIED]"
+    assert redactor("nothing to hide") == "nothing to hide"
+
+
+def test_redactor_longest_first():
+    redactor = config.Redactor(['abc', 'abcdef'])
+    assert redactor("xabcdefx abc") == "x[CLASSIFIED]x [CLASSIFIED]"
+
+
+def test_redactor_escapes_regex_characters():
+    redactor = config.Redactor(['p.ss*[1]', '^$'])
+    assert redactor("p.ss*[1] pass1 ^$") == "[CLASSIFIED] pass1 [CLASSIFIED]"
+
+
+def test_redactor_nested_and_non_string_values():
+    # lists of values, numbers; empty values and booleans are not redacted
+    redactor = config.Redactor([['alpha', ('beta',)], 4242, '', True, None])
+    assert redactor("alpha beta 4242 True None") == "[CLASSIFIED] [CLASSIFIED] [CLASSIFIED] True None"
+
+
+def test_redactor_without_values():
+    redactor = config.Redactor([])
+    assert redactor.pattern is None
+    assert redactor("s3cret") == "s3cret"
+
+
+@pytest.mark.parametrize('count', [config.Redactor.maxPrecheckValues, config.Redactor.maxPrecheckValues + 5])
+def test_redactor_with_and_without_precheck(count):
+    values = [f"secret{i:02}" for i in range(count)]
+    redactor = config.Redactor(values, replacement='***')
+    assert redactor(f"a {values[-1]} b {values[0]}") == "a *** b ***"
+    assert redactor("a secret b") == "a secret b"
+
+
+def test_sensitive_values_from_config():
+    cfg = {
+        'sensitiveKeys': ['password', 'token'],
+        'db': {'password': 'pw1', 'user': 'root'},
+        'apis': [{'token': 'tk1'}, {'token': ['tk2', 'tk3']}],
+    }
+    redactor = config.Redactor(config.getRecursively(cfg, cfg['sensitiveKeys']))
+    assert redactor("pw1 root tk1 tk2 tk3") == "[CLASSIFIED] root [CLASSIFIED] [CLASSIFIED] [CLASSIFIED]"
+
+
+def test_sensitive_formatter(monkeypatch):
+    monkeypatch.setattr(config, 'redactor', config.Redactor(['s3cret']), raising=False)
+    record = logging.LogRecord('rsh', logging.INFO, __file__, 1, "login with %s", ('s3cret',), None)
+    assert config.SensitiveFormatter('%(message)s').format(record) == "login with [CLASSIFIED]"
+
+
+def test_deferred_queue_handler_formats_in_listener(monkeypatch):
+    monkeypatch.setattr(config, 'redactor', config.Redactor(['s3cret']), raising=False)
+    formattedIn = []
+
+    class Payload:
+        def __str__(self):
+            formattedIn.append(threading.current_thread())
+            return 's3cret'
+
+    logQueue = queue.SimpleQueue()
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(config.SensitiveFormatter('%(levelname)s %(message)s'))
+    listener = logging.handlers.QueueListener(logQueue, handler)
+    logger = logging.getLogger('rsh.tests.deferred')
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    logger.addHandler(config.DeferredQueueHandler(logQueue))
+    listener.start()
+    try:
+        logger.debug("payload=%s", Payload())
+        try:
+            raise ZeroDivisionError('boom')
+        except ZeroDivisionError:
+            logger.exception("failed with %s", 's3cret')
+    finally:
+        listener.stop()
+        logger.handlers.clear()
+
+    assert formattedIn and threading.current_thread() not in formattedIn
+    output = stream.getvalue()
+    assert output.startswith("DEBUG payload=[CLASSIFIED]\nERROR failed with [CLASSIFIED]\nTraceback")
+    assert "ZeroDivisionError: boom" in output
@@ -0,0 +1,46 @@
+import pytest
+
+import rsh.inventoryDb
+from rsh import exec_copy
+
+inventory = {
+    'hosts': {f"srv{i}": {'sshHost': f"10.0.0.{i}"} for i in range(1, 7)},
+    'groups': {
+        'DC_upper': ['srv1'],
+        'Dc_mixed': ['srv2'],
+        'dc_a': ['srv3', 'srv4'],
+        'dc_b': ['srv5'],
+        'dcx': ['srv6'],
+        'dc%': ['srv6'],
+        'web': ['srv1', 'srv3'],
+    },
+}
+hostsMeta = {host: {} for host in inventory['hosts']}
+
+
+@pytest.fixture
+def inventoryDb(tmp_path):
+    dbFilePath = str(tmp_path / 'inventory.db')
+    rsh.inventoryDb.writeInventoryDb(dbFilePath, inventory, hostsMeta)
+    inventoryDb = rsh.inventoryDb.InventoryDb(dbFilePath)
+    yield inventoryDb
+    inventoryDb.close()
+
+
+def test_dc_groups_same_for_yaml_and_store(inventoryDb):
+    host_names = [(host, info['sshHost']) for host, info in inventory['hosts'].items()]
+    expected = {'srv3': 'dc_a', 'srv4': 'dc_a', 'srv5': 'dc_b'}
+    assert exec_copy.dc_groups(host_names, inventory) == expected
+    assert exec_copy.dc_groups(host_names, inventoryDb) == expected
+
+
+def test_groupMembers_prefix_is_case_sensitive(inventoryDb):
+    assert inventoryDb.groupMembers('dc_') == [('dc_a', 'srv3'), ('dc_a', 'srv4'), ('dc_b', 'srv5')]
+    assert inventoryDb.groupMembers('DC') == [('DC_upper', 'srv1')]
+    # LIKE wildcards are plain characters
+    assert inventoryDb.groupMembers('dc%') == [('dc%', 'srv6')]
+    assert len(inventoryDb.groupMembers('')) == sum(map(len, inventory['groups'].values()))
+
+
+def test_dc_groups_leaves_out_unwanted_hosts(inventoryDb):
+    assert exec_copy.dc_groups([('srv5', '10.0.0.5'), ('other', 'other')], inventoryDb) == {'srv5': 'dc_b'}
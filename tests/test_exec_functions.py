@@ -0,0 +1,48 @@
+import argparse
+
+import pytest
+
+from rsh import exec_functions
+
+
+@pytest.mark.parametrize('value, total, expected', [
+    ('10', 50, 10),
+    (10, 50, 10),
+    ('0', 50, 0),
+    ('10%', 50, 5),
+    ('1%', 50, 0),
+    ('100%', 7, 7),
+    ('12.5%', 80, 10),
+    (' 3 ', 50, 3),
+])
+def test_resolve_host_count(value, total, expected):
+    assert exec_functions.resolve_host_count(value, total) == expected
+
+
+@pytest.mark.parametrize('value', ['5', '5%', '0', '0.5%'])
+def test_host_count_valid(value):
+    assert exec_functions.host_count(value) == value
+
+
+@pytest.mark.parametrize('value', ['-1', '-5%', 'five', '5.5', '%'])
+def test_host_count_invalid(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        exec_functions.host_count(value)
+
+
+@pytest.mark.parametrize('value, expected', [
+    (0, False), ('0', False), ('', False), ('0%', False),
+    ('1', True), ('1%', True), (5, True), ('0.5%', True),
+])
+def test_batch_requested(value, expected):
+    # 1% of a small host list resolves to 0 hosts but still asks for batches
+    assert exec_functions.batch_requested(value) is expected
+
+
+def test_batches_clamp_wave_size(monkeypatch, capsys):
+    waves = []
+    monkeypatch.setattr(exec_functions, '_dispatch_pool', lambda wave, *args, **kwargs: waves.append(wave))
+    hosts = [f"srv{i}" for i in range(5)]
+    exec_functions.run_command_parallel_dedup(None, hosts, 'true', batch='1%')
+    assert waves == [[(host, host)] for host in hosts]
+    assert 'waves: 5 x 1 hosts' in capsys.readouterr().err
@@ -0,0 +1,97 @@
+import io
+import json
+import os
+
+import pytest
+
+from rsh import exec_output
+from rsh.exec_functions import HostResult, HostTimeout
+
+
+def test_normalizer_builtin_rules():
+    normalizer = exec_output.Normalizer(['timestamp', 'pid'])
+    assert normalizer("2024-01-02T03:04:05Z sshd[1234]: started pid=77") == "<timestamp> sshd[<pid>]: started pid=<pid>"
+    assert normalizer("Jan  2 03:04:05 up") == "<timestamp> up"
+
+
+def test_normalizer_hostname_and_custom_rule():
+    normalizer = exec_output.Normalizer(['hostname', {'regex': r'v\d+', 'replace': 'vN'}])
+    assert normalizer("web1.example.com web1 v42", 'web1.example.com') == "<hostname> <hostname> vN"
+    # ip addresses are masked only as a whole
+    assert normalizer("10.0.0.1 10", '10.0.0.1') == "<hostname> 10"
+
+
+def test_normalizer_rejects_unknown_rule():
+    with pytest.raises(ValueError, match='unknown normalize rule'):
+        exec_output.Normalizer(['uptime'])
+    assert not exec_output.Normalizer()
+
+
+def test_buckets_dedup():
+    buckets = exec_output.OutputBuckets()
+    first, _ = buckets.add('a', 'ok\n', 'ok\n', '', 0)
+    second, _ = buckets.add('b', 'ok\n', 'ok\n', '', 0)
+    other, _ = buckets.add('c', 'failed\n', 'failed\n', '', 1)
+    assert first is second and first is not other
+    assert len(buckets) == 2
+    assert first.hosts == ['a', 'b'] and first.exit_code == 0 and first.display() == 'ok\n'
+
+
+def test_buckets_normalized():
+    buckets = exec_output.OutputBuckets(normalize=['hostname'])
+    first, _ = buckets.add('web1', 'I am web1', 'I am web1', '', 0)
+    second, _ = buckets.add('web2', 'I am web2', 'I am web2', '', 0)
+    assert first is second
+    # the representative output is kept as it was
+    assert first.output == 'I am web1'
+
+
+def test_buckets_spill(tmp_path):
+    buckets = exec_output.OutputBuckets(spill_threshold=10, spill_dir=str(tmp_path))
+    stdout = ''.join(f"line {i}\n" for i in range(100))
+    bucket, spill_path = buckets.add('web/1', stdout, stdout, 'err', 0)
+    _, again = buckets.add('web/1', stdout, stdout, '', 0)
+    small, none = buckets.add('web2', 'ok', 'ok', '', 0)
+
+    assert os.path.basename(spill_path) == 'web_1.out'
+    assert os.path.basename(again) == 'web_1.2.out'
+    assert none is None and small.spill_path is None
+    with open(spill_path) as f:
+        assert f.read() == stdout
+    with open(spill_path[:-len('.out')] + '.err') as f:
+        assert f.read() == 'err'
+    assert bucket.output.count('\n') == exec_output.PREVIEW_LINES - 1
+    assert f"full output: {spill_path}" in bucket.display()
+    assert oct(os.stat(os.path.dirname(spill_path)).st_mode & 0o777) == '0o700'
+
+
+def test_host_record_result():
+    bucket, _ = exec_output.OutputBuckets().add('h', 'out', 'out', '', 0)
+    record = exec_output.host_record(
+        'web1', 'root@10.0.0.1:22', res=HostResult('out', 'warn', 0), timings={'connect': 0.12345}, bucket=bucket,
+    )
+    assert record == {
+        'host': 'web1', 'sshHost': 'root@10.0.0.1:22', 'exitCode': 0, 'bucket': bucket.id,
+        'timings': {'connect': 0.123}, 'stdout': 'out', 'stderr': 'warn',
+    }
+
+
+def test_host_record_spilled():
+    record = exec_output.host_record('web1', 'web1', res=HostResult('x', 'y', 2), spill_path='/spill/web1.out')
+    assert record['stdoutFile'] == '/spill/web1.out'
+    assert record['stderrFile'] == '/spill/web1.err'
+    assert 'stdout' not in record and record['exitCode'] == 2
+
+
+def test_host_record_error_and_straggler():
+    record = exec_output.host_record('web1', 'web1', error=HostTimeout('command', 5))
+    assert record['exitCode'] is None and record['timedOut'] == 'command' and record['error']
+    assert exec_output.host_record('web1', 'web1', error=OSError('refused'))['error'] == 'refused'
+    assert exec_output.host_record('web1', 'web1', straggler=True)['straggler'] is True
+
+
+def test_write_record():
+    out = io.StringIO()
+    exec_output.write_record({'host': 'wéb1'}, out)
+    exec_output.write_record({'host': 'web2'}, out)
+    assert [json.loads(line) for line in out.getvalue().splitlines()] == [{'host': 'wéb1'}, {'host': 'web2'}]
@@ -0,0 +1,76 @@
+import yaml
+
+import pytest
+
+from rsh import inventoryScan
+
+inventory = {
+    'hosts': {
+        'db1': {'sshHost': '10.0.0.1', 'tags': [{'Key': 'role', 'Value': 'db'}]},
+        'web1': {'sshHost': '10.0.0.2', 'dc': 'eu'},
+        'web10': {'sshHost': '10.0.0.3'},
+        '1234': {'sshHost': '10.0.0.4'},
+        'weird: name': {'sshHost': '10.0.0.5'},
+    },
+    'groups': {
+        'dc_eu': ['web1'],
+        'tag_role_db': ['db1'],
+    },
+}
+
+
+def writeInventory(tmp_path, data):
+    inventoryFilePath = tmp_path / 'inventory.yaml'
+    inventoryFilePath.write_text(yaml.dump(data, default_flow_style=False, sort_keys=False))
+    return str(inventoryFilePath)
+
+
+@pytest.mark.parametrize('host', list(inventory['hosts']))
+def test_scanHostInfo(tmp_path, host):
+    assert inventoryScan.scanHostInfo(writeInventory(tmp_path, inventory), host) == inventory['hosts'][host]
+
+
+def test_scanHostInfo_missing_host(tmp_path):
+    inventoryFilePath = writeInventory(tmp_path, inventory)
+    # a group or a prefix of a host name is not a host
+    for host in ('dc_eu', 'web', 'web100'):
+        assert inventoryScan.scanHostInfo(inventoryFilePath, host) is None
+
+
+def test_scanHostInfo_groups_first(tmp_path):
+    data = {'groups': inventory['groups'], 'hosts': inventory['hosts']}
+    assert inventoryScan.scanHostInfo(writeInventory(tmp_path, data), 'web1') == {'sshHost': '10.0.0.2', 'dc': 'eu'}
+
+
+def test_scanHostInfo_unsupported_layout(tmp_path):
+    inventoryFilePath = tmp_path / 'inventory.yaml'
+    inventoryFilePath.write_text(yaml.dump(inventory, default_flow_style=True))
+    with pytest.raises(inventoryScan.UnsupportedLayout):
+        inventoryScan.scanHostInfo(str(inventoryFilePath), 'web1')
+    inventoryFilePath.write_text('hosts:\n    web1:\n        sshHost: 10.0.0.2\n')
+    with pytest.raises(inventoryScan.UnsupportedLayout):
+        inventoryScan.scanHostInfo(str(inventoryFilePath), 'web1')
+
+
+def test_scanInventory():
+    hosts, groups = inventoryScan.scanInventory(yaml.dump(inventory, default_flow_style=False, sort_keys=False))
+    assert list(hosts) == list(inventory['hosts'])
+    assert groups == inventory['groups']
+    # host blocks compare equal only for equal host info
+    for host, info in inventory['hosts'].items():
+        assert yaml.safe_load(hosts[host]) == {host: info}
+
+
+def test_scanInventory_empty():
+    assert inventoryScan.scanInventory('') == ({}, {})
+    assert inventoryScan.scanInventory('hosts: {}\ngroups: {}\n') == ({}, {})
+
+
+@pytest.mark.parametrize('text', [
+    'inventory:\n  hosts: {}\n',
+    'hosts:\n- web1\n',
+    yaml.dump(inventory, default_flow_style=True),
+])
+def test_scanInventory_unsupported_layout(text):
+    with pytest.raises(inventoryScan.UnsupportedLayout):
+        inventoryScan.scanInventory(text)
@@ -0,0 +1,134 @@
+import pytest
+
+from rsh import inventoryDb, inventorySelector
+
+inventory = {
+    'hosts': {
+        'srv1-db': {'sshHost': '10.0.0.1'},
+        'srv2-web': {'sshHost': '10.0.0.2'},
+        'srv3-web': {'sshHost': '10.0.0.3'},
+        'srv10-web': {'sshHost': 'unknown'},
+        'srv11-web': {'sshHost': 'unknown'},
+        'canary1': {},
+    },
+    'groups': {
+        'db': ['srv1-db'],
+        'web': ['srv2-web', 'srv3-web', 'srv10-web', 'srv11-web'],
+        'dc_a': ['srv1-db', 'srv2-web', 'srv10-web'],
+        'dc_b': ['srv3-web', 'srv11-web', 'canary1'],
+        'canary': ['srv3-web', 'canary1'],
+        'empty': [],
+    },
+}
+
+
+@pytest.fixture
+def index():
+    return inventorySelector.HostIndex.fromInventory(inventory)
+
+
+def names(selectors, index):
+    return [name for name, _ in inventorySelector.resolve(selectors, index)]
+
+
+resolveCases = [
+    (['db'], ['srv1-db']),
+    (['web|db'], ['srv1-db', 'srv2-web', 'srv3-web', 'srv10-web', 'srv11-web']),
+    (['web', 'db'], ['srv1-db', 'srv2-web', 'srv3-web', 'srv10-web', 'srv11-web']),
+    (['web&dc_a'], ['srv2-web', 'srv10-web']),
+    (['web&!canary'], ['srv2-web', 'srv10-web', 'srv11-web']),
+    (['web', '!canary'], ['srv2-web', 'srv10-web', 'srv11-web']),
+    (['db|web&dc_b'], ['srv1-db', 'srv3-web', 'srv11-web']),
+    (['(db|web)&dc_b'], ['srv3-web', 'srv11-web']),
+    (['!!db&dc_a'], ['srv1-db']),
+    (['srv1*'], ['srv1-db', 'srv10-web', 'srv11-web']),
+    (['srv?-web'], ['srv2-web', 'srv3-web']),
+    (['/^srv1[0-9]-/'], ['srv10-web', 'srv11-web']),
+    (['canary1', 'canary'], ['srv3-web', 'canary1']),
+    (['empty'], []),
+]
+
+
+@pytest.mark.parametrize('selectors, expected', resolveCases)
+def test_resolve(selectors, expected, index):
+    assert names(selectors, index) == expected
+
+
+def test_resolve_ssh_hosts(index):
+    # hosts sharing an sshHost are kept apart, hosts without one are reached by name
+    assert inventorySelector.resolve(['srv1*', 'canary1'], index) == [
+        ('srv1-db', '10.0.0.1'), ('srv10-web', 'unknown'), ('srv11-web', 'unknown'), ('canary1', 'canary1'),
+    ]
+
+
+def test_resolve_passes_unknown_names_through(index):
+    assert inventorySelector.resolve(['host10', 'db', 'host9.example.com', 'host10'], index) == [
+        ('srv1-db', '10.0.0.1'), ('host9.example.com', 'host9.example.com'), ('host10', 'host10'),
+    ]
+    # excluded and intersected like empty groups
+    assert names(['db|nohost&web'], index) == ['srv1-db']
+    assert names(['nohost', '!nohost'], index) == []
+
+
+def test_bitmaps_memoized(index):
+    names(['web&dc_a'], index)
+    assert set(index.bitmaps) == {'web', 'dc_a'}
+    assert index.names(index.bitmaps['dc_a']) == ['srv1-db', 'srv2-web', 'srv10-web']
+
+
+def test_extra_kinds():
+    index = inventorySelector.HostIndex(
+        ['a', 'b', 'c'], {}, {'g': ['a', 'b']}.get,
+        {'tag': lambda value: ['b', 'c'] if value == 'role=web' else None},
+    )
+    assert names(['g&tag:role=web'], index) == ['b']
+    assert names(['tag:role=db'], index) == ['tag:role=db']
+
+
+@pytest.mark.parametrize('selector, message', [
+    ('', 'empty selector'),
+    ('web&', 'missing host'),
+    ('(web|db', "missing ')'"),
+    ('web)', "unexpected ')'"),
+    ('db&(!web&!canary)', 'exclusions only'),
+    ('/[/', 'bad host regex'),
+])
+def test_selector_errors(selector, message, index):
+    with pytest.raises(inventorySelector.SelectorError, match=message.replace('(', r'\(').replace(')', r'\)')):
+        inventorySelector.resolve(['db', selector], index)
+
+
+def test_only_exclusions(index):
+    with pytest.raises(inventorySelector.SelectorError, match='nothing to run on'):
+        inventorySelector.resolve(['!canary'], index)
+
+
+@pytest.fixture
+def store(tmp_path):
+    dbFilePath = str(tmp_path / 'inventory.sqlite')
+    inventoryDb.writeInventoryDb(dbFilePath, inventory, {'srv2-web': {'tags': [{'Key': 'role', 'Value': 'web'}]}})
+    db = inventoryDb.InventoryDb(dbFilePath)
+    yield db
+    db.close()
+
+
+# the store has no rows for an empty group, it is passed through like an unknown name
+@pytest.mark.parametrize('selectors, expected', [case for case in resolveCases if case[0] != ['empty']])
+def test_resolve_store(selectors, expected, store):
+    assert names(selectors, inventorySelector.HostIndex.fromInventoryDb(store)) == expected
+
+
+def test_resolve_store_point_lookups(store, monkeypatch):
+    def allHosts():
+        raise AssertionError('allHosts() read for a selector without patterns')
+
+    monkeypatch.setattr(store, 'allHosts', allHosts)
+    index = inventorySelector.HostIndex.fromInventoryDb(store)
+    assert inventorySelector.resolve(['canary', 'srv1-db', 'web&!dc_a', 'nohost', 'tag:role=web'], index) == [
+        ('srv1-db', '10.0.0.1'), ('srv2-web', '10.0.0.2'), ('srv3-web', '10.0.0.3'),
+        ('srv11-web', 'unknown'), ('canary1', 'canary1'), ('nohost', 'nohost'),
+    ]
+    # only hosts returned by lookups are numbered
+    index = inventorySelector.HostIndex.fromInventoryDb(store)
+    assert names(['dc_b&!canary'], index) == ['srv11-web']
+    assert index.hosts == ['srv3-web', 'srv11-web', 'canary1']
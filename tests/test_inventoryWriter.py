@@ -0,0 +1,111 @@
+import json
+import os
+
+import pytest
+
+from rsh import inventoryWriter
+
+inventory = {
+    'hosts': {
+        'db1': {'sshHost': '10.0.0.1'},
+        'web1': {'sshHost': '10.0.0.2'},
+        'web2': {'sshHost': '10.0.0.3'},
+    },
+    'groups': {
+        'db': ['db1'],
+        'web': ['web1', 'web2'],
+        'dc_a': ['db1', 'web1'],
+    },
+}
+
+
+def changed():
+    return {
+        'hosts': {
+            'db1': {'sshHost': '10.0.0.1'},
+            'web1': {'sshHost': '10.0.0.20'},
+            'web3': {'sshHost': '10.0.0.4'},
+        },
+        'groups': {
+            'db': ['db1'],
+            'web': ['web1', 'web3'],
+            'dc_b': ['web3'],
+        },
+    }
+
+
+def test_writeAtomic_keeps_mode(tmp_path):
+    filePath = tmp_path / 'inventory.yaml'
+    filePath.write_text('old\n')
+    os.chmod(filePath, 0o640)
+    inventoryWriter.writeAtomic(str(filePath), 'new\n')
+    assert filePath.read_text() == 'new\n'
+    assert os.stat(filePath).st_mode & 0o777 == 0o640
+    assert os.listdir(tmp_path) == ['inventory.yaml']
+
+
+def test_writeAtomic_creates_dir(tmp_path):
+    filePath = tmp_path / 'sub' / 'inventory.yaml'
+    inventoryWriter.writeAtomic(str(filePath), 'new\n')
+    assert filePath.read_text() == 'new\n'
+
+
+def test_writeAtomic_failure_keeps_old_file(tmp_path, monkeypatch):
+    filePath = tmp_path / 'inventory.yaml'
+    filePath.write_text('old\n')
+
+    def failingReplace(src, dst):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(inventoryWriter.os, 'replace', failingReplace)
+    with pytest.raises(OSError):
+        inventoryWriter.writeAtomic(str(filePath), 'new\n')
+    assert filePath.read_text() == 'old\n'
+    assert os.listdir(tmp_path) == ['inventory.yaml']
+
+
+def test_writeInventory_new_file(tmp_path):
+    filePath = str(tmp_path / 'inventory.yaml')
+    newHash, diff = inventoryWriter.writeInventory(filePath, inventory)
+    with open(filePath) as f:
+        text = f.read()
+    assert inventoryWriter.contentHash(text) == newHash
+    assert diff['oldHash'] is None and diff['newHash'] == newHash
+    assert diff['addedHosts'] == ['db1', 'web1', 'web2'] and diff['addedGroups'] == ['db', 'web', 'dc_a']
+
+
+def test_writeInventory_unchanged(tmp_path):
+    filePath = str(tmp_path / 'inventory.yaml')
+    newHash, _ = inventoryWriter.writeInventory(filePath, inventory)
+    mtime = os.stat(filePath).st_mtime_ns
+    assert inventoryWriter.writeInventory(filePath, inventory) == (newHash, None)
+    assert os.stat(filePath).st_mtime_ns == mtime
+
+
+def test_writeInventory_diff(tmp_path):
+    filePath = str(tmp_path / 'inventory.yaml')
+    oldHash, _ = inventoryWriter.writeInventory(filePath, inventory)
+    _, diff = inventoryWriter.writeInventory(filePath, changed())
+    assert diff['oldHash'] == oldHash
+    assert diff['addedHosts'] == ['web3']
+    assert diff['removedHosts'] == ['web2']
+    assert diff['changedHosts'] == ['web1']
+    assert diff['addedGroups'] == ['dc_b']
+    assert diff['removedGroups'] == ['dc_a']
+    assert diff['groups'] == {'web': {'added': ['web3'], 'removed': ['web2']}}
+    assert inventoryWriter.diffSummary(diff) == "hosts +1 -1 ~1, groups +1 -1 ~1"
+
+
+def test_inventoryDiff_foreign_layout():
+    # a previous file not written by rshInventory.py is parsed with yaml
+    oldText = json.dumps(inventory)
+    newText = inventoryWriter.dumpInventory(changed())
+    diff = inventoryWriter.inventoryDiff(oldText, newText, changed())
+    assert diff['removedHosts'] == ['web2'] and diff['changedHosts'] == ['web1']
+    assert diff['groups'] == {'web': {'added': ['web3'], 'removed': ['web2']}}
+
+
+def test_writeDiff(tmp_path):
+    filePath = tmp_path / 'inventory.diff.json'
+    inventoryWriter.writeDiff(str(filePath), {'addedHosts': ['web3']})
+    assert json.loads(filePath.read_text()) == {'addedHosts': ['web3']}